@@ -0,0 +1,263 @@
+# benchmarks/run_benchmarks.py
+# Benchmark suite for the monitor's hot paths and the dashboard views.
+#
+# Seeds a throwaway SQLite database (see benchmarks/settings.py) with a
+# configurable number of tanks, locations and readings, then times:
+#   - DiptankMonitorApp._update_all_displays (query side; plus the widget update when a display is available)
+#   - DiptankMonitorApp.simulate_sensor_reading (the background write it submits)
+#   - one pump scheduler iteration (tick + write-buffer flush) for --pumps tanks
+#   - loading the whole seeded fleet into compact FleetColumns, and classifying it
+#     with diptank.classification (query + NumPy pass)
+#   - the farmer and officer dashboard views from diptank/urls.py
+# reporting wall time, SQL query count and peak Python memory for each. Run with
+# a large --tanks (e.g. 100000) to check that loading the fleet stays bounded.
+#
+# Usage (from the project root):
+#     python -m benchmarks.run_benchmarks --tanks 2000 --locations 50 --readings 20000 --save-baseline
+#     python -m benchmarks.run_benchmarks --tanks 2000 --locations 50 --readings 20000
+# The second run compares against the saved baseline and exits with status 1
+# if any benchmark regressed by more than --tolerance.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Must be set before the monitor module runs django.setup()
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+import django  # noqa: E402
+
+django.setup()
+
+import tkinter as tk  # noqa: E402
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from diptank.classification import FleetColumns, classify  # noqa: E402
+from diptank.forecast import LevelForecaster  # noqa: E402
+from diptank.models import Tank, SensorReading, Alert, UserProfile  # noqa: E402
+from diptank.pumps import PumpScheduler, PumpState  # noqa: E402
+from diptank.write_buffer import ReadingWriteBuffer  # noqa: E402
+import diptank_monitor_app  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def seed_database(tanks, locations, readings, seed):
+    """Recreates the benchmark database with a deterministic fleet."""
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    Alert.objects.all().delete()
+    SensorReading.objects.all().delete()
+    Tank.objects.all().delete()
+    UserProfile.objects.all().delete()
+    User.objects.filter(username__startswith='bench_').delete()
+
+    rng = random.Random(seed)
+    location_names = [f"Bench Location {i:03d}" for i in range(locations)]
+    Tank.objects.bulk_create([
+        Tank(location=location_names[i % locations], capacity=10000.0,
+             current_level=rng.uniform(500.0, 9500.0), min_threshold=20.0, max_threshold=90.0)
+        for i in range(tanks)
+    ], batch_size=1000)
+
+    tank_ids = list(Tank.objects.values_list('tank_id', flat=True))
+    SensorReading.objects.bulk_create([
+        SensorReading(tank_id=tank_ids[i % len(tank_ids)], water_level=rng.uniform(0.0, 10000.0))
+        for i in range(readings)
+    ], batch_size=2000)
+
+    officer = User.objects.create_user('bench_officer', password='bench')
+    UserProfile.objects.create(user=officer, name='Bench Officer', email='officer@example.com',
+                               user_type='officer')
+    farmer = User.objects.create_user('bench_farmer', password='bench')
+    UserProfile.objects.create(user=farmer, name='Bench Farmer', email='farmer@example.com',
+                               user_type='farmer', location_associated=location_names[0])
+    return tank_ids, officer, farmer
+
+
+def make_app():
+    """
+    Returns (app, root). With a display the real window is built (withdrawn);
+    without one only the non-widget state the benchmarked methods need is set up.
+    """
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        app = diptank_monitor_app.DiptankMonitorApp.__new__(diptank_monitor_app.DiptankMonitorApp)
+        app.forecaster = LevelForecaster()
+        app.pump_scheduler = PumpScheduler(forecaster=app.forecaster)
+        app.selected_tank_id = None
+        app.recorder = None
+        return app, None
+    root.withdraw()
+    app = diptank_monitor_app.DiptankMonitorApp(root)
+    root.update()
+    return app, root
+
+
+def measure(func, repeat, warmup=2):
+    """Times func() `repeat` times and returns wall time, query count and peak memory."""
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        queries.append(len(ctx.captured_queries))
+
+    # Separate pass for memory so tracemalloc's overhead doesn't skew the timings
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'queries': max(queries),
+        'peak_kb': peak / 1024,
+    }
+
+
+def run_benchmarks(args):
+    """Seeds the database, runs every benchmark and returns {name: result}."""
+    tank_ids, officer, farmer = seed_database(args.tanks, args.locations, args.readings, args.seed)
+    app, root = make_app()
+    selected = tank_ids[0]
+    app.selected_tank_id = selected
+    results = {}
+
+    def update_all_displays():
+        data = app._fetch_display_data(selected)
+        if root is not None:
+            app._apply_display_data(data)
+            root.update_idletasks()
+
+    results['monitor.update_all_displays'] = measure(update_all_displays, args.repeat)
+
+    results['monitor.simulate_sensor_reading'] = measure(
+        lambda: app._record_simulated_reading(selected), args.repeat)
+
+    # Keep the pumped tanks below their max threshold for the whole run
+    pump_ids = tank_ids[:args.pumps]
+    Tank.objects.filter(pk__in=pump_ids).update(current_level=0.0)
+    # Tick the scheduler directly instead of starting its timer thread
+    scheduler = PumpScheduler(write_buffer=ReadingWriteBuffer(max_pending=10 ** 9))
+    for tank_id in pump_ids:
+        scheduler.pumps[tank_id] = PumpState(tank_id, flow_rate=0.001)
+
+    def pump_iteration():
+        scheduler.tick()
+        scheduler.write_buffer.flush()
+
+    results['monitor.pump_iteration'] = measure(pump_iteration, args.repeat)
+
+    results['classification.load_fleet_columns'] = measure(FleetColumns.from_queryset, args.repeat)
+    results['classification.classify_fleet'] = measure(lambda: classify(FleetColumns.from_queryset()), args.repeat)
+
+    client = Client()
+    for name, user in (('dashboard_farmer', farmer), ('dashboard_officer', officer)):
+        client.force_login(user)
+        url = reverse(name)
+        response = client.get(url)
+        if response.status_code != 200:
+            print(f"Warning: GET {url} returned {response.status_code}; timing it anyway.")
+        results[f'views.{name}'] = measure(lambda: client.get(url), args.repeat)
+
+    scheduler.shutdown()
+    if root is not None:
+        app.on_close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regression messages for results that are worse than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['median_ms'] > base['median_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: median {result['median_ms']:.2f} ms vs baseline {base['median_ms']:.2f} ms")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries vs baseline {base['queries']}")
+        if result['peak_kb'] > base['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {result['peak_kb']:.0f} KiB vs baseline {base['peak_kb']:.0f} KiB")
+    return regressions
+
+
+def print_report(results):
+    """Prints one line per benchmark."""
+    print(f"{'benchmark':<36} {'median ms':>10} {'p95 ms':>10} {'mean ms':>10} {'queries':>8} {'peak KiB':>10}")
+    for name, r in results.items():
+        print(f"{name:<36} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f} {r['mean_ms']:>10.2f} "
+              f"{r['queries']:>8} {r['peak_kb']:>10.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the Diptank monitor and dashboards.")
+    parser.add_argument('--tanks', type=int, default=1000, help="Tanks to seed (default: 1000).")
+    parser.add_argument('--locations', type=int, default=20, help="Distinct tank locations (default: 20).")
+    parser.add_argument('--readings', type=int, default=10000, help="SensorReading rows to seed (default: 10000).")
+    parser.add_argument('--pumps', type=int, default=100, help="Tanks pumping in the pump benchmark (default: 100).")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed runs per benchmark (default: 20).")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the seeded data (default: 42).")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline file to compare with or save to.")
+    parser.add_argument('--save-baseline', action='store_true', help="Save this run as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown/memory growth before flagging a regression (default: 0.25 = 25%%).")
+    args = parser.parse_args(argv)
+    if min(args.tanks, args.locations, args.pumps, args.repeat) <= 0 or args.readings < 0:
+        parser.error("--tanks, --locations, --pumps and --repeat must be positive.")
+    args.pumps = min(args.pumps, args.tanks)
+
+    config = {key: getattr(args, key) for key in ('tanks', 'locations', 'readings', 'pumps', 'seed')}
+    results = run_benchmarks(args)
+    print(f"Scenario: {config}")
+    print_report(results)
+    columns = FleetColumns.from_queryset()
+    print(f"Fleet columns: {len(columns)} tanks, {len(columns.locations)} locations "
+          f"in {columns.nbytes / 1024:.0f} KiB")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print(f"Warning: baseline was recorded for {baseline.get('config')}; comparisons may not be meaningful.")
+    regressions = compare(results, baseline.get('results', {}), args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        for message in regressions:
+            print(f"  - {message}")
+        return 1
+    print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+# benchmarks/settings.py
+# Settings for the benchmark suite: the project settings with a throwaway
+# SQLite database, so benchmarks never touch a real database.
+
+import os
+
+from config.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DIPTANK_BENCHMARK_DB', os.path.join(os.path.dirname(__file__), 'benchmark.sqlite3')),
+    }
+}
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+# Seeding users should not dominate setup time
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
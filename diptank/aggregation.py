@@ -0,0 +1,31 @@
+# diptank/aggregation.py
+# Fleet-wide and per-location water level totals, shared by the monitor app and
+# the dashboards. The fleet is loaded with one streamed query into FleetColumns
+# and summed per location by the batched classification pass (classification.py).
+
+from .classification import FleetColumns, classify
+
+
+def level_summary(queryset=None):
+    """
+    Returns the fleet totals and the per-location totals of a Tank queryset
+    (all tanks by default), in one query.
+
+    The result is a dict of the form:
+        {
+            'total_current_level': float,
+            'total_capacity': float,
+            'locations': {location: {'current_level': float, 'capacity': float}, ...},
+        }
+    with 'locations' ordered alphabetically by location name.
+    """
+    fleet = classify(FleetColumns.from_queryset(queryset))
+    return {
+        'total_current_level': fleet.total_current_level,
+        'total_capacity': fleet.total_capacity,
+        'locations': {
+            location: {'current_level': level, 'capacity': capacity}
+            for location, level, capacity in zip(fleet.columns.locations, fleet.location_levels.tolist(),
+                                                 fleet.location_capacities.tolist())
+        },
+    }
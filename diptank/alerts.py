@@ -0,0 +1,130 @@
+# diptank/alerts.py
+# Alert engine: turns a stream of level readings into at most one Alert row per
+# threshold crossing instead of one per reading.
+#
+# Each (tank, alert_type) condition is either open or resolved. A condition
+# opens when a reading crosses its threshold and only resolves once the level
+# is back inside the threshold by ALERT_HYSTERESIS percentage points, so a
+# level hovering around a threshold does not flap. An Alert row is written
+# when a condition opens, unless the same condition already wrote one within
+# the rate-limit window.
+#
+# Alert rows carry no resolved flag, so the state of a tank the engine has not
+# seen yet is rebuilt from the database on its first reading: a condition is
+# open if its latest Alert row has no reading after it that cleared it. A
+# restarted monitor, or another process such as a load generator worker,
+# therefore does not write the same alert again.
+
+import threading
+import time
+
+from django.utils import timezone
+
+from .models import Alert, SensorReading
+from .simulation import ALERT_HYSTERESIS, ALERT_RATE_LIMIT_WINDOW, level_percentage, alert_message
+
+
+class AlertCondition:
+    """Open/resolved state of one (tank, alert_type) condition."""
+
+    def __init__(self):
+        self.is_open = False
+        self.opened_at = None
+        self.resolved_at = None
+        self.last_written_at = None
+
+
+class AlertEngine:
+    """
+    Tracks alert conditions per tank and decides which readings produce an Alert row.
+
+    evaluate() returns the alert types that should be written for a reading;
+    process() also builds the Alert instances. Alert volume is therefore
+    bounded by condition changes (and the rate-limit window), not by how
+    often readings arrive. Thread-safe.
+    """
+
+    def __init__(self, hysteresis=ALERT_HYSTERESIS, rate_limit_window=ALERT_RATE_LIMIT_WINDOW, clock=time.monotonic,
+                 seed_from_alerts=True):
+        self.hysteresis = hysteresis
+        self.rate_limit_window = rate_limit_window
+        self.clock = clock
+        self.seed_from_alerts = seed_from_alerts
+        self.conditions = {}  # (tank_id, alert_type) -> AlertCondition
+        self._seeded = set()  # tank_ids whose conditions were loaded from their Alert rows
+        self.alerts_written = 0
+        self.alerts_suppressed = 0
+        self._lock = threading.Lock()
+
+    def evaluate(self, tank_id, percentage, min_threshold, max_threshold):
+        """Updates the tank's conditions for a reading. Returns the alert types to write (usually none)."""
+        to_write = []
+        now = self.clock()
+        with self._lock:
+            for alert_type, breached, cleared in (
+                    ('low_water', percentage < min_threshold, percentage >= min_threshold + self.hysteresis),
+                    ('high_water', percentage > max_threshold, percentage <= max_threshold - self.hysteresis)):
+                condition = self.conditions.get((tank_id, alert_type))
+                if condition is None:
+                    if not breached:
+                        continue
+                    condition = self.conditions[(tank_id, alert_type)] = AlertCondition()
+
+                if breached and not condition.is_open:
+                    condition.is_open = True
+                    condition.opened_at = now
+                    if condition.last_written_at is None or now - condition.last_written_at >= self.rate_limit_window:
+                        condition.last_written_at = now
+                        self.alerts_written += 1
+                        to_write.append(alert_type)
+                    else:
+                        self.alerts_suppressed += 1
+                elif cleared and condition.is_open:
+                    condition.is_open = False
+                    condition.resolved_at = now
+        return to_write
+
+    def seed(self, tank):
+        """Loads a tank's conditions from its latest Alert rows, once per tank. Queries outside the lock."""
+        if tank.tank_id in self._seeded:
+            return
+        cleared_filters = {
+            'low_water': {'water_level__gte': tank.capacity * (tank.min_threshold + self.hysteresis) / 100.0},
+            'high_water': {'water_level__lte': tank.capacity * (tank.max_threshold - self.hysteresis) / 100.0},
+        }
+        states = {}  # alert_type -> (is_open, seconds since the alert was written)
+        for alert_type, cleared in cleared_filters.items():
+            written = (Alert.objects.filter(tank_id=tank.tank_id, alert_type=alert_type)
+                       .order_by('-timestamp').values_list('timestamp', flat=True).first())
+            if written is None:
+                continue
+            is_open = not SensorReading.objects.filter(tank_id=tank.tank_id, timestamp__gt=written,
+                                                       **cleared).exists()
+            states[alert_type] = (is_open, max((timezone.now() - written).total_seconds(), 0.0))
+        with self._lock:
+            if tank.tank_id in self._seeded:
+                return
+            self._seeded.add(tank.tank_id)
+            now = self.clock()
+            for alert_type, (is_open, age) in states.items():
+                condition = self.conditions.setdefault((tank.tank_id, alert_type), AlertCondition())
+                condition.is_open = is_open
+                condition.last_written_at = now - age
+                if is_open:
+                    condition.opened_at = now - age
+
+    def process(self, tank, level, suffix=""):
+        """Evaluates a reading for a Tank and returns the unsaved Alert instances to write."""
+        if self.seed_from_alerts:
+            self.seed(tank)
+        percentage = level_percentage(level, tank.capacity)
+        return [
+            Alert(tank_id=tank.tank_id, alert_type=alert_type,
+                  message=alert_message(tank.tank_id, tank.location, alert_type, percentage,
+                                        tank.min_threshold, tank.max_threshold, suffix=suffix))
+            for alert_type in self.evaluate(tank.tank_id, percentage, tank.min_threshold, tank.max_threshold)
+        ]
+
+
+# The process-wide engine shared by the monitor's sensor and pump paths
+alert_engine = AlertEngine()
@@ -0,0 +1,11 @@
+# diptank/apps.py
+
+from django.apps import AppConfig
+
+
+class DiptankConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'diptank'
+
+    def ready(self):
+        from . import signals  # noqa: F401 -- connects the model signal receivers in every process
@@ -0,0 +1,232 @@
+# diptank/bulk.py
+# Bulk tank import and streaming exports of tanks and readings.
+#
+# Imports read CSV or JSON Lines one row at a time (a plain JSON array is also
+# accepted but parsed whole), validate every row with TankForm (the same rules
+# as the officer dashboard's single-tank form) and insert the valid ones with
+# bulk_create in batches. Exports stream rows from a server-side iterator, so
+# neither direction holds the whole table in memory.
+#
+# A file that cannot be read to the end (not UTF-8, broken CSV quoting) stops
+# the import at the failing row. The valid rows before it are still imported,
+# and the report says where it stopped (file_error).
+
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .forms import TankForm
+from .locations import resolve_locations
+from .models import Tank, SensorReading
+from .summary import invalidate_summary
+from .tank_cache import bump_tank_generation
+
+# Tanks inserted per bulk_create statement
+IMPORT_BATCH_SIZE = 500
+# Row errors kept in an import report; later failing rows are only counted
+IMPORT_MAX_REPORTED_ERRORS = 1000
+# Rows fetched per round trip when exporting
+EXPORT_CHUNK_SIZE = 2000
+
+IMPORT_FORMATS = ('csv', 'jsonl', 'json')
+EXPORT_FORMATS = ('csv', 'jsonl')
+TANK_EXPORT_FIELDS = ['tank_id'] + TankForm.Meta.fields
+READING_EXPORT_FIELDS = ['tank_id', 'water_level', 'timestamp']
+
+
+class ImportFileError:
+    """Yielded by iter_rows() in place of a row when the rest of the file cannot be read."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+class ImportReport:
+    """Outcome of an import: rows read, tanks created, the per-row validation errors and any file error."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # [(row number, {field: [messages]})], at most IMPORT_MAX_REPORTED_ERRORS
+        self.file_error = None  # (row number, message) where reading the file stopped
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, errors))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.error_count,
+            'errors': [{'row': row_number, 'errors': errors} for row_number, errors in self.errors],
+            'errors_truncated': self.error_count > len(self.errors),
+            'file_error': None if self.file_error is None else {
+                'row': self.file_error[0],
+                'error': self.file_error[1],
+                'detail': f"The file could not be read from row {self.file_error[0]} on; "
+                          f"the {self.created} valid rows before it were imported.",
+            },
+        }
+
+
+def guess_format(filename):
+    """Returns 'json', 'jsonl' or 'csv' from a file name (CSV unless it has a JSON extension)."""
+    name = (filename or '').lower()
+    if name.endswith('.json'):
+        return 'json'
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def iter_rows(stream, fmt='csv'):
+    """
+    Yields (row number, dict or error message) from a binary or text stream.
+    CSV needs a header row; JSON Lines is one object per line; JSON is an
+    array of objects and is loaded whole, so prefer the other two for large files.
+
+    If the rest of the file cannot be read, the last pair holds an
+    ImportFileError with the number of the row that failed.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format: {fmt!r} (expected one of {', '.join(IMPORT_FORMATS)})")
+    if not isinstance(stream, io.TextIOBase):
+        stream = _decode_lines(stream)
+
+    # Row 1 of a CSV is the header, so data rows are numbered like the lines of a spreadsheet
+    row_number = 1 if fmt == 'csv' else 0
+    try:
+        for row_number, row in _parse_rows(stream, fmt):
+            yield row_number, row
+    except UnicodeDecodeError as e:
+        yield row_number + 1, ImportFileError(f"The file is not UTF-8 text: {e}")
+    except csv.Error as e:
+        yield row_number + 1, ImportFileError(f"Malformed CSV: {e}")
+
+
+def _decode_lines(stream):
+    # Decoding line by line (not in TextIOWrapper's 8 KB chunks) puts a decode error on the row that holds it
+    for line_number, line in enumerate(stream):
+        yield line.decode('utf-8-sig' if line_number == 0 else 'utf-8')
+
+
+def _parse_rows(stream, fmt):
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield row_number, {key.strip(): value for key, value in row.items() if key is not None}
+        return
+
+    if fmt == 'json':
+        try:
+            rows = json.loads(''.join(stream))
+        except ValueError as e:
+            yield 1, f"Invalid JSON: {e}"
+            return
+        if not isinstance(rows, list):
+            yield 1, "Expected a JSON array of objects."
+            return
+        for row_number, row in enumerate(rows, start=1):
+            yield row_number, row if isinstance(row, dict) else "Expected a JSON object."
+        return
+
+    for row_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        yield row_number, row if isinstance(row, dict) else "Expected a JSON object."
+
+
+def import_tanks(rows, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Validates (row number, row) pairs with TankForm and bulk-inserts the valid
+    tanks, one transaction per batch. Returns an ImportReport. An
+    ImportFileError row ends the import; the valid rows before it are still inserted.
+    """
+    report = ImportReport()
+    batch = []
+
+    def insert(batch):
+        if not dry_run:
+            with transaction.atomic():
+                # bulk_create skips the pre_save receiver that links each tank to its Location
+                locations = resolve_locations({tank.location for tank in batch})
+                for tank in batch:
+                    tank.location_ref = locations.get(tank.location)
+                    if tank.location_ref is not None:
+                        tank.location = tank.location_ref.name
+                Tank.objects.bulk_create(batch, batch_size=batch_size)
+        report.created += len(batch)
+
+    for row_number, row in rows:
+        if isinstance(row, ImportFileError):
+            report.file_error = (row_number, row.message)
+            break
+        report.rows += 1
+        if not isinstance(row, dict):
+            report.add_error(row_number, {'__all__': [row]})
+            continue
+        form = TankForm(data=row)
+        if not form.is_valid():
+            report.add_error(row_number, {field: list(messages) for field, messages in form.errors.items()})
+            continue
+        batch.append(form.save(commit=False))
+        if len(batch) >= batch_size:
+            insert(batch)
+            batch = []
+    if batch:
+        insert(batch)
+
+    # bulk_create sends no post_save signals, so tell the monitors' tank caches and the summary ourselves
+    if report.created and not dry_run:
+        bump_tank_generation()
+        invalidate_summary()
+    return report
+
+
+# --- Exports ---
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def _serialize(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def stream_rows(fields, rows, fmt='csv'):
+    """Yields the lines of a CSV (with header) or JSON Lines export of value tuples."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r} (expected one of {', '.join(EXPORT_FORMATS)})")
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([_serialize(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps({field: _serialize(value) for field, value in zip(fields, row)}) + "\n"
+
+
+def tank_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterates over every tank as a tuple of TANK_EXPORT_FIELDS, a chunk at a time."""
+    return Tank.objects.order_by('tank_id').values_list(*TANK_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def reading_rows(hours=24, tank_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterates over the readings of the last `hours` hours as tuples of READING_EXPORT_FIELDS."""
+    readings = SensorReading.objects.filter(timestamp__gte=timezone.now() - timedelta(hours=hours))
+    if tank_ids is not None:
+        readings = readings.filter(tank_id__in=tank_ids)
+    return readings.order_by('timestamp').values_list(*READING_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
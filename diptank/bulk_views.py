@@ -0,0 +1,79 @@
+# diptank/bulk_views.py
+# Officer endpoints for bulk tank import and streaming exports (see bulk.py).
+#
+#   tanks/import/      - POST a CSV, JSON Lines or JSON file as `file`; returns a JSON report
+#   tanks/export/      - all tanks, ?format=csv (default) or jsonl
+#   readings/export/   - readings of the last ?hours=24, optionally for ?tank=<id> (repeatable)
+
+import math
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from .bulk import (EXPORT_FORMATS, IMPORT_FORMATS, READING_EXPORT_FIELDS, TANK_EXPORT_FIELDS, guess_format,
+                   import_tanks, iter_rows, reading_rows, stream_rows, tank_rows)
+from .models import UserProfile
+
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def _is_officer(user):
+    return UserProfile.objects.filter(user=user, user_type='officer').exists()
+
+
+def _export_response(fields, rows, fmt, filename):
+    response = StreamingHttpResponse(stream_rows(fields, rows, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+@login_required
+@require_POST
+def tank_import_view(request):
+    """Imports the uploaded file and reports how many tanks were created and which rows failed."""
+    if not _is_officer(request.user):
+        return HttpResponseForbidden("Only officers can import tanks.")
+    upload = request.FILES.get('file')
+    if upload is None:
+        return HttpResponseBadRequest("Upload the tanks as a file named 'file'.")
+    fmt = request.POST.get('format') or guess_format(upload.name)
+    if fmt not in IMPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format {fmt!r}; use one of {', '.join(IMPORT_FORMATS)}.")
+
+    # Large uploads are spooled to a temporary file by Django; read it row by row
+    report = import_tanks(iter_rows(upload.file, fmt), dry_run=request.POST.get('dry_run') == '1')
+    ok = report.error_count == 0 and report.file_error is None
+    return JsonResponse(report.as_dict(), status=200 if ok else 207)
+
+
+@login_required
+@require_GET
+def tank_export_view(request):
+    """Streams every tank as CSV or JSON Lines."""
+    if not _is_officer(request.user):
+        return HttpResponseForbidden("Only officers can export tanks.")
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}.")
+    return _export_response(TANK_EXPORT_FIELDS, tank_rows(), fmt, 'tanks')
+
+
+@login_required
+@require_GET
+def reading_export_view(request):
+    """Streams recent sensor readings as CSV or JSON Lines."""
+    if not _is_officer(request.user):
+        return HttpResponseForbidden("Only officers can export readings.")
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}.")
+    try:
+        hours = float(request.GET.get('hours', 24))
+        tank_ids = [int(tank_id) for tank_id in request.GET.getlist('tank')] or None
+        if not math.isfinite(hours) or hours <= 0:
+            raise ValueError(hours)
+        rows = reading_rows(hours, tank_ids)
+    except (OverflowError, ValueError):  # OverflowError: a cutoff before year 1
+        return HttpResponseBadRequest("'hours' must be a positive number and 'tank' a tank ID.")
+    return _export_response(READING_EXPORT_FIELDS, rows, fmt, 'readings')
@@ -0,0 +1,201 @@
+# diptank/classification.py
+# Status classification for tanks, locations and the whole fleet, computed
+# with NumPy over column arrays so a single batched pass classifies every tank.
+#
+# Two rule sets are used throughout the project:
+#   - a tank is Low below its min threshold, High above its max threshold and
+#     Optimal otherwise;
+#   - a location or the fleet as a whole is Critical below
+#     FLEET_CRITICAL_PERCENTAGE, Low below FLEET_LOW_PERCENTAGE and Optimal
+#     otherwise.
+# The monitor app and the dashboards both use the functions below, so the
+# rules live in this module only.
+
+import itertools
+
+import numpy as np
+from django.db.models.functions import Coalesce
+
+from .models import Tank
+
+TANK_STATUSES = ('Optimal', 'Low', 'High')
+FLEET_STATUSES = ('Optimal', 'Low', 'Critical')
+STATUS_COLORS = {'Optimal': 'green', 'Low': 'orange', 'High': 'red', 'Critical': 'red'}
+# Alert type raised for each tank status (see diptank.alerts)
+STATUS_ALERT_TYPES = {'Low': 'low_water', 'High': 'high_water'}
+
+# Example global thresholds for locations and the fleet, in percent of capacity
+FLEET_CRITICAL_PERCENTAGE = 20.0
+FLEET_LOW_PERCENTAGE = 50.0
+
+# Rows fetched per database round trip when loading FleetColumns
+FLEET_COLUMNS_CHUNK_SIZE = 2000
+
+
+def percentages(levels, capacities):
+    """Returns fill levels as percentages of capacity (0 for tanks without capacity)."""
+    levels = np.asarray(levels, dtype=np.float64)
+    capacities = np.asarray(capacities, dtype=np.float64)
+    result = np.zeros(np.broadcast(levels, capacities).shape)
+    np.divide(levels * 100.0, capacities, out=result, where=capacities > 0)
+    return result
+
+
+def tank_status_codes(pcts, min_thresholds, max_thresholds):
+    """Returns an array of indexes into TANK_STATUSES."""
+    pcts = np.asarray(pcts, dtype=np.float64)
+    codes = np.zeros(pcts.shape, dtype=np.int8)
+    codes[pcts > np.asarray(max_thresholds, dtype=np.float64)] = 2
+    codes[pcts < np.asarray(min_thresholds, dtype=np.float64)] = 1  # Low wins if the thresholds overlap
+    return codes
+
+
+def fleet_status_codes(pcts):
+    """Returns an array of indexes into FLEET_STATUSES."""
+    pcts = np.asarray(pcts, dtype=np.float64)
+    codes = np.zeros(pcts.shape, dtype=np.int8)
+    codes[pcts < FLEET_LOW_PERCENTAGE] = 1
+    codes[pcts < FLEET_CRITICAL_PERCENTAGE] = 2
+    return codes
+
+
+def tank_status(percentage, min_threshold, max_threshold):
+    """Returns 'Optimal', 'Low' or 'High' for one tank (tank_status_codes() for a single value)."""
+    if percentage < min_threshold:
+        return 'Low'
+    if percentage > max_threshold:
+        return 'High'
+    return 'Optimal'
+
+
+def fleet_status(percentage):
+    """Returns 'Optimal', 'Low' or 'Critical' for a location or fleet percentage."""
+    if percentage < FLEET_CRITICAL_PERCENTAGE:
+        return 'Critical'
+    if percentage < FLEET_LOW_PERCENTAGE:
+        return 'Low'
+    return 'Optimal'
+
+
+class FleetColumns:
+    """
+    Column arrays for a set of tanks: tank_ids, levels, capacities,
+    min_thresholds, max_thresholds, plus location_codes indexing into the
+    alphabetically sorted `locations` list. Each location name is stored
+    once, so a fleet costs about 44 bytes per tank (see nbytes).
+    """
+
+    def __init__(self, tank_ids, levels, capacities, min_thresholds, max_thresholds, locations):
+        self.tank_ids = np.asarray(tank_ids, dtype=np.int64)
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.capacities = np.asarray(capacities, dtype=np.float64)
+        self.min_thresholds = np.asarray(min_thresholds, dtype=np.float64)
+        self.max_thresholds = np.asarray(max_thresholds, dtype=np.float64)
+        unique, codes = np.unique(np.asarray(locations, dtype=object).astype(str), return_inverse=True)
+        self.locations = unique.tolist()
+        self.location_codes = codes.reshape(-1)
+
+    def __len__(self):
+        return len(self.tank_ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays."""
+        return sum(array.nbytes for array in (self.tank_ids, self.levels, self.capacities, self.min_thresholds,
+                                              self.max_thresholds, self.location_codes))
+
+    @classmethod
+    def from_queryset(cls, queryset=None, chunk_size=FLEET_COLUMNS_CHUNK_SIZE):
+        """
+        Loads the columns of a Tank queryset (all tanks by default) with one
+        query, streamed `chunk_size` rows at a time straight into typed arrays:
+        neither model instances nor a list of every row are ever built. Tanks
+        are placed by the canonical name of their Location (see locations.py).
+        """
+        queryset = Tank.objects.all() if queryset is None else queryset
+        rows = queryset.order_by('tank_id').values_list(
+            'tank_id', 'current_level', 'capacity', 'min_threshold', 'max_threshold',
+            Coalesce('location_ref__name', 'location')
+        ).iterator(chunk_size=chunk_size)
+
+        names = {}  # location -> code, in order of first appearance
+        chunks = []
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            tank_ids, levels, capacities, min_thresholds, max_thresholds, locations = zip(*chunk)
+            chunks.append((
+                np.array(tank_ids, dtype=np.int64), np.array(levels, dtype=np.float64),
+                np.array(capacities, dtype=np.float64), np.array(min_thresholds, dtype=np.float64),
+                np.array(max_thresholds, dtype=np.float64),
+                np.fromiter((names.setdefault(str(location), len(names)) for location in locations),
+                            dtype=np.int32, count=len(locations)),
+            ))
+
+        columns = cls.__new__(cls)
+        if chunks:
+            (columns.tank_ids, columns.levels, columns.capacities, columns.min_thresholds, columns.max_thresholds,
+             codes) = (np.concatenate(parts) for parts in zip(*chunks))
+        else:
+            (columns.tank_ids, columns.levels, columns.capacities, columns.min_thresholds, columns.max_thresholds,
+             codes) = (np.empty(0, dtype=dtype) for dtype in (np.int64,) + (np.float64,) * 4 + (np.int32,))
+        # Renumber the codes so they index the alphabetical location list, as __init__ does
+        first_seen = list(names)
+        order = sorted(range(len(first_seen)), key=first_seen.__getitem__)
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        columns.locations = [first_seen[code] for code in order]
+        columns.location_codes = rank[codes]
+        return columns
+
+
+class FleetClassification:
+    """
+    Result of classify(): per-tank `percentages` and `statuses` (codes into
+    TANK_STATUSES), per-location `location_levels`, `location_capacities`,
+    `location_percentages` and `location_statuses` (codes into FLEET_STATUSES),
+    and the fleet totals.
+    """
+
+    def __init__(self, columns, pcts, statuses, location_levels, location_capacities):
+        self.columns = columns
+        self.percentages = pcts
+        self.statuses = statuses
+        self.location_levels = location_levels
+        self.location_capacities = location_capacities
+        self.location_percentages = percentages(location_levels, location_capacities)
+        self.location_statuses = fleet_status_codes(self.location_percentages)
+        self.total_current_level = float(location_levels.sum())
+        self.total_capacity = float(location_capacities.sum())
+        self.total_percentage = float(percentages(self.total_current_level, self.total_capacity))
+        self.total_status = FLEET_STATUSES[int(fleet_status_codes(self.total_percentage))]
+
+
+def classify(columns):
+    """Classifies every tank, location and the fleet in one batched pass over FleetColumns."""
+    pcts = percentages(columns.levels, columns.capacities)
+    statuses = tank_status_codes(pcts, columns.min_thresholds, columns.max_thresholds)
+    n_locations = len(columns.locations)
+    location_levels = np.bincount(columns.location_codes, weights=columns.levels, minlength=n_locations)
+    location_capacities = np.bincount(columns.location_codes, weights=columns.capacities, minlength=n_locations)
+    return FleetClassification(columns, pcts, statuses, location_levels, location_capacities)
+
+
+def classify_summary(summary):
+    """
+    Adds 'percentage' and 'status' to a diptank.aggregation.level_summary()
+    result (to the fleet totals and to every location) and returns it.
+    """
+    locations = summary['locations']
+    levels = np.fromiter((data['current_level'] for data in locations.values()), dtype=np.float64,
+                         count=len(locations))
+    capacities = np.fromiter((data['capacity'] for data in locations.values()), dtype=np.float64,
+                             count=len(locations))
+    pcts = percentages(levels, capacities)
+    for data, pct, status in zip(locations.values(), pcts.tolist(), fleet_status_codes(pcts).tolist()):
+        data['percentage'] = pct
+        data['status'] = FLEET_STATUSES[status]
+    summary['percentage'] = float(percentages(summary['total_current_level'], summary['total_capacity']))
+    summary['status'] = fleet_status(summary['percentage'])
+    return summary
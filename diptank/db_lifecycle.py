@@ -0,0 +1,102 @@
+# diptank/db_lifecycle.py
+# Database connection lifecycle for long-running background threads.
+#
+# Django opens one connection per thread and only recycles it around HTTP
+# requests. The monitor's threads live for the whole session instead, so they
+# use the helpers below: a WorkerPool of long-lived threads that checks its
+# connection before every job (dropping it if it broke or outlived
+# CONN_MAX_AGE) and closes it when the thread exits, plus
+# configure_persistent_connections() to keep connections open between jobs and
+# health-check them on reuse.
+
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.db import close_old_connections, connections
+
+# Seconds a background thread keeps its connection open (Django's CONN_MAX_AGE)
+MONITOR_CONN_MAX_AGE = 600
+
+
+def configure_persistent_connections(max_age=MONITOR_CONN_MAX_AGE, health_checks=True):
+    """
+    Makes connections opened from now on persistent for `max_age` seconds,
+    with a health check before they are reused (Django's CONN_HEALTH_CHECKS).
+    Call it at startup, before any background thread has connected.
+    """
+    for alias in connections:
+        connections.settings[alias]['CONN_MAX_AGE'] = max_age
+        connections.settings[alias]['CONN_HEALTH_CHECKS'] = health_checks
+
+
+def recycle_connections():
+    """Closes this thread's connections that errored or passed their max age, as Django does per request."""
+    close_old_connections()
+
+
+def close_connections():
+    """Closes every connection this thread opened (call it when the thread is done with the database)."""
+    connections.close_all()
+
+
+class WorkerPool:
+    """
+    A bounded set of long-lived threads running database jobs from one queue.
+
+    Each thread recycles its connection before every job and closes it on
+    exit, so connections are neither leaked nor reopened per job. With
+    size=1 jobs run strictly in submission order.
+    """
+
+    def __init__(self, size=1, name='diptank-db'):
+        self._queue = queue.SimpleQueue()
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(size)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, func):
+        """Queues func() and returns a concurrent.futures.Future for its result."""
+        future = Future()
+        self._queue.put((future, func))
+        return future
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                future, func = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                recycle_connections()
+                try:
+                    result = func()
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            close_connections()
+
+    def shutdown(self, wait=True, timeout=None, cancel_pending=True):
+        """
+        Stops the threads once their current job is done. Pending jobs are
+        cancelled unless `cancel_pending` is False. With `wait`, blocks up to
+        `timeout` seconds per thread.
+        """
+        if cancel_pending:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout)
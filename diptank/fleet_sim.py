@@ -0,0 +1,229 @@
+# diptank/fleet_sim.py
+# Fleet simulation engine: steps the levels, pumps and alerts of every tank at
+# once with NumPy on a simulated clock, so a control policy can be evaluated
+# over days of simulated time in seconds of wall time.
+#
+# The rules match the live system: pumps add their flow rate while on (never
+# past capacity), the default ThresholdPolicy is the monitor's auto pump
+# hysteresis (diptank.simulation.auto_pump_action), and alerts open/resolve
+# with the same hysteresis and rate limit as diptank.alerts.AlertEngine.
+# On top of that, tanks lose water to consumption (e.g. dipping) every step.
+#
+# This module does not touch Django; fleet_sim_store.py loads fleets from and
+# persists results to the models.
+
+import time
+
+import numpy as np
+
+from .simulation import ALERT_HYSTERESIS, ALERT_RATE_LIMIT_WINDOW, PUMP_FLOW_RATE, PUMP_UPDATE_INTERVAL
+
+# Default consumption per tank in liters per second of simulated time
+FLEET_SIM_CONSUMPTION = 0.05
+
+
+class FleetState:
+    """
+    Column arrays describing the fleet: levels, capacities and thresholds (in
+    percent), per-tank pump flow rates and consumption (liters per simulated
+    second) and the current pump states. `tank_ids` and `locations` are only
+    carried along for persistence and reports.
+    """
+
+    def __init__(self, levels, capacities, min_thresholds, max_thresholds, flow_rates=None,
+                 consumption=FLEET_SIM_CONSUMPTION, pump_on=None, tank_ids=None, locations=None):
+        self.levels = np.array(levels, dtype=np.float64)
+        n = len(self.levels)
+        self.capacities = np.broadcast_to(np.asarray(capacities, dtype=np.float64), (n,)).copy()
+        self.min_thresholds = np.broadcast_to(np.asarray(min_thresholds, dtype=np.float64), (n,)).copy()
+        self.max_thresholds = np.broadcast_to(np.asarray(max_thresholds, dtype=np.float64), (n,)).copy()
+        if flow_rates is None:
+            flow_rates = PUMP_FLOW_RATE / PUMP_UPDATE_INTERVAL
+        self.flow_rates = np.broadcast_to(np.asarray(flow_rates, dtype=np.float64), (n,)).copy()
+        self.consumption = np.broadcast_to(np.asarray(consumption, dtype=np.float64), (n,)).copy()
+        self.pump_on = np.zeros(n, dtype=bool) if pump_on is None else np.array(pump_on, dtype=bool)
+        self.tank_ids = None if tank_ids is None else np.asarray(tank_ids, dtype=np.int64)
+        self.locations = locations
+
+    def __len__(self):
+        return len(self.levels)
+
+    @classmethod
+    def random(cls, n, seed=None, capacity=10000.0, min_threshold=20.0, max_threshold=90.0, **kwargs):
+        """Returns a synthetic fleet of `n` tanks with random starting levels."""
+        rng = np.random.default_rng(seed)
+        return cls(rng.uniform(0.1, 0.9, n) * capacity, capacity, min_threshold, max_threshold, **kwargs)
+
+    def percentages(self, levels=None):
+        """Returns levels (the current ones by default) as percentages of capacity."""
+        levels = self.levels if levels is None else levels
+        result = np.zeros(len(self))
+        np.divide(levels * 100.0, self.capacities, out=result, where=self.capacities > 0)
+        return result
+
+
+# --- Control policies ---
+# A policy is a callable policy(sim, percentages) returning the desired pump
+# state of every tank as a boolean array, given the measured fill percentages.
+
+class ThresholdPolicy:
+    """The monitor's auto pump rule: on below the min threshold, off at or above the max threshold."""
+
+    name = 'threshold'
+
+    def __call__(self, sim, percentages):
+        state = sim.state
+        return (state.pump_on | (percentages < state.min_thresholds)) & ~(percentages >= state.max_thresholds)
+
+
+class BandPolicy:
+    """Keeps every tank inside a fixed band: on below `low` percent, off at or above `high` percent."""
+
+    name = 'band'
+
+    def __init__(self, low=40.0, high=80.0):
+        self.low = low
+        self.high = high
+
+    def __call__(self, sim, percentages):
+        return (sim.state.pump_on | (percentages < self.low)) & ~(percentages >= self.high)
+
+
+POLICIES = {
+    ThresholdPolicy.name: ThresholdPolicy,
+    BandPolicy.name: BandPolicy,
+}
+
+
+class SimulationReport:
+    """Totals of a simulation run."""
+
+    def __init__(self, sim, wall_time):
+        self.tanks = len(sim.state)
+        self.steps = sim.steps
+        self.simulated_seconds = sim.clock
+        self.wall_seconds = wall_time
+        self.speedup = sim.clock / wall_time if wall_time > 0 else float('inf')
+        self.alerts_written = dict(sim.alerts_written)
+        self.alerts_suppressed = sim.alerts_suppressed
+        self.pump_switches = sim.pump_switches
+        self.pump_seconds = sim.pump_seconds
+        self.pumped_liters = sim.pumped_liters
+        self.spilled_liters = sim.spilled_liters
+        self.below_min_seconds = sim.below_min_seconds
+        self.above_max_seconds = sim.above_max_seconds
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class FleetSimulation:
+    """
+    Steps a FleetState by `dt` simulated seconds at a time under a control policy.
+
+    `sensor_noise` (a fraction of capacity, like SENSOR_FLUCTUATION) perturbs
+    the levels the policy sees, not the true levels. `consumption_noise` is the
+    relative standard deviation of each step's consumption. With
+    `record_interval` set, the true levels are sampled every that many
+    simulated seconds into `samples` and every written alert is kept in
+    `alert_events`, for persistence.
+    """
+
+    def __init__(self, state, policy=None, dt=PUMP_UPDATE_INTERVAL, seed=None, sensor_noise=0.0,
+                 consumption_noise=0.5, hysteresis=ALERT_HYSTERESIS, rate_limit_window=ALERT_RATE_LIMIT_WINDOW,
+                 record_interval=None):
+        self.state = state
+        self.policy = policy or ThresholdPolicy()
+        self.dt = dt
+        self.rng = np.random.default_rng(seed)
+        self.sensor_noise = sensor_noise
+        self.consumption_noise = consumption_noise
+        self.hysteresis = hysteresis
+        self.rate_limit_window = rate_limit_window
+        self.record_interval = record_interval
+
+        n = len(state)
+        self.clock = 0.0
+        self.steps = 0
+        # Alert conditions, as in AlertEngine: open flags and the time each last wrote an alert
+        self.alert_open = {'low_water': np.zeros(n, dtype=bool), 'high_water': np.zeros(n, dtype=bool)}
+        self.alert_last_written = {'low_water': np.full(n, -np.inf), 'high_water': np.full(n, -np.inf)}
+        self.alerts_written = {'low_water': 0, 'high_water': 0}
+        self.alerts_suppressed = 0
+        self.pump_switches = 0
+        self.pump_seconds = 0.0
+        self.pumped_liters = 0.0
+        self.spilled_liters = 0.0
+        self.below_min_seconds = 0.0
+        self.above_max_seconds = 0.0
+        self.samples = []       # [(clock, levels)] every record_interval
+        self.alert_events = []  # [(clock, alert_type, tank indexes, percentages)]
+        self._next_sample = 0.0
+
+    def step(self):
+        """Advances the fleet by one time step."""
+        state = self.state
+        n = len(state)
+        dt = self.dt
+
+        measured = state.levels
+        if self.sensor_noise:
+            measured = np.clip(measured + self.rng.uniform(-self.sensor_noise, self.sensor_noise, n) * state.capacities,
+                               0.0, state.capacities)
+        pump_on = np.asarray(self.policy(self, state.percentages(measured)), dtype=bool)
+        self.pump_switches += int(np.count_nonzero(pump_on != state.pump_on))
+        state.pump_on = pump_on
+
+        inflow = np.where(pump_on, state.flow_rates * dt, 0.0)
+        outflow = state.consumption * dt
+        if self.consumption_noise:
+            outflow = np.maximum(0.0, outflow * (1.0 + self.consumption_noise * self.rng.standard_normal(n)))
+        levels = state.levels + inflow - outflow
+        spilled = np.maximum(levels - state.capacities, 0.0)
+        state.levels = np.clip(levels, 0.0, state.capacities)
+
+        pumped = int(np.count_nonzero(pump_on))
+        self.pump_seconds += pumped * dt
+        self.pumped_liters += float(inflow.sum() - spilled.sum())
+        self.spilled_liters += float(spilled.sum())
+        self.clock += dt
+        self.steps += 1
+
+        percentages = state.percentages()
+        below = percentages < state.min_thresholds
+        above = percentages > state.max_thresholds
+        self.below_min_seconds += int(np.count_nonzero(below)) * dt
+        self.above_max_seconds += int(np.count_nonzero(above)) * dt
+        self._evaluate_alerts('low_water', below, percentages >= state.min_thresholds + self.hysteresis, percentages)
+        self._evaluate_alerts('high_water', above, percentages <= state.max_thresholds - self.hysteresis, percentages)
+
+        if self.record_interval and self.clock >= self._next_sample:
+            self.samples.append((self.clock, state.levels.copy()))
+            self._next_sample = self.clock + self.record_interval
+
+    def _evaluate_alerts(self, alert_type, breached, cleared, percentages):
+        """Opens/resolves one alert condition for every tank and counts the alerts written."""
+        is_open = self.alert_open[alert_type]
+        last_written = self.alert_last_written[alert_type]
+        opening = breached & ~is_open
+        if opening.any():
+            write = opening & (self.clock - last_written >= self.rate_limit_window)
+            written = int(np.count_nonzero(write))
+            self.alerts_written[alert_type] += written
+            self.alerts_suppressed += int(np.count_nonzero(opening)) - written
+            last_written[write] = self.clock
+            if written and self.record_interval:
+                indexes = np.flatnonzero(write)
+                self.alert_events.append((self.clock, alert_type, indexes, percentages[indexes]))
+        is_open |= breached
+        is_open &= ~cleared
+
+    def run(self, duration, on_step=None):
+        """Runs for `duration` simulated seconds and returns a SimulationReport."""
+        steps = int(round(duration / self.dt))
+        start = time.perf_counter()
+        for _ in range(steps):
+            self.step()
+            if on_step is not None:
+                on_step(self)
+        return SimulationReport(self, time.perf_counter() - start)
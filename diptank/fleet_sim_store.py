@@ -0,0 +1,86 @@
+# diptank/fleet_sim_store.py
+# Django adapter for the fleet simulation engine (fleet_sim.py): builds a
+# FleetState from the Tank table and writes a finished simulation back in bulk.
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .classification import FleetColumns
+from .fleet_sim import FLEET_SIM_CONSUMPTION, FleetState
+from .models import Tank, SensorReading, Alert
+from .rollups import record_readings
+from .simulation import alert_message
+from .summary import invalidate_summary
+from .tank_cache import bump_tank_generation
+
+# Rows per INSERT statement when persisting
+FLEET_SIM_BATCH_SIZE = 2000
+
+
+def load_fleet_state(queryset=None, consumption=FLEET_SIM_CONSUMPTION, flow_rates=None):
+    """Builds a FleetState from Tank rows (all tanks by default) with one streamed query."""
+    columns = FleetColumns.from_queryset(queryset)
+    # Every tank of a location shares the one interned name string
+    locations = [columns.locations[code] for code in columns.location_codes.tolist()]
+    return FleetState(columns.levels, columns.capacities, columns.min_thresholds, columns.max_thresholds,
+                      flow_rates=flow_rates, consumption=consumption, tank_ids=columns.tank_ids,
+                      locations=locations)
+
+
+def persist_simulation(sim, start_time=None, batch_size=FLEET_SIM_BATCH_SIZE, update_levels=True):
+    """
+    Writes a recorded simulation (see FleetSimulation.record_interval) to the database:
+    one SensorReading per tank per sample and the alerts it wrote, both stamped
+    `start_time` + simulated time, and (if `update_levels`) the final tank
+    levels. Without `start_time` the run is placed so that it ends now, keeping
+    every row in the past. Returns (readings written, alerts written).
+    """
+    state = sim.state
+    if state.tank_ids is None:
+        raise ValueError("Only fleets loaded with load_fleet_state() can be persisted.")
+    if start_time is None:
+        start_time = timezone.now() - timedelta(seconds=sim.clock)
+    tank_ids = state.tank_ids.tolist()
+
+    readings_written = 0
+    batch = []
+    for clock, levels in sim.samples:
+        timestamp = start_time + timedelta(seconds=clock)
+        batch.extend(SensorReading(tank_id=tank_id, water_level=level, timestamp=timestamp)
+                     for tank_id, level in zip(tank_ids, levels.tolist()))
+        if len(batch) >= batch_size:
+            readings_written += _write_readings(batch, batch_size)
+            batch = []
+    readings_written += _write_readings(batch, batch_size)
+
+    alerts = []
+    for clock, alert_type, indexes, percentages in sim.alert_events:
+        for index, percentage in zip(indexes.tolist(), percentages.tolist()):
+            location = state.locations[index] if state.locations else ''
+            alerts.append(Alert(tank_id=tank_ids[index], alert_type=alert_type,
+                                timestamp=start_time + timedelta(seconds=clock),
+                                message=alert_message(tank_ids[index], location, alert_type, percentage,
+                                                      state.min_thresholds[index], state.max_thresholds[index],
+                                                      suffix=f" (simulated, t+{clock:.0f}s)")))
+    with transaction.atomic():
+        Alert.objects.bulk_create(alerts, batch_size=batch_size)
+        if update_levels:
+            Tank.objects.bulk_update(
+                [Tank(pk=tank_id, current_level=level) for tank_id, level in zip(tank_ids, state.levels.tolist())],
+                ['current_level'], batch_size=batch_size)
+    if update_levels:
+        # bulk_update sends no post_save signals
+        bump_tank_generation()
+        invalidate_summary()
+    return readings_written, len(alerts)
+
+
+def _write_readings(readings, batch_size):
+    if not readings:
+        return 0
+    with transaction.atomic():
+        SensorReading.objects.bulk_create(readings, batch_size=batch_size)
+        record_readings(readings)
+    return len(readings)
@@ -0,0 +1,217 @@
+# diptank/forecast.py
+# Level-trend forecasting for predictive pump control.
+#
+# Each tank keeps its last FORECAST_WINDOW readings in a small NumPy ring
+# buffer (two float arrays). The fill/drain rate is the least-squares slope of
+# level over time across the buffer, from which forecast() extrapolates the
+# current level and the seconds until the tank crosses its min or max
+# threshold. Callers use next_check_delay() to look at a tank again only when a
+# crossing is near, and predictive_pump_action() to start a pump up to
+# PUMP_LEAD_TIME seconds before the tank would run low.
+#
+# Buffers are seeded from recent SensorReading rows (load_history) and then
+# fed with the readings the monitor writes. A pump changes the trend, so a
+# tank's buffer is reset whenever its pump is switched.
+
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import SensorReading
+from .simulation import auto_pump_action
+
+# Readings kept per tank
+FORECAST_WINDOW = 32
+# Readings needed before a rate is trusted
+FORECAST_MIN_SAMPLES = 3
+# How far back load_history() looks for readings
+FORECAST_HISTORY = timedelta(hours=1)
+# Start a pump when the tank is predicted to fall below its min threshold within this many seconds
+PUMP_LEAD_TIME = 120.0
+# Bounds (in seconds) of the delay before a tank is checked again
+PUMP_CHECK_MIN_INTERVAL = 1.0
+PUMP_CHECK_MAX_INTERVAL = 300.0
+
+
+class LevelTrend:
+    """Ring buffer of one tank's latest (time, level) samples."""
+
+    __slots__ = ('times', 'levels', 'head', 'count')
+
+    def __init__(self, size=FORECAST_WINDOW):
+        self.times = np.zeros(size)
+        self.levels = np.zeros(size)
+        self.head = 0   # Index the next sample is written to
+        self.count = 0  # Samples held, up to size
+
+    def add(self, at, level):
+        self.times[self.head] = at
+        self.levels[self.head] = level
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def last(self):
+        """Returns the newest (time, level), or None when empty."""
+        if not self.count:
+            return None
+        index = (self.head - 1) % len(self.times)
+        return self.times[index], self.levels[index]
+
+    def samples(self):
+        """Returns the held (time, level) samples, oldest first."""
+        start = (self.head - self.count) % len(self.times)
+        return [(float(self.times[(start + i) % len(self.times)]), float(self.levels[(start + i) % len(self.times)]))
+                for i in range(self.count)]
+
+    def clear(self):
+        self.head = self.count = 0
+
+    def rate(self, min_samples=FORECAST_MIN_SAMPLES):
+        """Returns the least-squares fill (+) or drain (-) rate in liters per second, or None."""
+        if self.count < min_samples:
+            return None
+        # The slope does not depend on sample order, so the ring needs no unrolling
+        times = self.times[:self.count] - self.times[:self.count].mean()
+        variance = float(np.dot(times, times))
+        if variance <= 0.0:
+            return None
+        return float(np.dot(times, self.levels[:self.count])) / variance
+
+
+class Forecast:
+    """A tank's extrapolated level, rate and seconds until it crosses its thresholds (None if it never will)."""
+
+    __slots__ = ('level', 'rate', 'seconds_to_min', 'seconds_to_max')
+
+    def __init__(self, level, rate, seconds_to_min, seconds_to_max):
+        self.level = level
+        self.rate = rate
+        self.seconds_to_min = seconds_to_min
+        self.seconds_to_max = seconds_to_max
+
+
+def _seconds_to(level, target, rate, falling):
+    if falling:
+        if level <= target:
+            return 0.0
+        return (level - target) / -rate if rate < 0 else None
+    if level >= target:
+        return 0.0
+    return (target - level) / rate if rate > 0 else None
+
+
+class LevelForecaster:
+    """Thread-safe LevelTrend per tank_id."""
+
+    def __init__(self, window=FORECAST_WINDOW, min_samples=FORECAST_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._trends = {}
+        self._seeded = set()  # tank_ids load_history() has run for
+        self._lock = threading.Lock()
+
+    def observe(self, tank_id, level, at=None):
+        """Adds a reading (at the current time unless `at`, in epoch seconds, is given)."""
+        with self._lock:
+            trend = self._trends.get(tank_id)
+            if trend is None:
+                trend = self._trends[tank_id] = LevelTrend(self.window)
+            trend.add(time.time() if at is None else at, level)
+
+    def observe_many(self, levels, at=None):
+        """Adds {tank_id: level} readings taken at the same time."""
+        at = time.time() if at is None else at
+        for tank_id, level in levels.items():
+            self.observe(tank_id, level, at)
+
+    def has_history(self, tank_id):
+        """True once load_history() has seeded the tank (live readings alone do not count)."""
+        with self._lock:
+            return tank_id in self._seeded
+
+    def reset(self, tank_id):
+        """Starts a new trend for a tank (e.g. when its pump is switched); readings before it no longer count."""
+        with self._lock:
+            trend = self._trends.get(tank_id)
+            if trend is not None:
+                trend.clear()
+
+    def forget(self, tank_id):
+        with self._lock:
+            self._trends.pop(tank_id, None)
+            self._seeded.discard(tank_id)
+
+    def load_history(self, tank_ids, history=FORECAST_HISTORY):
+        """
+        Seeds the buffers of the given tanks from their SensorReading rows of
+        the last `history`. Readings observed since that are newer than the
+        history are kept on top of it. The query runs before the lock is taken,
+        so observe() is never held up by it.
+        """
+        tank_ids = list(tank_ids)
+        seeded = {tank_id: LevelTrend(self.window) for tank_id in tank_ids}
+        rows = (SensorReading.objects.filter(tank_id__in=tank_ids, timestamp__gte=timezone.now() - history)
+                .order_by('timestamp').values_list('tank_id', 'water_level', 'timestamp'))
+        for tank_id, level, timestamp in rows.iterator():
+            seeded[tank_id].add(timestamp.timestamp(), level)
+        with self._lock:
+            for tank_id, trend in seeded.items():
+                live = self._trends.get(tank_id)
+                if live is not None:
+                    last = trend.last()
+                    for at, level in live.samples():
+                        if last is None or at > last[0]:
+                            trend.add(at, level)
+                self._trends[tank_id] = trend
+                self._seeded.add(tank_id)
+
+    def forecast(self, tank_id, capacity, min_threshold, max_threshold, level=None, now=None):
+        """
+        Returns a Forecast for a tank with the given capacity and thresholds (in
+        percent), or None without enough readings. `level` overrides the
+        extrapolated current level (e.g. with the level just read from the cache).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            trend = self._trends.get(tank_id)
+            if trend is None:
+                return None
+            rate = trend.rate(self.min_samples)
+            last = trend.last()
+        if rate is None:
+            return None
+        if level is None:
+            last_time, last_level = last
+            level = min(max(last_level + rate * (now - last_time), 0.0), capacity)
+        return Forecast(level, rate,
+                        _seconds_to(level, capacity * min_threshold / 100.0, rate, falling=True),
+                        _seconds_to(level, capacity * max_threshold / 100.0, rate, falling=False))
+
+
+def next_check_delay(forecast, lead_time=PUMP_LEAD_TIME, min_interval=PUMP_CHECK_MIN_INTERVAL,
+                     max_interval=PUMP_CHECK_MAX_INTERVAL):
+    """Returns the seconds until a tank should be checked again: sooner the nearer a crossing is."""
+    if forecast is None:
+        return max_interval
+    delays = [max_interval]
+    if forecast.seconds_to_min is not None:
+        delays.append(forecast.seconds_to_min - lead_time)
+    if forecast.seconds_to_max is not None:
+        delays.append(forecast.seconds_to_max)
+    return min(max(min(delays), min_interval), max_interval)
+
+
+def predictive_pump_action(percentage, min_threshold, max_threshold, pump_running, forecast,
+                           lead_time=PUMP_LEAD_TIME):
+    """
+    auto_pump_action(), plus turning the pump on early when the forecast has
+    the tank falling below its min threshold within `lead_time` seconds.
+    """
+    action = auto_pump_action(percentage, min_threshold, max_threshold, pump_running)
+    if action is None and not pump_running and forecast is not None and percentage < max_threshold \
+            and forecast.seconds_to_min is not None and forecast.seconds_to_min <= lead_time:
+        return True
+    return action
@@ -0,0 +1,87 @@
+# diptank/listing_views.py
+# Paginated JSON listings for the dashboards (see pagination.py).
+#
+#   tanks/page/     - ?after=<cursor>&q=<search>&size=<n>; farmers only see their location
+#   readings/page/  - ?tank=<id>&before=<cursor>&size=<n>
+#
+# Every response carries `next`, the cursor of the following page (null on the last one).
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .classification import TANK_STATUSES, percentages, tank_status_codes
+from .locations import farmer_tank_filter
+from .models import Tank, UserProfile
+from .pagination import (READING_PAGE_SIZE, TANK_PAGE_SIZE, decode_cursor, encode_cursor, reading_page,
+                         tank_page)
+
+TANK_PAGE_FIELDS = ('tank_id', 'location', 'current_level', 'capacity', 'min_threshold', 'max_threshold')
+
+
+def _visible_tanks(user):
+    """Returns the tanks a user's dashboard may list, or None if they have no dashboard."""
+    profile = UserProfile.objects.filter(user=user).first()
+    if profile is None:
+        return None
+    if profile.user_type == 'officer':
+        return Tank.objects.all()
+    if profile.user_type == 'farmer':
+        tank_filter = farmer_tank_filter(profile)
+        return Tank.objects.none() if tank_filter is None else Tank.objects.filter(**tank_filter)
+    return None
+
+
+def _page_size(request, default):
+    return int(request.GET.get('size', default))
+
+
+@login_required
+@require_GET
+def tank_page_view(request):
+    """One page of tanks ordered by location and ID, with percentage and status."""
+    tanks = _visible_tanks(request.user)
+    if tanks is None:
+        return HttpResponseForbidden("No dashboard for this user.")
+    try:
+        rows, next_cursor = tank_page(tanks, after=decode_cursor(request.GET.get('after')),
+                                      page_size=_page_size(request, TANK_PAGE_SIZE), search=request.GET.get('q'),
+                                      fields=TANK_PAGE_FIELDS)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    results = [dict(zip(TANK_PAGE_FIELDS, row)) for row in rows]
+    if results:
+        pcts = percentages([tank['current_level'] for tank in results], [tank['capacity'] for tank in results])
+        statuses = tank_status_codes(pcts, [tank['min_threshold'] for tank in results],
+                                     [tank['max_threshold'] for tank in results])
+        for tank, pct, status in zip(results, pcts.tolist(), statuses.tolist()):
+            tank['percentage'] = pct
+            tank['status'] = TANK_STATUSES[status]
+    return JsonResponse({'results': results, 'next': encode_cursor(next_cursor)})
+
+
+@login_required
+@require_GET
+def reading_page_view(request):
+    """One page of a tank's readings, newest first."""
+    tanks = _visible_tanks(request.user)
+    if tanks is None:
+        return HttpResponseForbidden("No dashboard for this user.")
+    try:
+        tank_id = int(request.GET['tank'])
+        before = decode_cursor(request.GET.get('before'), kind='reading')
+        page_size = _page_size(request, READING_PAGE_SIZE)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("Pass ?tank=<id> and, for later pages, the 'next' cursor as ?before=.")
+    if not tanks.filter(pk=tank_id).exists():
+        return HttpResponseForbidden("This tank is not on your dashboard.")
+    try:
+        rows, next_cursor = reading_page(tank_id, before=before, page_size=page_size)
+    except (TypeError, ValidationError, ValueError):
+        return HttpResponseBadRequest("Invalid page cursor.")
+    return JsonResponse({
+        'results': [{'water_level': level, 'timestamp': timestamp.isoformat()} for level, timestamp in rows],
+        'next': encode_cursor(next_cursor),
+    })
@@ -0,0 +1,168 @@
+# diptank/live.py
+# Live updates for the dashboards. The monitor publishes changed tank levels
+# and new alerts to a broker once they are committed; the streaming views in
+# live_views.py read them back and push only the deltas to open dashboards.
+#
+# Two brokers share one interface:
+#   - CacheBroker (the default) keeps a numbered event log in Django's cache,
+#     so it reaches a web server running in another process as long as the
+#     default cache is shared (the file-based, database or a Redis backend);
+#   - LocalBroker keeps the log in memory for a monitor and web server running
+#     in the same process (development and benchmarks).
+# Select one with settings.DIPTANK_LIVE_BROKER = 'cache' or 'local'.
+
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+LIVE_SEQUENCE_CACHE_KEY = 'diptank:live:seq'
+LIVE_EVENT_CACHE_KEY = 'diptank:live:event:{}'
+# How long published events stay readable (in seconds); slower clients get a 'reset'
+LIVE_EVENT_TTL = 60
+# Most events returned by one read; a client further behind gets a 'reset'
+LIVE_MAX_BACKLOG = 500
+# How often CacheBroker readers look for new events (in seconds)
+LIVE_POLL_INTERVAL = 0.25
+# How long a reader waits for an event whose number was taken but not yet stored
+LIVE_MISSING_EVENT_GRACE = 1.0
+
+RESET_EVENT = ('reset', {})
+
+
+class CacheBroker:
+    """
+    Event log in Django's cache: an incrementing sequence number plus one
+    entry per event that expires after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=LIVE_EVENT_TTL, poll_interval=LIVE_POLL_INTERVAL, max_backlog=LIVE_MAX_BACKLOG):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.max_backlog = max_backlog
+
+    def publish(self, event_type, data):
+        """Appends an event and returns its sequence number."""
+        try:
+            seq = cache.incr(LIVE_SEQUENCE_CACHE_KEY)
+        except ValueError:
+            # First event since the cache was cleared
+            cache.add(LIVE_SEQUENCE_CACHE_KEY, 0, timeout=None)
+            seq = cache.incr(LIVE_SEQUENCE_CACHE_KEY)
+        cache.set(LIVE_EVENT_CACHE_KEY.format(seq), (event_type, data), self.ttl)
+        return seq
+
+    def latest(self):
+        """Returns the sequence number of the last published event."""
+        return cache.get(LIVE_SEQUENCE_CACHE_KEY) or 0
+
+    def events_since(self, seq, timeout):
+        """
+        Waits up to `timeout` seconds for events after `seq`.
+        Returns (new seq, [(event_type, data), ...]); the list holds RESET_EVENT
+        if events after `seq` are no longer available.
+        """
+        deadline = time.monotonic() + timeout
+        missing_since = None
+        while True:
+            latest = self.latest()
+            if latest < seq or latest - seq > self.max_backlog:
+                return latest, [RESET_EVENT]
+            if latest > seq:
+                keys = [LIVE_EVENT_CACHE_KEY.format(n) for n in range(seq + 1, latest + 1)]
+                stored = cache.get_many(keys)
+                events = []
+                for key in keys:
+                    if key not in stored:
+                        break
+                    events.append(stored[key])
+                    seq += 1
+                if events:
+                    return seq, events
+                # The next event is not there: a publisher between incr() and set(), or it expired
+                now = time.monotonic()
+                if missing_since is None:
+                    missing_since = now
+                elif now - missing_since >= LIVE_MISSING_EVENT_GRACE:
+                    return latest, [RESET_EVENT]
+            if time.monotonic() >= deadline:
+                return seq, []
+            time.sleep(self.poll_interval)
+
+
+class LocalBroker:
+    """In-memory event log for publishers and readers in the same process."""
+
+    def __init__(self, max_backlog=LIVE_MAX_BACKLOG):
+        self.max_backlog = max_backlog
+        self._events = collections.deque(maxlen=max_backlog)  # (seq, event_type, data)
+        self._seq = 0
+        self._condition = threading.Condition()
+
+    def publish(self, event_type, data):
+        """Appends an event, wakes waiting readers and returns its sequence number."""
+        with self._condition:
+            self._seq += 1
+            self._events.append((self._seq, event_type, data))
+            self._condition.notify_all()
+            return self._seq
+
+    def latest(self):
+        """Returns the sequence number of the last published event."""
+        with self._condition:
+            return self._seq
+
+    def events_since(self, seq, timeout):
+        """Same contract as CacheBroker.events_since()."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq != seq, timeout=timeout)
+            if self._seq < seq or (self._events and self._events[0][0] > seq + 1):
+                return self._seq, [RESET_EVENT]
+            return self._seq, [(event_type, data) for n, event_type, data in self._events if n > seq]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Returns the process-wide broker selected by settings.DIPTANK_LIVE_BROKER."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            kind = getattr(settings, 'DIPTANK_LIVE_BROKER', 'cache')
+            if kind == 'local':
+                _broker = LocalBroker()
+            elif kind == 'cache':
+                _broker = CacheBroker()
+            else:
+                raise ValueError(f"Unknown DIPTANK_LIVE_BROKER: {kind!r} (expected 'cache' or 'local')")
+        return _broker
+
+
+# --- Publishing (called by the monitor after its writes commit) ---
+
+def publish_levels(levels):
+    """Publishes {tank_id: level} for tanks whose level was just written."""
+    if not levels:
+        return
+    try:
+        get_broker().publish('levels', {str(tank_id): level for tank_id, level in levels.items()})
+    except Exception as e:
+        # Live updates are best effort; the write itself already succeeded
+        print(f"Could not publish live tank levels: {e}")
+
+
+def publish_alerts(alerts):
+    """Publishes newly saved Alert instances."""
+    if not alerts:
+        return
+    try:
+        get_broker().publish('alerts', [
+            {'tank_id': alert.tank_id, 'alert_type': alert.alert_type, 'message': alert.message}
+            for alert in alerts
+        ])
+    except Exception as e:
+        print(f"Could not publish live alerts: {e}")
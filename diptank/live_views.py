@@ -0,0 +1,208 @@
+# diptank/live_views.py
+# Streaming endpoints that push tank level changes and new alerts to open
+# dashboards (see live.py for the publishing side).
+#
+#   live/stream/ - Server-Sent Events; used by the dashboards through EventSource
+#   live/poll/   - long-polling fallback for clients or proxies without SSE
+#
+# Officers get 'tanks' events with only the tanks whose level was written,
+# farmers get a 'summary' event for their location, and both get 'alerts'.
+# Note that an open stream keeps one server worker thread busy, so run the web
+# server threaded (or under ASGI) when dashboards are left open.
+
+import json
+import time
+
+import numpy as np
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+
+from .classification import TANK_STATUSES, fleet_status, percentages, tank_status_codes
+from .live import get_broker
+from .locations import farmer_tank_filter
+from .models import Tank, UserProfile
+
+# Seconds between keep-alive comments on an idle stream (and the long-poll wait)
+LIVE_KEEPALIVE_INTERVAL = 15.0
+# A stream is closed after this many seconds; EventSource reconnects with Last-Event-ID
+LIVE_STREAM_MAX_DURATION = 300.0
+# Milliseconds the browser waits before reconnecting
+LIVE_RETRY_MS = 3000
+
+
+class DashboardFeed:
+    """
+    The tanks one dashboard shows, kept up to date from broker events.
+    apply() turns events into the (event name, data) deltas to send.
+    """
+
+    def __init__(self, tank_filter=None):
+        self.tank_filter = tank_filter  # Farmers only see their location (farmer_tank_filter); None means every tank
+        self.tanks = {}           # tank_id -> [level, capacity, min_threshold, max_threshold]
+        self._other_tanks = set()  # Tanks seen in events that this dashboard does not show
+        self.reload()
+
+    def _queryset(self):
+        tanks = Tank.objects.all()
+        return tanks if self.tank_filter is None else tanks.filter(**self.tank_filter)
+
+    def reload(self):
+        """Reloads every tank of the dashboard with one query."""
+        self.tanks = {
+            tank_id: [level, capacity, min_threshold, max_threshold]
+            for tank_id, level, capacity, min_threshold, max_threshold in self._queryset().values_list(
+                'tank_id', 'current_level', 'capacity', 'min_threshold', 'max_threshold')
+        }
+        self._other_tanks.clear()
+
+    def snapshot(self):
+        """Returns the full state of the dashboard as deltas (after connecting or a reset)."""
+        if self.tank_filter is not None:
+            return [('summary', self.summary())]
+        return [('tanks', self.tank_deltas(list(self.tanks)))]
+
+    def tank_deltas(self, tank_ids):
+        """Returns current level, percentage and status of the given tanks."""
+        if not tank_ids:
+            return []
+        rows = np.array([self.tanks[tank_id] for tank_id in tank_ids], dtype=np.float64)
+        pcts = percentages(rows[:, 0], rows[:, 1])
+        statuses = tank_status_codes(pcts, rows[:, 2], rows[:, 3])
+        return [
+            {'tank_id': tank_id, 'current_level': level, 'percentage': pct, 'status': TANK_STATUSES[status]}
+            for tank_id, level, pct, status in zip(tank_ids, rows[:, 0].tolist(), pcts.tolist(), statuses.tolist())
+        ]
+
+    def summary(self):
+        """Returns the totals of the dashboard's tanks."""
+        total_level = sum(tank[0] for tank in self.tanks.values())
+        total_capacity = sum(tank[1] for tank in self.tanks.values())
+        percentage = float(percentages(total_level, total_capacity))
+        return {'total_current_level': total_level, 'total_capacity': total_capacity,
+                'percentage': percentage, 'status': fleet_status(percentage)}
+
+    def _load_new_tanks(self, tank_ids):
+        """Looks up tanks created since the feed was loaded (one query per batch of unknown ids)."""
+        unknown = [tank_id for tank_id in tank_ids if tank_id not in self.tanks and tank_id not in self._other_tanks]
+        if not unknown:
+            return
+        for tank_id, level, capacity, min_threshold, max_threshold in self._queryset().filter(
+                pk__in=unknown).values_list('tank_id', 'current_level', 'capacity', 'min_threshold', 'max_threshold'):
+            self.tanks[tank_id] = [level, capacity, min_threshold, max_threshold]
+        self._other_tanks.update(tank_id for tank_id in unknown if tank_id not in self.tanks)
+
+    def apply(self, events):
+        """Folds broker events into the feed and returns the deltas for the client."""
+        changed = {}
+        alerts = []
+        out = []
+        for event_type, data in events:
+            if event_type == 'reset':
+                self.reload()
+                changed.clear()
+                alerts.clear()
+                out = self.snapshot()
+            elif event_type == 'levels':
+                levels = {int(tank_id): level for tank_id, level in data.items()}
+                self._load_new_tanks(levels)
+                for tank_id, level in levels.items():
+                    tank = self.tanks.get(tank_id)
+                    if tank is not None:
+                        tank[0] = level
+                        changed[tank_id] = True
+            elif event_type == 'alerts':
+                self._load_new_tanks([alert['tank_id'] for alert in data])
+                alerts.extend(alert for alert in data if alert['tank_id'] in self.tanks)
+
+        if changed:
+            if self.tank_filter is not None:
+                out.append(('summary', self.summary()))
+            else:
+                out.append(('tanks', self.tank_deltas(list(changed))))
+        if alerts:
+            out.append(('alerts', alerts))
+        return out
+
+
+def _dashboard_feed(user):
+    """Returns the DashboardFeed for a user's dashboard, or None if they have no dashboard."""
+    profile = UserProfile.objects.filter(user=user).first()
+    if profile is None:
+        return None
+    if profile.user_type == 'officer':
+        return DashboardFeed()
+    if profile.user_type == 'farmer':
+        tank_filter = farmer_tank_filter(profile)
+        return None if tank_filter is None else DashboardFeed(tank_filter=tank_filter)
+    return None
+
+
+def _parse_seq(value):
+    """Parses a client-supplied sequence number; None if missing or invalid."""
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+
+def _sse_message(event, data, seq=None):
+    lines = [f"id: {seq}"] if seq is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@login_required
+def live_stream_view(request):
+    """Server-Sent Events stream of dashboard deltas."""
+    broker = get_broker()
+    resume_from = _parse_seq(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    # Read the position before loading the tanks so no event can fall in between
+    start_seq = broker.latest() if resume_from is None else resume_from
+    feed = _dashboard_feed(request.user)
+    if feed is None:
+        return HttpResponseForbidden("No dashboard for this user.")
+
+    def stream():
+        seq = start_seq
+        yield f"retry: {LIVE_RETRY_MS}\n\n"
+        if resume_from is None:
+            # The page may have been rendered before the latest events; start from a full snapshot
+            for event, data in feed.snapshot():
+                yield _sse_message(event, data, seq)
+
+        started = time.monotonic()
+        while time.monotonic() - started < LIVE_STREAM_MAX_DURATION:
+            seq, events = broker.events_since(seq, LIVE_KEEPALIVE_INTERVAL)
+            deltas = feed.apply(events) if events else []
+            if not deltas:
+                yield ": keep-alive\n\n"
+            for event, data in deltas:
+                yield _sse_message(event, data, seq)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+
+@login_required
+def live_poll_view(request):
+    """
+    Long-polling fallback: waits for events after ?since=<seq> and returns
+    {'seq': ..., 'events': [{'event': ..., 'data': ...}, ...]}. Without
+    `since` it returns the current seq and a full snapshot immediately.
+    """
+    broker = get_broker()
+    since = _parse_seq(request.GET.get('since'))
+    latest = broker.latest()
+    feed = _dashboard_feed(request.user)
+    if feed is None:
+        return HttpResponseForbidden("No dashboard for this user.")
+    if since is None:
+        seq, deltas = latest, feed.snapshot()
+    else:
+        seq, events = broker.events_since(since, LIVE_KEEPALIVE_INTERVAL)
+        deltas = feed.apply(events) if events else []
+    return JsonResponse({'seq': seq, 'events': [{'event': event, 'data': data} for event, data in deltas]})
@@ -0,0 +1,207 @@
+# diptank/loadgen.py
+# Headless load generator for the Django backend. Simulates N tanks across
+# worker processes using the same sensor, pump and alert rules as the monitor
+# app, and reports the achieved readings/sec and commit latency percentiles.
+#
+# Run through the monitor entry point, e.g.:
+#     python diptank_monitor_app.py --headless --tanks 500 --rate 200 --workers 4 --duration 60
+# The database is whatever DJANGO_SETTINGS_MODULE configures (SQLite or PostgreSQL).
+# With --record, every reading written is also captured for replay (see replay.py).
+
+import multiprocessing
+import os
+import random
+import time
+
+from django.db import connections, transaction
+
+from .alerts import alert_engine as default_alert_engine
+from .models import Tank, SensorReading
+from .pumps import PUMP_FLOW_RATE
+from .rollups import record_readings
+from .simulation import level_percentage, simulated_sensor_level, pumped_level, auto_pump_action
+from .write_buffer import ReadingWriteBuffer
+
+
+def add_arguments(parser):
+    """Adds the load generator's command-line options to an argparse parser."""
+    group = parser.add_argument_group('headless load generator')
+    group.add_argument('--tanks', type=int, default=100, help="Number of tanks to simulate (default: 100).")
+    group.add_argument('--rate', type=float, default=100.0,
+                       help="Target readings per second across all workers (default: 100).")
+    group.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                       help="Number of worker processes (default: min(4, CPUs)).")
+    group.add_argument('--duration', type=float, default=30.0, help="Run time in seconds (default: 30).")
+    group.add_argument('--flow-rate', type=float, default=PUMP_FLOW_RATE,
+                       help=f"Liters added per pump step while a tank is pumping (default: {PUMP_FLOW_RATE}).")
+    group.add_argument('--buffered', action='store_true',
+                       help="Write through a ReadingWriteBuffer (bulk flushes) instead of one commit per reading.")
+    group.add_argument('--create-tanks', action='store_true',
+                       help="Create 'Load Test' tanks if the database has fewer than --tanks.")
+    group.add_argument('--seed', type=int, default=None, help="Random seed for reproducible level changes.")
+    group.add_argument('--record', metavar='PATH', default=None,
+                       help="Capture every reading written to PATH, for --replay.")
+
+
+def _load_tank_ids(count, create_missing):
+    """Returns the IDs of the first `count` tanks, creating 'Load Test' tanks if allowed."""
+    tank_ids = list(Tank.objects.order_by('tank_id').values_list('tank_id', flat=True)[:count])
+    missing = count - len(tank_ids)
+    if missing > 0:
+        if not create_missing:
+            raise SystemExit(f"Only {len(tank_ids)} tanks in the database; pass --create-tanks to create "
+                             f"{missing} more or lower --tanks.")
+        Tank.objects.bulk_create([
+            Tank(location='Load Test', capacity=10000.0, current_level=5000.0, min_threshold=20.0,
+                 max_threshold=90.0)
+            for _ in range(missing)
+        ], batch_size=500)
+        tank_ids = list(Tank.objects.order_by('tank_id').values_list('tank_id', flat=True)[:count])
+    return tank_ids
+
+
+def _write_reading(tank, new_level, alert_engine=None):
+    """
+    Commits one reading the way the monitor does: level update, SensorReading
+    and any new alert. Returns the alerts written.
+    """
+    alerts = (alert_engine or default_alert_engine).process(tank, new_level)
+    with transaction.atomic():
+        Tank.objects.filter(pk=tank.tank_id).update(current_level=new_level)
+        record_readings([SensorReading.objects.create(tank_id=tank.tank_id, water_level=new_level)])
+        for alert in alerts:
+            alert.save()
+    return alerts
+
+
+def _run_worker(task):
+    """
+    Worker process: simulates its share of the tanks at its share of the rate.
+    Returns (readings, errors, commit latencies in seconds).
+    """
+    tank_ids, rate, duration, flow_rate, buffered, seed, record_path = task
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+    rng = random.Random(seed)
+    recorder = None
+    if record_path:
+        from .replay import SensorRecorder  # replay.py builds on this module
+        recorder = SensorRecorder(record_path)
+
+    tanks = list(Tank.objects.filter(pk__in=tank_ids))
+    pumping = {tank.tank_id: False for tank in tanks}
+    write_buffer = ReadingWriteBuffer() if buffered else None
+    latencies = []
+    readings = errors = 0
+
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    next_at = start
+    index = 0
+    while tanks and time.perf_counter() - start < duration:
+        tank = tanks[index % len(tanks)]
+        index += 1
+
+        # Same rules as the monitor: pump in while pumping, otherwise a sensor fluctuation
+        if pumping[tank.tank_id]:
+            new_level = pumped_level(tank.current_level, tank.capacity, flow_rate)
+        else:
+            new_level = simulated_sensor_level(tank.current_level, tank.capacity, rng)
+
+        try:
+            if write_buffer is not None:
+                t0 = time.perf_counter()
+                # The buffer only writes levels and readings, so alerts are written here as they happen
+                for alert in default_alert_engine.process(tank, new_level):
+                    alert.save()
+                write_buffer.add(tank.tank_id, new_level)
+                write_buffer.flush_if_due()
+                if write_buffer.pending_count() == 0:  # The size or time bound triggered a flush
+                    latencies.append(time.perf_counter() - t0)
+            else:
+                t0 = time.perf_counter()
+                _write_reading(tank, new_level)
+                latencies.append(time.perf_counter() - t0)
+            readings += 1
+            tank.current_level = new_level
+            if recorder is not None:
+                recorder.record(tank.tank_id, new_level)
+        except Exception as e:  # OperationalError ("database is locked" on SQLite), ...
+            errors += 1
+            if errors <= 5:
+                print(f"[worker {os.getpid()}] Could not write reading for Tank {tank.tank_id}: {e}")
+
+        action = auto_pump_action(level_percentage(tank.current_level, tank.capacity), tank.min_threshold,
+                                  tank.max_threshold, pumping[tank.tank_id])
+        if action is not None:
+            pumping[tank.tank_id] = action
+
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_at = time.perf_counter()  # Behind schedule: don't try to catch up in a burst
+
+    if write_buffer is not None:
+        t0 = time.perf_counter()
+        if write_buffer.flush():
+            latencies.append(time.perf_counter() - t0)
+    if recorder is not None:
+        recorder.close()
+    connections.close_all()
+    return readings, errors, latencies
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at `fraction` (0..1) of an already sorted list (nearest rank)."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run(args):
+    """Runs the load generator described by parsed command-line args and prints a report."""
+    if args.tanks <= 0 or args.rate <= 0 or args.workers <= 0 or args.duration <= 0:
+        raise SystemExit("--tanks, --rate, --workers and --duration must all be positive.")
+
+    tank_ids = _load_tank_ids(args.tanks, args.create_tanks)
+    workers = min(args.workers, len(tank_ids))
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+    # Each worker records its own part; they are merged into args.record afterwards
+    record_parts = [f"{args.record}.part{i}" for i in range(workers)] if args.record else [None] * workers
+    tasks = [
+        (tank_ids[i::workers], args.rate / workers, args.duration, args.flow_rate, args.buffered, seed + i,
+         record_parts[i])
+        for i in range(workers)
+    ]
+
+    print(f"Simulating {len(tank_ids)} tanks at {args.rate:.0f} readings/s with {workers} worker(s) "
+          f"for {args.duration:.0f}s ({'buffered' if args.buffered else 'one commit per reading'}, "
+          f"database: {connections['default'].vendor}, seed: {seed})...")
+    # Worker processes must open their own connections
+    connections.close_all()
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.map(_run_worker, tasks)
+    elapsed = time.perf_counter() - start
+
+    readings = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    latencies = sorted(latency for r in results for latency in r[2])
+
+    print(f"Readings written: {readings} ({errors} failed) in {elapsed:.1f}s")
+    print(f"Achieved rate:    {readings / elapsed:.1f} readings/s (target {args.rate:.0f})")
+    label = "Flush latency" if args.buffered else "Commit latency"
+    print(f"{label} (ms):  p50={percentile(latencies, 0.50) * 1000:.2f}  "
+          f"p90={percentile(latencies, 0.90) * 1000:.2f}  p99={percentile(latencies, 0.99) * 1000:.2f}  "
+          f"max={(latencies[-1] if latencies else 0.0) * 1000:.2f}  (n={len(latencies)})")
+
+    if args.record:
+        from .replay import merge_captures
+        recorded = merge_captures(record_parts, args.record)
+        for part in record_parts:
+            os.remove(part)
+        print(f"Recorded {recorded} readings to {args.record}")
@@ -0,0 +1,121 @@
+# diptank/locations.py
+# Normalized locations. Tanks and farmers were matched by the free-text
+# Tank.location / UserProfile.location_associated strings, so "Farm A" and
+# "farm a " were different places and every farmer query compared strings.
+# Location (models.py) gives each place one row, found by its normalized key,
+# and both models point at it with an indexed location_ref foreign key.
+#
+# Migration 0005 links the existing rows (backfill_locations_migration);
+# the backfill_locations command does the same by hand. The location strings
+# are kept, rewritten to their location's canonical name, so listings still
+# sort and search by name. New rows are linked on save by the pre_save
+# receivers in signals.py and by the bulk import.
+
+from collections import Counter
+
+from django.db import IntegrityError, models, transaction
+
+from .models import Location, Tank, UserProfile
+
+
+def normalize_location(name):
+    """Returns the key that identifies a location: whitespace collapsed, case folded."""
+    return ' '.join((name or '').split()).casefold()
+
+
+def farmer_tank_filter(profile):
+    """
+    Returns the Tank filter (keyword arguments) selecting a farmer's tanks by
+    the indexed location_ref key, or None if the profile has no location.
+    """
+    return None if profile.location_ref_id is None else {'location_ref_id': profile.location_ref_id}
+
+
+def profile_location_name(profile):
+    """Returns the name of a farmer profile's location, or None if it has none."""
+    return None if profile.location_ref is None else profile.location_ref.name
+
+
+def resolve_locations(names, location_model=Location):
+    """
+    Returns {name: Location} for the given location strings, creating the
+    missing locations. Spellings that normalize to the same key share one
+    Location; blank names are left out.
+    """
+    by_key = {}
+    for name in names:
+        key = normalize_location(name)
+        if key:
+            by_key.setdefault(key, ' '.join(name.split()))
+    if not by_key:
+        return {}
+    found = {location.key: location for location in location_model.objects.filter(key__in=list(by_key))}
+    missing = [location_model(key=key, name=name) for key, name in by_key.items() if key not in found]
+    if missing:
+        # Another writer may create the same keys meanwhile; ignore_conflicts keeps theirs
+        location_model.objects.bulk_create(missing, ignore_conflicts=True)
+        found.update((location.key, location) for location in location_model.objects.filter(
+            key__in=[location.key for location in missing]))
+    return {name: found[normalize_location(name)] for name in names if normalize_location(name)}
+
+
+def resolve_location(name):
+    """Returns the Location for one location string (created if new), or None for a blank one."""
+    key = normalize_location(name)
+    if not key:
+        return None
+    try:
+        with transaction.atomic():
+            location, _ = Location.objects.get_or_create(key=key, defaults={'name': ' '.join(name.split())})
+    except IntegrityError:
+        # Created by a concurrent writer between our SELECT and INSERT
+        location = Location.objects.get(key=key)
+    return location
+
+
+def backfill_locations(tank_model=None, profile_model=None, location_model=Location):
+    """
+    Creates one Location per distinct normalized location string of the tanks
+    and farmer profiles, and links them to it, rewriting each string to the
+    canonical name (the spelling most tanks use). One UPDATE per distinct
+    string; rows already linked are left alone, so it can be run again.
+    Returns (locations, tanks updated, profiles updated).
+
+    Pass the models from apps.get_model() when running inside a migration.
+    """
+    tank_model = tank_model or Tank
+    profile_model = profile_model or UserProfile
+    tank_counts = Counter(dict(tank_model.objects.order_by().values_list('location').annotate(n=models.Count('pk'))))
+    profile_names = set(profile_model.objects.exclude(location_associated__isnull=True)
+                        .values_list('location_associated', flat=True).distinct())
+
+    # Canonical spelling per key: the one used by the most tanks, then alphabetical
+    canonical = {}
+    for name, count in sorted(tank_counts.items(), key=lambda item: (-item[1], item[0])):
+        canonical.setdefault(normalize_location(name), name)
+    for name in sorted(profile_names):
+        canonical.setdefault(normalize_location(name), name)
+    canonical.pop('', None)
+
+    with transaction.atomic():
+        locations = resolve_locations([' '.join(name.split()) for name in canonical.values()], location_model)
+        by_key = {location.key: location for location in locations.values()}
+        tanks_updated = profiles_updated = 0
+        for name in tank_counts:
+            location = by_key.get(normalize_location(name))
+            if location is not None:
+                tanks_updated += tank_model.objects.filter(location=name).exclude(
+                    location_ref=location, location=location.name).update(location_ref=location, location=location.name)
+        for name in profile_names:
+            location = by_key.get(normalize_location(name))
+            if location is not None:
+                profiles_updated += profile_model.objects.filter(location_associated=name).exclude(
+                    location_ref=location, location_associated=location.name).update(
+                    location_ref=location, location_associated=location.name)
+    return len(by_key), tanks_updated, profiles_updated
+
+
+def backfill_locations_migration(apps, schema_editor):
+    """RunPython entry point for the data migration that follows the schema one."""
+    backfill_locations(apps.get_model('diptank', 'Tank'), apps.get_model('diptank', 'UserProfile'),
+                       apps.get_model('diptank', 'Location'))
@@ -0,0 +1,18 @@
+# diptank/management/commands/backfill_locations.py
+# Links existing tanks and farmer profiles to normalized Location rows
+# (see diptank/locations.py). Migration 0005 does this once; the command is
+# for rows written since by code that skips the save receivers. Safe to run again:
+#     python manage.py backfill_locations
+
+from django.core.management.base import BaseCommand
+
+from diptank.locations import backfill_locations
+
+
+class Command(BaseCommand):
+    help = "Creates Location rows from the tank/farmer location strings and links them."
+
+    def handle(self, *args, **options):
+        locations, tanks, profiles = backfill_locations()
+        self.stdout.write(self.style.SUCCESS(
+            f"{locations} locations; linked {tanks} tanks and {profiles} farmer profiles."))
@@ -0,0 +1,42 @@
+# diptank/management/commands/import_tanks.py
+# Bulk-imports tanks from a CSV, JSON Lines or JSON file (see diptank/bulk.py):
+#     python manage.py import_tanks district_tanks.csv
+#     python manage.py import_tanks district_tanks.jsonl --dry-run
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diptank.bulk import IMPORT_BATCH_SIZE, IMPORT_FORMATS, guess_format, import_tanks, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Imports tanks in bulk, validating every row with the same rules as TankForm."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import; columns/keys are the TankForm fields.")
+        parser.add_argument('--format', choices=IMPORT_FORMATS,
+                            help="File format (default: guessed from the file extension).")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help="Tanks per bulk insert (default: %(default)s).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; don't insert anything.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as f:
+                report = import_tanks(iter_rows(f, fmt), batch_size=options['batch_size'],
+                                      dry_run=options['dry_run'])
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        for row_number, errors in report.errors:
+            messages = "; ".join(f"{field}: {' '.join(field_errors)}" for field, field_errors in errors.items())
+            self.stderr.write(f"Row {row_number}: {messages}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... and {report.error_count - len(report.errors)} more rows with errors.")
+        if report.file_error is not None:
+            row_number, message = report.file_error
+            self.stderr.write(f"Row {row_number}: {message}. Stopped reading; rows from here on were not imported.")
+
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report.created} tanks from {report.rows} rows ({report.error_count} rejected)."))
@@ -0,0 +1,32 @@
+# diptank/management/commands/prune_readings.py
+# Applies the SensorReading retention policy from diptank/rollups.py.
+# Meant to run periodically, e.g. from cron:
+#     python manage.py prune_readings
+#     python manage.py prune_readings --raw-days 3
+#     python manage.py prune_readings --rebuild-rollups   # once, after enabling rollups
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from diptank.rollups import RAW_READING_RETENTION, prune, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Prunes raw sensor readings and rollups past their retention horizon."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=float, default=RAW_READING_RETENTION.total_seconds() / 86400,
+                            help="Keep raw readings for this many days (default: %(default)s).")
+        parser.add_argument('--rebuild-rollups', action='store_true',
+                            help="Recompute the rollups the raw readings still cover before pruning.")
+
+    def handle(self, *args, **options):
+        if options['rebuild_rollups']:
+            count = rebuild_rollups()
+            self.stdout.write(f"Rebuilt rollups from {count} raw readings.")
+
+        deleted = prune(raw_retention=timedelta(days=options['raw_days']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted['raw']} raw readings and {deleted['minute']} minute / {deleted['hour']} hour / "
+            f"{deleted['day']} day rollups."))
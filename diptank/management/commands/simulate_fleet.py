@@ -0,0 +1,88 @@
+# diptank/management/commands/simulate_fleet.py
+# Evaluates a pump control policy over simulated time (see diptank/fleet_sim.py):
+#     python manage.py simulate_fleet --tanks 5000 --hours 24 --policy threshold
+#     python manage.py simulate_fleet --from-db --hours 24 --policy band --band 40 80
+#     python manage.py simulate_fleet --from-db --hours 1 --persist --record-interval 60
+#     python manage.py simulate_fleet --from-db --hours 24 --persist --start 2024-05-01T00:00
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from diptank.fleet_sim import FLEET_SIM_CONSUMPTION, POLICIES, BandPolicy, FleetSimulation, FleetState
+from diptank.fleet_sim_store import load_fleet_state, persist_simulation
+from diptank.simulation import PUMP_UPDATE_INTERVAL, SENSOR_FLUCTUATION
+
+
+class Command(BaseCommand):
+    help = "Simulates the fleet's levels, pumps and alerts faster than real time under a control policy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tanks', type=int, default=1000, help="Synthetic tanks to simulate (default: 1000).")
+        parser.add_argument('--from-db', action='store_true', help="Simulate the tanks in the database instead.")
+        parser.add_argument('--hours', type=float, default=24.0, help="Simulated hours (default: 24).")
+        parser.add_argument('--dt', type=float, default=PUMP_UPDATE_INTERVAL,
+                            help="Simulated seconds per step (default: %(default)s).")
+        parser.add_argument('--policy', choices=sorted(POLICIES), default='threshold',
+                            help="Pump control policy (default: threshold).")
+        parser.add_argument('--band', type=float, nargs=2, metavar=('LOW', 'HIGH'), default=(40.0, 80.0),
+                            help="Band limits in percent for --policy band (default: 40 80).")
+        parser.add_argument('--consumption', type=float, default=FLEET_SIM_CONSUMPTION,
+                            help="Mean consumption per tank in liters per second (default: %(default)s).")
+        parser.add_argument('--sensor-noise', action='store_true',
+                            help=f"Let the policy see levels with the monitor's +/-{SENSOR_FLUCTUATION:.0%} "
+                                 "sensor fluctuation.")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed.")
+        parser.add_argument('--persist', action='store_true',
+                            help="Write sampled readings, alerts and final levels to the database (needs --from-db).")
+        parser.add_argument('--record-interval', type=float, default=300.0,
+                            help="Simulated seconds between persisted readings (default: %(default)s).")
+        parser.add_argument('--start', default=None,
+                            help="Date and time the persisted run starts at, e.g. 2024-05-01T00:00 "
+                                 "(default: so that it ends now).")
+
+    def handle(self, *args, **options):
+        if options['persist'] and not options['from_db']:
+            raise CommandError("--persist needs --from-db: only database tanks can be written back.")
+        if options['hours'] <= 0 or options['dt'] <= 0:
+            raise CommandError("--hours and --dt must be positive.")
+        start_time = None
+        if options['start']:
+            if not options['persist']:
+                raise CommandError("--start only applies with --persist.")
+            try:
+                start_time = parse_datetime(options['start'])
+            except ValueError:  # Well formed but out of range, e.g. month 13
+                start_time = None
+            if start_time is None:
+                raise CommandError(f"--start is not a date and time: {options['start']!r}")
+            if timezone.is_naive(start_time):
+                start_time = timezone.make_aware(start_time)
+
+        if options['from_db']:
+            state = load_fleet_state(consumption=options['consumption'])
+        else:
+            state = FleetState.random(options['tanks'], seed=options['seed'], consumption=options['consumption'])
+        if not len(state):
+            raise CommandError("No tanks to simulate.")
+        policy = BandPolicy(*options['band']) if options['policy'] == 'band' else POLICIES[options['policy']]()
+
+        sim = FleetSimulation(state, policy, dt=options['dt'], seed=options['seed'],
+                              sensor_noise=SENSOR_FLUCTUATION if options['sensor_noise'] else 0.0,
+                              record_interval=options['record_interval'] if options['persist'] else None)
+        report = sim.run(options['hours'] * 3600)
+
+        tank_seconds = report.tanks * report.simulated_seconds
+        self.stdout.write(f"Simulated {report.tanks} tanks for {report.simulated_seconds / 3600:.1f} h "
+                          f"({report.steps} steps) in {report.wall_seconds:.2f} s: {report.speedup:,.0f}x real time.")
+        self.stdout.write(f"Policy '{policy.name}': {report.pump_switches} pump switches, "
+                          f"{report.pump_seconds / tank_seconds:.1%} pump duty, "
+                          f"{report.pumped_liters:,.0f} L pumped, {report.spilled_liters:,.0f} L spilled.")
+        self.stdout.write(f"Time below min threshold: {report.below_min_seconds / tank_seconds:.1%}, "
+                          f"above max threshold: {report.above_max_seconds / tank_seconds:.1%}.")
+        self.stdout.write(f"Alerts: {report.alerts_written['low_water']} low, {report.alerts_written['high_water']} "
+                          f"high written, {report.alerts_suppressed} suppressed by the rate limit.")
+
+        if options['persist']:
+            readings, alerts = persist_simulation(sim, start_time=start_time)
+            self.stdout.write(self.style.SUCCESS(f"Persisted {readings} readings and {alerts} alerts."))
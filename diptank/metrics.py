@@ -0,0 +1,229 @@
+# diptank/metrics.py
+# In-process metrics for the views and the monitor: per operation call count,
+# errors, wall time (as a histogram), SQL query count and time spent in the
+# database. Events that are not operations (e.g. update conflicts) are plain
+# counters kept alongside.
+#
+# Operations are measured with instrument()/instrumented(). Queries are counted
+# through connection.execute_wrapper, which only wraps the calling thread's
+# connection, so concurrent operations on other threads are not mixed in. The
+# cost is a couple of perf_counter() calls per operation and per query, which
+# is cheap enough to leave on in production. Set DIPTANK_METRICS_ENABLED = False
+# in the settings to turn it off. For streaming responses only the time to
+# build the response is measured, not the stream itself.
+#
+# The registry is exported in the Prometheus text format by metrics_view() in
+# the web process and by serve_metrics() in the monitor (--metrics-port).
+# metrics_view() only answers staff users and the scrapers whose addresses are
+# listed in DIPTANK_METRICS_ALLOWED_IPS; serve_metrics() binds to localhost.
+
+import bisect
+import contextlib
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Upper bounds (in seconds) of the wall time histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Client addresses (e.g. the Prometheus server) that may scrape metrics_view() without logging in
+METRICS_ALLOWED_IPS = frozenset(getattr(settings, 'DIPTANK_METRICS_ALLOWED_IPS', ()))
+
+
+class OperationStats:
+    """Accumulated measurements of one operation."""
+
+    __slots__ = ('count', 'errors', 'wall_time', 'db_time', 'queries', 'max_queries', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.wall_time = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # The last one is +Inf
+
+
+class MetricsRegistry:
+    """Thread-safe store of OperationStats keyed by operation name."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._operations = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, wall_time, queries=0, db_time=0.0, failed=False):
+        """Records one run of an operation."""
+        with self._lock:
+            stats = self._operations.get(name)
+            if stats is None:
+                stats = self._operations[name] = OperationStats()
+            stats.count += 1
+            stats.errors += failed
+            stats.wall_time += wall_time
+            stats.db_time += db_time
+            stats.queries += queries
+            stats.max_queries = max(stats.max_queries, queries)
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, wall_time)] += 1
+
+    def increment(self, name, amount=1):
+        """Adds `amount` to counter `name`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        """Returns {name: value} of every counter."""
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def snapshot(self):
+        """Returns {name: dict of the operation's totals}, for reports and tests."""
+        with self._lock:
+            return {
+                name: {'count': s.count, 'errors': s.errors, 'wall_time': s.wall_time, 'db_time': s.db_time,
+                       'queries': s.queries, 'max_queries': s.max_queries}
+                for name, s in sorted(self._operations.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._counters.clear()
+
+    def render_prometheus(self):
+        """Returns the registry in the Prometheus text exposition format."""
+        with self._lock:
+            operations = sorted(self._operations.items())
+            counters = sorted(self._counters.items())
+            lines = [
+                "# HELP diptank_operation_seconds Wall time of instrumented views and monitor operations.",
+                "# TYPE diptank_operation_seconds histogram",
+            ]
+            for name, stats in operations:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'diptank_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'diptank_operation_seconds_bucket{{operation="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'diptank_operation_seconds_sum{{operation="{name}"}} {stats.wall_time:.6f}')
+                lines.append(f'diptank_operation_seconds_count{{operation="{name}"}} {stats.count}')
+            for metric, help_text, attr in (
+                    ('diptank_operation_errors_total', "Runs that raised an exception.", 'errors'),
+                    ('diptank_operation_queries_total', "SQL queries run by the operation.", 'queries'),
+                    ('diptank_operation_db_seconds_total', "Time spent executing SQL.", 'db_time')):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for name, stats in operations:
+                    value = getattr(stats, attr)
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f'{metric}{{operation="{name}"}} {value}')
+            lines.append("# HELP diptank_operation_max_queries Most SQL queries seen in one run.")
+            lines.append("# TYPE diptank_operation_max_queries gauge")
+            for name, stats in operations:
+                lines.append(f'diptank_operation_max_queries{{operation="{name}"}} {stats.max_queries}')
+            lines.append("# HELP diptank_events_total Counted events, such as level update conflicts.")
+            lines.append("# TYPE diptank_events_total counter")
+            for name, value in counters:
+                lines.append(f'diptank_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry
+metrics = MetricsRegistry(enabled=getattr(settings, 'DIPTANK_METRICS_ENABLED', True))
+
+
+class _QueryCounter:
+    """execute_wrapper that counts the queries of one operation and the time they take."""
+
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextlib.contextmanager
+def instrument(name, registry=None, using='default'):
+    """Measures the enclosed block as one run of operation `name`."""
+    registry = registry or metrics
+    if not registry.enabled:
+        yield
+        return
+    counter = _QueryCounter()
+    failed = False
+    start = time.perf_counter()
+    try:
+        with connections[using].execute_wrapper(counter):
+            yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        registry.observe(name, time.perf_counter() - start, counter.queries, counter.db_time, failed)
+
+
+def instrumented(name=None):
+    """Decorator form of instrument(); the operation defaults to the function's qualified name."""
+    def decorator(func):
+        operation = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrument(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_view(view):
+    """Wraps a view so each request is recorded as operation 'view.<function name>'."""
+    return instrumented(f"view.{view.__name__}")(view)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the web process, for staff and METRICS_ALLOWED_IPS only."""
+    user = request.user
+    if request.META.get('REMOTE_ADDR') not in METRICS_ALLOWED_IPS and not (user.is_active and user.is_staff):
+        return HttpResponseForbidden("Metrics are only available to staff and allowed scrapers.")
+    return HttpResponse(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def serve_metrics(port, host='127.0.0.1', registry=None):
+    """Serves the registry at http://host:port/metrics from a daemon thread. Returns the server."""
+    registry = registry or metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='diptank-metrics', daemon=True).start()
+    return server
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 13:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tank',
+            fields=[
+                ('tank_id', models.AutoField(primary_key=True, serialize=False)),
+                ('location', models.CharField(max_length=255)),
+                ('capacity', models.FloatField()),
+                ('current_level', models.FloatField()),
+                ('min_threshold', models.FloatField(default=20.0)),
+                ('max_threshold', models.FloatField(default=90.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('phone_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('user_type', models.CharField(choices=[('farmer', 'Farmer'), ('officer', 'Officer')], max_length=10)),
+                ('location_associated', models.CharField(blank=True, max_length=255, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SensorReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('water_level', models.FloatField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('tank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='diptank.tank')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(max_length=50)),
+                ('message', models.TextField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('tank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='diptank.tank')),
+            ],
+        ),
+    ]
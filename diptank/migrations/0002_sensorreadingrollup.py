@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 13:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diptank', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorReadingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket_start', models.DateTimeField()),
+                ('min_level', models.FloatField()),
+                ('max_level', models.FloatField()),
+                ('sum_level', models.FloatField()),
+                ('reading_count', models.PositiveIntegerField()),
+                ('last_level', models.FloatField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('tank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_rollups', to='diptank.tank')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sensorreadingrollup',
+            constraint=models.UniqueConstraint(fields=('tank', 'period', 'bucket_start'), name='unique_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diptank', '0002_sensorreadingrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['tank', '-timestamp', '-id'], name='reading_tank_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tank',
+            index=models.Index(fields=['location', 'tank_id'], name='tank_location_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 13:39
+
+from django.db import migrations
+
+from diptank.locations import backfill_locations_migration
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diptank', '0004_location'),
+    ]
+
+    operations = [
+        # One Location per distinct normalized location string, linked to the existing tanks and farmers
+        migrations.RunPython(backfill_locations_migration, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 13:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diptank', '0005_backfill_locations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,116 @@
+# diptank/models.py
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+
+class Location(models.Model):
+    """A place tanks and farmers are at, one row per normalized name (see diptank.locations)."""
+
+    key = models.CharField(max_length=255, unique=True)  # normalize_location(name)
+    name = models.CharField(max_length=255)  # Canonical spelling, shown on dashboards
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class UserProfile(models.Model):
+    USER_TYPE_CHOICES = (
+        ('farmer', 'Farmer'),
+        ('officer', 'Officer'),
+    )
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+    phone_number = models.CharField(max_length=20, blank=True, null=True)
+    user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES)
+    location_associated = models.CharField(max_length=255, blank=True, null=True)  # Farmers only
+    # Set from location_associated on save (signals.link_profile_location)
+    location_ref = models.ForeignKey(Location, null=True, blank=True, on_delete=models.PROTECT,
+                                     related_name='profiles')
+
+    def __str__(self):
+        return f"{self.name} ({self.user_type})"
+
+
+class Tank(models.Model):
+    tank_id = models.AutoField(primary_key=True)
+    location = models.CharField(max_length=255)
+    capacity = models.FloatField()  # Liters
+    current_level = models.FloatField()  # Liters
+    min_threshold = models.FloatField(default=20.0)  # Percent of capacity
+    max_threshold = models.FloatField(default=90.0)  # Percent of capacity
+    # Set from location on save (signals.link_tank_location)
+    location_ref = models.ForeignKey(Location, null=True, blank=True, on_delete=models.PROTECT, related_name='tanks')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of tank listings (diptank.pagination.tank_page)
+            models.Index(fields=['location', 'tank_id'], name='tank_location_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tank {self.tank_id} at {self.location}"
+
+
+class SensorReading(models.Model):
+    tank = models.ForeignKey(Tank, on_delete=models.CASCADE)
+    water_level = models.FloatField()
+    # A default rather than auto_now_add, so bulk writers such as simulate_fleet --persist can backdate readings
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # A tank's readings newest first (diptank.pagination.reading_page, forecast history)
+            models.Index(fields=['tank', '-timestamp', '-id'], name='reading_tank_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tank {self.tank_id}: {self.water_level} at {self.timestamp:%Y-%m-%d %H:%M:%S}"
+
+
+class Alert(models.Model):
+    tank = models.ForeignKey(Tank, on_delete=models.CASCADE)
+    alert_type = models.CharField(max_length=50)  # 'low_water' or 'high_water'
+    message = models.TextField()
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.alert_type} for Tank {self.tank_id}"
+
+
+class SensorReadingRollup(models.Model):
+    """Minute, hour or day aggregate of a tank's readings, maintained by diptank.rollups."""
+
+    PERIOD_CHOICES = (
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+
+    tank = models.ForeignKey(Tank, on_delete=models.CASCADE, related_name='reading_rollups')
+    period = models.CharField(max_length=6, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    min_level = models.FloatField()
+    max_level = models.FloatField()
+    sum_level = models.FloatField()  # mean = sum_level / reading_count
+    reading_count = models.PositiveIntegerField()
+    last_level = models.FloatField()
+    last_timestamp = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tank', 'period', 'bucket_start'], name='unique_rollup_bucket'),
+        ]
+
+    @property
+    def mean_level(self):
+        return self.sum_level / self.reading_count if self.reading_count else 0.0
+
+    def __str__(self):
+        return f"Tank {self.tank_id} {self.period} {self.bucket_start:%Y-%m-%d %H:%M}"
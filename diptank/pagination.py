@@ -0,0 +1,99 @@
+# diptank/pagination.py
+# Keyset ("seek") pagination for tank listings and reading histories.
+#
+# Pages continue from the last row of the previous page instead of using an
+# OFFSET, so every page costs the same no matter how deep into the fleet it
+# is. Tanks are ordered by (location, tank_id) and readings by
+# (timestamp, id) descending, each backed by a composite index declared in
+# models.py (tank_location_id_idx and reading_tank_time_idx).
+
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Tank, SensorReading
+
+TANK_PAGE_SIZE = 50
+READING_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(cursor):
+    """Turns a cursor tuple into an opaque URL-safe string (None stays None)."""
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode()
+
+
+def decode_cursor(value, kind='tank'):
+    """
+    Reverses encode_cursor() for a tank_page() (`kind` 'tank') or
+    reading_page() ('reading') cursor. Raises ValueError for a malformed one.
+    """
+    if not value:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid page cursor.")
+    if not isinstance(cursor, list) or len(cursor) != 2:
+        raise ValueError("Invalid page cursor.")
+    key, pk = cursor
+    # bool is an int subclass, but never a row ID
+    if not isinstance(key, str) or not isinstance(pk, int) or isinstance(pk, bool):
+        raise ValueError("Invalid page cursor.")
+    if kind == 'reading':
+        key = parse_datetime(key)
+        if key is None:
+            raise ValueError("Invalid page cursor.")
+    return key, pk
+
+
+def search_tanks(queryset, search):
+    """Filters tanks by a search string: a tank ID, or part of a location name."""
+    search = (search or '').strip()
+    if not search:
+        return queryset
+    if search.isdigit():
+        return queryset.filter(Q(tank_id=int(search)) | Q(location__icontains=search))
+    return queryset.filter(location__icontains=search)
+
+
+def tank_page(queryset=None, after=None, page_size=TANK_PAGE_SIZE, search=None, fields=('tank_id', 'location')):
+    """
+    Returns (rows, next cursor) for the page of tanks after the `after`
+    cursor, ordered by (location, tank_id). Rows are tuples of `fields`; the
+    next cursor is None on the last page.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    tanks = search_tanks(Tank.objects.all() if queryset is None else queryset, search)
+    if after is not None:
+        location, tank_id = after
+        tanks = tanks.filter(Q(location__gt=location) | Q(location=location, tank_id__gt=tank_id))
+    # Fetch one extra row to know whether there is a next page without a COUNT
+    rows = list(tanks.order_by('location', 'tank_id').values_list('location', 'tank_id', *fields)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = (rows[-1][0], rows[-1][1]) if has_more else None
+    return [row[2:] for row in rows], next_cursor
+
+
+def reading_page(tank_id, before=None, page_size=READING_PAGE_SIZE,
+                 fields=('water_level', 'timestamp')):
+    """
+    Returns (rows, next cursor) for a tank's readings, newest first, starting
+    below the `before` cursor (a (timestamp, id) pair from the previous page).
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    readings = SensorReading.objects.filter(tank_id=tank_id)
+    if before is not None:
+        timestamp, pk = before
+        readings = readings.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+    rows = list(readings.order_by('-timestamp', '-pk').values_list('timestamp', 'pk', *fields)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = (rows[-1][0], rows[-1][1]) if has_more else None
+    return [row[2:] for row in rows], next_cursor
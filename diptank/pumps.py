@@ -0,0 +1,257 @@
+# diptank/pumps.py
+# Pump scheduler for the Diptank monitor. A single timer thread drives every
+# running pump, so any number of tanks can pump at once without one OS thread
+# per pump. Pumped levels and readings go through a ReadingWriteBuffer, so
+# the database sees one bulk write per flush instead of one per tank per step.
+# The timer thread keeps one database connection for its lifetime, recycling
+# it when it breaks or ages out and closing it when the thread exits.
+
+import threading
+import time
+
+from .alerts import alert_engine as default_alert_engine
+from .db_lifecycle import close_connections, recycle_connections
+from .live import publish_alerts
+from .metrics import instrumented
+from .models import Tank
+from .simulation import PUMP_FLOW_RATE, PUMP_UPDATE_INTERVAL, level_percentage, pumped_level
+from .tank_cache import tank_cache as default_tank_cache
+from .write_buffer import ReadingWriteBuffer
+
+
+class PumpState:
+    """Per-tank pump state tracked by the scheduler."""
+
+    def __init__(self, tank_id, flow_rate):
+        self.tank_id = tank_id
+        self.flow_rate = flow_rate
+        self.started_at = time.monotonic()
+
+
+class PumpTickResult:
+    """What happened to the running pumps during one scheduler tick."""
+
+    def __init__(self):
+        self.levels = {}   # tank_id -> new level after pumping
+        self.stopped = {}  # tank_id -> (reason, message) for pumps stopped this tick
+        self.errors = {}   # tank_id -> exception that stopped the pump
+        self.flush_error = None  # exception raised while writing buffered readings, if any
+
+
+class PumpScheduler:
+    """
+    Drives the pumps of any number of tanks from one timer loop.
+
+    Pumps are started and stopped per tank with start_pump()/stop_pump(); each
+    keeps its own flow rate. Every `interval` seconds the timer thread steps all
+    running pumps and hands a PumpTickResult to `on_tick`, which runs on the
+    timer thread (callers that touch a UI must marshal it themselves).
+
+    Tanks are read from `tank_cache` and their new levels recorded there in
+    place, then written through `write_buffer`. The buffer is flushed on its
+    own size/time bounds, whenever a pump stops, and one last time on shutdown().
+
+    A `forecaster` (diptank.forecast.LevelForecaster), if given, is fed every
+    pumped level, and its trend for a tank restarts whenever the pump is switched.
+    """
+
+    def __init__(self, interval=PUMP_UPDATE_INTERVAL, default_flow_rate=PUMP_FLOW_RATE, on_tick=None,
+                 write_buffer=None, tank_cache=None, alert_engine=None, forecaster=None):
+        self.interval = interval
+        self.default_flow_rate = default_flow_rate
+        self.on_tick = on_tick
+        self.write_buffer = write_buffer or ReadingWriteBuffer()
+        self.tank_cache = tank_cache or default_tank_cache
+        self.alert_engine = alert_engine or default_alert_engine
+        self.forecaster = forecaster
+        self.pumps = {}  # tank_id -> PumpState
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stopping = False
+        self._flush_requested = False
+        self._thread = None
+
+    # --- Pump control (safe to call from any thread) ---
+
+    def start_pump(self, tank_id, flow_rate=None):
+        """Starts pumping a tank. Returns False if its pump was already running."""
+        with self._lock:
+            if tank_id in self.pumps:
+                return False
+            self.pumps[tank_id] = PumpState(tank_id, flow_rate or self.default_flow_rate)
+        if self.forecaster is not None:
+            self.forecaster.reset(tank_id)
+        self._ensure_timer()
+        return True
+
+    def stop_pump(self, tank_id):
+        """Stops pumping a tank. Returns False if its pump was not running."""
+        with self._lock:
+            stopped = self.pumps.pop(tank_id, None) is not None
+            if stopped:
+                # Let the timer thread write the stopped pump's pending readings right away
+                self._flush_requested = True
+        if stopped:
+            self._wake_event.set()
+            if self.forecaster is not None:
+                self.forecaster.reset(tank_id)
+        return stopped
+
+    def set_flow_rate(self, tank_id, flow_rate):
+        """Changes the flow rate of a running pump."""
+        with self._lock:
+            if tank_id in self.pumps:
+                self.pumps[tank_id].flow_rate = flow_rate
+
+    def is_running(self, tank_id):
+        """Returns True if the tank's pump is running."""
+        with self._lock:
+            return tank_id in self.pumps
+
+    def running_count(self):
+        """Returns the number of running pumps."""
+        with self._lock:
+            return len(self.pumps)
+
+    def shutdown(self, timeout=5.0):
+        """Stops all pumps and the timer thread, then writes any buffered readings."""
+        with self._lock:
+            self.pumps.clear()
+            self._stopping = True
+            thread = self._thread
+        self._wake_event.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        # The timer thread flushes on its way out; this covers a timer that never started or timed out
+        self.write_buffer.flush()
+
+    # --- Timer loop ---
+
+    def _ensure_timer(self):
+        """Starts the timer thread on first use. The same thread serves every pump."""
+        with self._lock:
+            if self._stopping:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='diptank-pumps', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Timer thread: steps all running pumps every `interval` seconds."""
+        try:
+            self._loop()
+        finally:
+            close_connections()
+
+    def _loop(self):
+        next_tick = time.monotonic()
+        while not self._stopping:
+            if time.monotonic() >= next_tick:
+                recycle_connections()
+                result = self.tick()
+                if self.on_tick and (result.levels or result.stopped or result.errors or result.flush_error):
+                    self.on_tick(result)
+                # Schedule against a fixed cadence so slow ticks don't drift the interval
+                next_tick += self.interval
+                if next_tick < time.monotonic():
+                    next_tick = time.monotonic()
+            elif self._flush_requested:
+                self._flush_requested = False
+                recycle_connections()
+                self._flush()
+            self._wake_event.wait(max(0.0, next_tick - time.monotonic()))
+            self._wake_event.clear()
+        self._flush()
+
+    def _flush(self):
+        """Writes buffered readings, returning the exception instead of raising it."""
+        try:
+            self.write_buffer.flush()
+        except Exception as e:
+            print(f"Could not write buffered pump readings: {e}")
+            return e
+        return None
+
+    @instrumented('monitor.pump_tick')
+    def tick(self):
+        """Advances every running pump by one step and returns a PumpTickResult."""
+        result = PumpTickResult()
+        with self._lock:
+            active = list(self.pumps.values())
+
+        # Served from the tank cache; only newly started or invalidated tanks hit the database
+        try:
+            tanks = self.tank_cache.get_many([pump.tank_id for pump in active]) if active else {}
+        except Exception as e:  # OperationalError, ...
+            tanks = {}
+            for pump in active:
+                result.errors[pump.tank_id] = e
+
+        for pump in active:
+            tank = tanks.get(pump.tank_id)
+            if tank is None:
+                result.errors.setdefault(pump.tank_id, Tank.DoesNotExist(f"Tank {pump.tank_id} not found."))
+                continue
+            try:
+                self._step(pump, tank, result)
+            except Exception as e:
+                result.errors[pump.tank_id] = e
+
+        if self.forecaster is not None:
+            self.forecaster.observe_many(result.levels)
+            for tank_id in list(result.stopped) + list(result.errors):
+                if isinstance(result.errors.get(tank_id), Tank.DoesNotExist):
+                    self.forecaster.forget(tank_id)  # Deleted: drop its trend for good
+                else:
+                    self.forecaster.reset(tank_id)
+
+        with self._lock:
+            for pump in active:
+                # Only drop the pump this tick stepped, not one restarted in the meantime
+                if (pump.tank_id in result.stopped or pump.tank_id in result.errors) \
+                        and self.pumps.get(pump.tank_id) is pump:
+                    del self.pumps[pump.tank_id]
+
+        if result.stopped or result.errors:
+            # Pumps stopped: make sure everything they produced is written
+            self._flush_requested = False
+            result.flush_error = self._flush()
+        else:
+            try:
+                self.write_buffer.flush_if_due()
+            except Exception as e:
+                print(f"Could not write buffered pump readings: {e}")
+                result.flush_error = e
+        return result
+
+    def _step(self, pump, tank, result):
+        """Pumps water into one tank, stopping its pump at the max threshold."""
+        current_percentage = level_percentage(tank.current_level, tank.capacity)
+
+        # Auto-stop if max threshold is hit during pumping
+        if current_percentage >= tank.max_threshold:
+            result.stopped[tank.tank_id] = (
+                'max_threshold', f"Pump auto-stopped for Tank {tank.tank_id} (Max Threshold Reached).")
+            return
+
+        # Simulate pumping water IN (increase level)
+        new_level = pumped_level(tank.current_level, tank.capacity, pump.flow_rate)  # Don't exceed capacity
+
+        # Queue the level update and the sensor reading for the pump action. The level is
+        # written as a relative change, so a sensor reading landing meanwhile is not overwritten.
+        delta = new_level - tank.current_level
+        self.tank_cache.update_level(tank.tank_id, new_level)
+        self.write_buffer.add(tank.tank_id, new_level, delta=delta)
+        result.levels[tank.tank_id] = new_level
+
+        # Feed every step to the alert engine so an open low-water alert resolves as the tank refills.
+        # An overfill writes a high-water alert only if that condition was not already open.
+        alerts = self.alert_engine.process(tank, new_level, suffix=" due to pump.")
+        for alert in alerts:
+            alert.save()
+        publish_alerts(alerts)
+
+        # Check for overfill (auto-stop should prevent this, but as a fallback stop the pump)
+        current_percentage = level_percentage(new_level, tank.capacity)
+        if current_percentage > tank.max_threshold:
+            result.stopped[tank.tank_id] = ('overfilled', f"Alert: Pump overfilled Tank {tank.tank_id}!")
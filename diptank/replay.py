@@ -0,0 +1,219 @@
+# diptank/replay.py
+# Record and replay of sensor streams, so performance runs can be repeated on
+# identical input.
+#
+# A capture is a small header followed by fixed-size little-endian records of
+# (tank_id int32, timestamp float64 epoch seconds, level float64), 20 bytes per
+# event, readable in one call with read_events(). SensorRecorder writes
+# captures from live runs (the load generator's --record, the monitor's
+# --record). replay() feeds a capture through the same write and alert path as
+# the load generator: the AlertEngine (clocked by the recorded timestamps, so
+# rate limiting replays identically) and either one commit per reading or a
+# ReadingWriteBuffer, at the recorded pace times --speed or as fast as
+# possible. It reports throughput, write latency and how far it fell behind
+# the recorded schedule.
+#
+#     python diptank_monitor_app.py --headless --tanks 200 --rate 100 --record run.dtrc
+#     python diptank_monitor_app.py --replay run.dtrc --speed 10
+#     python diptank_monitor_app.py --replay run.dtrc --speed max --buffered
+
+import struct
+import threading
+import time
+
+import numpy as np
+from django.db import connections
+
+from .alerts import AlertEngine
+from .loadgen import _write_reading, percentile
+from .models import Tank
+from .simulation import ALERT_HYSTERESIS, ALERT_RATE_LIMIT_WINDOW
+from .write_buffer import ReadingWriteBuffer
+
+CAPTURE_MAGIC = b'DTRC'
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct('<4sHH')  # magic, version, reserved
+EVENT_DTYPE = np.dtype([('tank_id', '<i4'), ('timestamp', '<f8'), ('level', '<f8')])
+# Events a recorder holds in memory before appending them to the file
+RECORDER_FLUSH_EVENTS = 4096
+
+
+class SensorRecorder:
+    """
+    Appends (tank_id, timestamp, level) events to a capture file. Thread-safe;
+    events are written in blocks of RECORDER_FLUSH_EVENTS and on close().
+    """
+
+    def __init__(self, path, flush_events=RECORDER_FLUSH_EVENTS):
+        self.path = path
+        self.flush_events = flush_events
+        self.events = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, 0))
+
+    def record(self, tank_id, level, at=None):
+        """Records one reading (taken now unless `at`, in epoch seconds, is given)."""
+        with self._lock:
+            self._pending.append((tank_id, time.time() if at is None else at, level))
+            self.events += 1
+            if len(self._pending) >= self.flush_events:
+                self._write_pending()
+
+    def record_many(self, levels, at=None):
+        """Records {tank_id: level} readings taken at the same time."""
+        at = time.time() if at is None else at
+        for tank_id, level in levels.items():
+            self.record(tank_id, level, at)
+
+    def _write_pending(self):
+        if self._pending:
+            np.array(self._pending, dtype=EVENT_DTYPE).tofile(self._file)
+            self._pending = []
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write_pending()
+            self._file.close()
+
+
+def read_events(path):
+    """Returns the events of a capture as a NumPy structured array (tank_id, timestamp, level)."""
+    with open(path, 'rb') as f:
+        header = f.read(CAPTURE_HEADER.size)
+        if len(header) < CAPTURE_HEADER.size:
+            raise ValueError(f"{path} is not a Diptank sensor capture.")
+        magic, version, _ = CAPTURE_HEADER.unpack(header)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a Diptank sensor capture.")
+        if version != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {version} in {path}.")
+        return np.fromfile(f, dtype=EVENT_DTYPE)
+
+
+def merge_captures(paths, path):
+    """Merges captures (e.g. one per load generator worker) into one, ordered by timestamp."""
+    events = np.concatenate([read_events(part) for part in paths]) if paths else np.empty(0, EVENT_DTYPE)
+    events = events[np.argsort(events['timestamp'], kind='stable')]
+    with open(path, 'wb') as f:
+        f.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, 0))
+        events.tofile(f)
+    return len(events)
+
+
+class ReplayReport:
+    """Outcome of a replay: events written, skipped and failed, timings and latencies."""
+
+    def __init__(self):
+        self.events = 0
+        self.written = 0
+        self.skipped = 0  # Events for tanks that are not in the database
+        self.errors = 0
+        self.alerts = 0
+        self.elapsed = 0.0
+        self.recorded_span = 0.0
+        self.max_lag = 0.0  # Seconds the replay fell behind the recorded schedule
+        self.latencies = []
+
+    def print(self, speed, buffered):
+        latencies = sorted(self.latencies)
+        pace = "max speed" if speed is None else f"{speed:g}x"
+        print(f"Replayed {self.events} events ({self.recorded_span:.1f}s recorded) at {pace} "
+              f"in {self.elapsed:.2f}s: {self.written} written, {self.skipped} skipped, {self.errors} failed, "
+              f"{self.alerts} alerts")
+        print(f"Throughput:       {self.written / self.elapsed if self.elapsed else 0.0:.1f} readings/s")
+        label = "Flush latency" if buffered else "Commit latency"
+        print(f"{label} (ms):  p50={percentile(latencies, 0.50) * 1000:.2f}  "
+              f"p90={percentile(latencies, 0.90) * 1000:.2f}  p99={percentile(latencies, 0.99) * 1000:.2f}  "
+              f"max={(latencies[-1] if latencies else 0.0) * 1000:.2f}  (n={len(latencies)})")
+        if speed is not None:
+            print(f"Max lag behind the recorded schedule: {self.max_lag * 1000:.1f} ms")
+
+
+def replay(path, speed=1.0, buffered=False, reset_levels=True):
+    """
+    Feeds a capture into the write and alert path and returns a ReplayReport.
+    `speed` scales the recorded pace (None replays as fast as possible). With
+    `reset_levels`, every tank starts from its first recorded level, so
+    repeated replays see the same starting state.
+    """
+    events = read_events(path)
+    report = ReplayReport()
+    report.events = len(events)
+    if not len(events):
+        return report
+    report.recorded_span = float(events['timestamp'][-1] - events['timestamp'][0])
+
+    tanks = Tank.objects.in_bulk(np.unique(events['tank_id']).tolist())
+    if reset_levels:
+        first = {}
+        for tank_id, level in zip(events['tank_id'].tolist(), events['level'].tolist()):
+            first.setdefault(tank_id, level)
+        for tank_id, tank in tanks.items():
+            tank.current_level = first[tank_id]
+        Tank.objects.bulk_update(list(tanks.values()), ['current_level'], batch_size=500)
+
+    # A fresh engine clocked by the recorded timestamps: alerts open, resolve and rate-limit as recorded
+    # (not seeded from the Alert rows already in the database, which would make replays differ)
+    recorded_now = [float(events['timestamp'][0])]
+    alert_engine = AlertEngine(ALERT_HYSTERESIS, ALERT_RATE_LIMIT_WINDOW, clock=lambda: recorded_now[0],
+                               seed_from_alerts=False)
+    write_buffer = ReadingWriteBuffer() if buffered else None
+
+    origin = float(events['timestamp'][0])
+    start = time.perf_counter()
+    for tank_id, timestamp, level in zip(events['tank_id'].tolist(), events['timestamp'].tolist(),
+                                         events['level'].tolist()):
+        if speed is not None:
+            due = start + (timestamp - origin) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                report.max_lag = max(report.max_lag, -delay)
+
+        tank = tanks.get(tank_id)
+        if tank is None:
+            report.skipped += 1
+            continue
+        recorded_now[0] = timestamp
+        try:
+            t0 = time.perf_counter()
+            if write_buffer is not None:
+                alerts = alert_engine.process(tank, level)
+                for alert in alerts:
+                    alert.save()
+                write_buffer.add(tank_id, level)
+                write_buffer.flush_if_due()
+                if write_buffer.pending_count() == 0:  # The size or time bound triggered a flush
+                    report.latencies.append(time.perf_counter() - t0)
+            else:
+                alerts = _write_reading(tank, level, alert_engine)
+                report.latencies.append(time.perf_counter() - t0)
+            report.alerts += len(alerts)
+            report.written += 1
+            tank.current_level = level
+        except Exception as e:  # OperationalError, ...
+            report.errors += 1
+            if report.errors <= 5:
+                print(f"Could not replay reading for Tank {tank_id}: {e}")
+
+    if write_buffer is not None:
+        t0 = time.perf_counter()
+        if write_buffer.flush():
+            report.latencies.append(time.perf_counter() - t0)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def run(args):
+    """Replays the capture given on the command line and prints the report."""
+    speed = None if args.speed == 'max' else float(args.speed)
+    if speed is not None and speed <= 0:
+        raise SystemExit("--speed must be positive or 'max'.")
+    print(f"Replaying {args.replay} (database: {connections['default'].vendor})...")
+    report = replay(args.replay, speed=speed, buffered=args.buffered)
+    report.print(speed, args.buffered)
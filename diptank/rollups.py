@@ -0,0 +1,198 @@
+# diptank/rollups.py
+# Time-series rollups for SensorReading: per-tank minute, hour and day
+# aggregates (min, max, mean, last), filled incrementally as readings are
+# written, plus the retention policy that prunes raw readings past a horizon.
+#
+# History charts should read SensorReadingRollup (models.py) via
+# rollup_history() instead of scanning raw SensorReading rows.
+
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import SensorReading, SensorReadingRollup
+
+ROLLUP_PERIODS = ('minute', 'hour', 'day')
+ROLLUP_PERIOD_LENGTHS = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+# Raw SensorReading rows older than this are pruned (their rollups are kept)
+RAW_READING_RETENTION = timedelta(days=7)
+# How long each rollup period is kept; None keeps it forever
+ROLLUP_RETENTION = {
+    'minute': timedelta(days=2),
+    'hour': timedelta(days=90),
+    'day': None,
+}
+# Rows deleted per statement when pruning
+PRUNE_BATCH_SIZE = 5000
+# Rollup rows updated per UPDATE statement (each row adds a few parameters to every CASE)
+ROLLUP_UPDATE_BATCH_SIZE = 50
+# Passes record_readings() makes when concurrent writers keep creating the same new buckets
+ROLLUP_UPSERT_ATTEMPTS = 3
+
+
+def bucket_start(timestamp, period):
+    """Truncates a timestamp to the start of its minute, hour or day bucket."""
+    if period == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if period == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup period: {period}")
+
+
+def _increment(rows):
+    """
+    Folds new aggregates into existing rollup rows, given as [(pk, aggregates)],
+    with one UPDATE whose new values the database computes from the current ones.
+    """
+    def per_row(index, output_field):
+        return Case(*[When(pk=pk, then=Value(agg[index])) for pk, agg in rows], output_field=output_field)
+
+    SensorReadingRollup.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+        min_level=Least(F('min_level'), per_row(0, models.FloatField())),
+        max_level=Greatest(F('max_level'), per_row(1, models.FloatField())),
+        sum_level=F('sum_level') + per_row(2, models.FloatField()),
+        reading_count=F('reading_count') + per_row(3, models.IntegerField()),
+        # Ahead of last_timestamp: MySQL evaluates SET clauses in order, against the updated columns
+        last_level=Case(*[When(pk=pk, last_timestamp__lte=agg[5], then=Value(agg[4])) for pk, agg in rows],
+                        default=F('last_level'), output_field=models.FloatField()),
+        last_timestamp=Greatest(F('last_timestamp'), per_row(5, models.DateTimeField())),
+    )
+
+
+def record_readings(readings, periods=ROLLUP_PERIODS):
+    """
+    Folds saved SensorReading instances into their minute/hour/day rollups
+    (or only those of `periods`).
+
+    Existing buckets are updated in place with F() expressions and new ones
+    inserted in bulk, without row locks, so writers of the same tank never
+    wait on each other. If another writer inserts one of the new buckets
+    first, the insert is rolled back to a savepoint and those buckets are
+    updated instead. Should be called inside the transaction that wrote the
+    readings.
+    """
+    # (tank_id, period, bucket_start) -> [min, max, sum, count, last_level, last_timestamp]
+    pending = {}
+    for reading in readings:
+        for period in periods:
+            key = (reading.tank_id, period, bucket_start(reading.timestamp, period))
+            agg = pending.get(key)
+            if agg is None:
+                pending[key] = [reading.water_level, reading.water_level, reading.water_level, 1,
+                                reading.water_level, reading.timestamp]
+            else:
+                agg[0] = min(agg[0], reading.water_level)
+                agg[1] = max(agg[1], reading.water_level)
+                agg[2] += reading.water_level
+                agg[3] += 1
+                if reading.timestamp >= agg[5]:
+                    agg[4], agg[5] = reading.water_level, reading.timestamp
+
+    for attempt in range(ROLLUP_UPSERT_ATTEMPTS):
+        if not pending:
+            return
+        existing = [
+            (pk, pending.pop((tank_id, period, start)))
+            for pk, tank_id, period, start in SensorReadingRollup.objects.filter(
+                tank_id__in={key[0] for key in pending},
+                bucket_start__in={key[2] for key in pending},
+            ).values_list('pk', 'tank_id', 'period', 'bucket_start')
+            if (tank_id, period, start) in pending
+        ]
+        for i in range(0, len(existing), ROLLUP_UPDATE_BATCH_SIZE):
+            _increment(existing[i:i + ROLLUP_UPDATE_BATCH_SIZE])
+        if not pending:
+            return
+        try:
+            # A savepoint, so a conflicting insert does not abort the caller's transaction
+            with transaction.atomic():
+                SensorReadingRollup.objects.bulk_create([
+                    SensorReadingRollup(tank_id=tank_id, period=period, bucket_start=start, min_level=agg[0],
+                                        max_level=agg[1], sum_level=agg[2], reading_count=agg[3],
+                                        last_level=agg[4], last_timestamp=agg[5])
+                    for (tank_id, period, start), agg in pending.items()
+                ], batch_size=500)
+            return
+        except IntegrityError:
+            if attempt == ROLLUP_UPSERT_ATTEMPTS - 1:
+                raise
+            # Another writer created some of these buckets meanwhile: the next pass updates them
+
+
+def rollup_history(tank_ids, period='hour', since=None):
+    """Returns the rollups of the given tanks for one period, oldest first, for history charts."""
+    rollups = SensorReadingRollup.objects.filter(tank_id__in=tank_ids, period=period)
+    if since is not None:
+        rollups = rollups.filter(bucket_start__gte=bucket_start(since, period))
+    return rollups.order_by('tank_id', 'bucket_start')
+
+
+def _first_whole_bucket(timestamp, period):
+    """Returns the start of the first bucket that begins at or after `timestamp`."""
+    start = bucket_start(timestamp, period)
+    return start if start == timestamp else start + ROLLUP_PERIOD_LENGTHS[period]
+
+
+def rebuild_rollups(since=None, batch_size=PRUNE_BATCH_SIZE):
+    """
+    Recomputes the rollups from the raw readings (e.g. after enabling rollups
+    on an existing database), from the bucket of `since` on, or from the
+    oldest raw reading still kept.
+
+    Only buckets the kept raw readings cover in full are replaced: older
+    buckets, and the one the oldest kept reading falls into partway through,
+    keep the history of readings that were already pruned. Returns the
+    number of raw readings read.
+    """
+    readings = SensorReading.objects.all()
+    oldest = readings.order_by('timestamp').values_list('timestamp', flat=True).first()
+    if oldest is None:
+        return 0
+
+    count = 0
+    for period in ROLLUP_PERIODS:
+        start = _first_whole_bucket(oldest, period)
+        if since is not None and bucket_start(since, period) > start:
+            start = bucket_start(since, period)
+        _delete_in_batches(SensorReadingRollup.objects.filter(period=period, bucket_start__gte=start), batch_size)
+
+        folded = 0
+        batch = []
+        for reading in readings.filter(timestamp__gte=start).order_by('timestamp').only(
+                'tank_id', 'water_level', 'timestamp').iterator(chunk_size=batch_size):
+            batch.append(reading)
+            if len(batch) >= batch_size:
+                record_readings(batch, periods=(period,))
+                folded += len(batch)
+                batch = []
+        record_readings(batch, periods=(period,))
+        count = max(count, folded + len(batch))
+    return count
+
+
+def _delete_in_batches(queryset, batch_size):
+    """Deletes a queryset a batch of primary keys at a time, keeping each transaction short."""
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=pks).delete()[0]
+
+
+def prune(now=None, raw_retention=RAW_READING_RETENTION, rollup_retention=None, batch_size=PRUNE_BATCH_SIZE):
+    """Applies the retention policy. Returns {'raw': n, 'minute': n, 'hour': n, 'day': n} rows deleted."""
+    now = now or timezone.now()
+    rollup_retention = ROLLUP_RETENTION if rollup_retention is None else rollup_retention
+    deleted = {'raw': _delete_in_batches(SensorReading.objects.filter(timestamp__lt=now - raw_retention),
+                                         batch_size)}
+    for period in ROLLUP_PERIODS:
+        horizon = rollup_retention.get(period)
+        deleted[period] = 0 if horizon is None else _delete_in_batches(
+            SensorReadingRollup.objects.filter(period=period, bucket_start__lt=now - horizon), batch_size)
+    return deleted
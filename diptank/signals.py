@@ -0,0 +1,43 @@
+# diptank/signals.py
+# Model signal receivers, connected by DiptankConfig.ready() (apps.py) in every
+# process that loads the app.
+
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .locations import resolve_location
+from .models import Tank, UserProfile
+from .summary import invalidate_summary
+from .tank_cache import bump_tank_generation
+
+
+@receiver(pre_save, sender=Tank)
+def link_tank_location(sender, instance, **kwargs):
+    """Points a tank at the Location of its location string, spelled canonically."""
+    location = resolve_location(instance.location)
+    instance.location_ref = location
+    if location is not None:
+        instance.location = location.name
+
+
+@receiver(pre_save, sender=UserProfile)
+def link_profile_location(sender, instance, **kwargs):
+    """Points a farmer profile at the Location of its location_associated string."""
+    location = resolve_location(instance.location_associated)
+    instance.location_ref = location
+    if location is not None:
+        instance.location_associated = location.name
+
+
+@receiver(post_save, sender=Tank)
+@receiver(post_delete, sender=Tank)
+def invalidate_cached_tanks(sender, instance, **kwargs):
+    """Tells monitor processes that their cached tank state is stale."""
+    bump_tank_generation()
+
+
+@receiver(post_save, sender=Tank)
+@receiver(post_delete, sender=Tank)
+def invalidate_level_summary(sender, instance, **kwargs):
+    """A save can change a tank's capacity or location, so the cached totals are recomputed."""
+    invalidate_summary()
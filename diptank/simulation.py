@@ -0,0 +1,59 @@
+# diptank/simulation.py
+# Level-fluctuation, clamping, pump and alert rules shared by the monitor app,
+# the pump scheduler and the headless load generator. Plain functions on
+# numbers so every caller applies exactly the same rules.
+
+import random
+
+# Maximum sensor fluctuation per reading, as a fraction of capacity (+/- 5%)
+SENSOR_FLUCTUATION = 0.05
+# Default interval between pump steps (in seconds)
+PUMP_UPDATE_INTERVAL = 1.0
+# Default amount of water added per pump step (in Liters)
+PUMP_FLOW_RATE = 50.0
+# Percentage points a level must move back inside a threshold before its alert resolves
+ALERT_HYSTERESIS = 2.0
+# A condition that re-opens within this many seconds of its last alert does not write another
+ALERT_RATE_LIMIT_WINDOW = 300.0
+
+
+def level_percentage(level, capacity):
+    """Returns the fill level as a percentage of capacity (0 for tanks without capacity)."""
+    return (level / capacity) * 100 if capacity > 0 else 0
+
+
+def clamp_level(level, capacity):
+    """Clamps a level between 0 and the tank's capacity."""
+    return max(0.0, min(capacity, level))
+
+
+def simulated_sensor_level(level, capacity, rng=random):
+    """Simulates a new sensor reading as a random fluctuation around the current level."""
+    fluctuation = rng.uniform(-SENSOR_FLUCTUATION, SENSOR_FLUCTUATION) * capacity
+    return clamp_level(level + fluctuation, capacity)
+
+
+def pumped_level(level, capacity, flow_rate):
+    """Returns the level after one pump step; pumping never exceeds capacity."""
+    return min(capacity, level + flow_rate)
+
+
+def alert_message(tank_id, location, alert_type, percentage, min_threshold, max_threshold, suffix=""):
+    """Builds the Alert.message text for a threshold alert."""
+    if alert_type == 'low_water':
+        return (f"Tank {tank_id} at {location} is below minimum threshold ({min_threshold:.0f}%). "
+                f"Current: {percentage:.0f}%{suffix}")
+    return (f"Tank {tank_id} at {location} is above maximum threshold ({max_threshold:.0f}%). "
+            f"Current: {percentage:.0f}%{suffix}")
+
+
+def auto_pump_action(percentage, min_threshold, max_threshold, pump_running):
+    """
+    On/off hysteresis of the automatic pump control.
+    Returns True to turn the pump on, False to turn it off, or None to leave it as is.
+    """
+    if percentage < min_threshold and not pump_running:
+        return True
+    if percentage >= max_threshold and pump_running:
+        return False
+    return None
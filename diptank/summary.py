@@ -0,0 +1,64 @@
+# diptank/summary.py
+# Shared fleet/location summary service for the officer dashboard and the monitor.
+#
+# The per-location totals of aggregation.level_summary() are kept in a Django
+# cache (DIPTANK_SUMMARY_CACHE, the 'default' cache unless set) for up to
+# SUMMARY_CACHE_TTL seconds. Every committed change to levels, capacities or
+# tanks drops the cached summary with invalidate_summary() (level writes of
+# the monitor and the write buffer, saves through forms, deletes, bulk
+# imports), and the next reader recomputes it with one query. Writers never
+# edit the cached totals in place, so writers in several processes sharing
+# one cache cannot lose each other's changes. Writers that do not invalidate
+# (e.g. a load generator without a shared cache) show up after at most
+# SUMMARY_CACHE_TTL.
+#
+# The local-memory backend keeps the summary per process; the file-based
+# backend shares it between the web and monitor processes. Both work without
+# an outside service.
+
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .aggregation import level_summary
+from .classification import classify_summary
+
+SUMMARY_CACHE_KEY = 'diptank:level_summary'
+# Seconds a computed summary is served before it is recomputed, unless a write invalidates it sooner
+SUMMARY_CACHE_TTL = getattr(settings, 'DIPTANK_SUMMARY_CACHE_TTL', 60)
+
+
+def _cache():
+    return caches[getattr(settings, 'DIPTANK_SUMMARY_CACHE', 'default')]
+
+
+def raw_summary():
+    """Returns the cached level_summary() result, computing and caching it on a miss."""
+    summary = _cache().get(SUMMARY_CACHE_KEY)
+    if summary is None:
+        summary = level_summary()
+        summary['computed_at'] = time.time()
+        _cache().set(SUMMARY_CACHE_KEY, summary, timeout=SUMMARY_CACHE_TTL)
+    return summary
+
+
+def get_summary(location=None):
+    """
+    Returns the fleet summary with percentages and statuses (see
+    classification.classify_summary), from the cache when possible. With
+    `location`, the fleet totals cover that location only.
+    """
+    summary = copy.deepcopy(raw_summary())
+    if location is not None:
+        data = summary['locations'].get(location)
+        summary['locations'] = {location: data} if data else {}
+        summary['total_current_level'] = data['current_level'] if data else 0.0
+        summary['total_capacity'] = data['capacity'] if data else 0.0
+    return classify_summary(summary)
+
+
+def invalidate_summary():
+    """Drops the cached summary, so the next reader recomputes it. Call after the change is committed."""
+    _cache().delete(SUMMARY_CACHE_KEY)
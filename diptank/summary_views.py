@@ -0,0 +1,37 @@
+# diptank/summary_views.py
+# JSON endpoint for the cached fleet/location summary (see summary.py).
+#
+#   summary/  - fleet totals and per-location totals with percentage and status;
+#               farmers get their own location only
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .locations import profile_location_name
+from .models import UserProfile
+from .summary import get_summary
+
+
+@login_required
+@require_GET
+def summary_view(request):
+    """The fleet and per-location water level summary, served from the summary cache."""
+    profile = UserProfile.objects.filter(user=request.user).select_related('location_ref').first()
+    if profile is None:
+        return HttpResponseForbidden("No dashboard for this user.")
+    location = profile_location_name(profile) if profile.user_type == 'farmer' else None
+    if profile.user_type == 'officer':
+        summary = get_summary()
+    elif location is not None:
+        summary = get_summary(location)
+    else:
+        return HttpResponseForbidden("No dashboard for this user.")
+    return JsonResponse({
+        'total_current_level': summary['total_current_level'],
+        'total_capacity': summary['total_capacity'],
+        'percentage': summary['percentage'],
+        'status': summary['status'],
+        'computed_at': summary['computed_at'],
+        'locations': [dict(data, location=location) for location, data in summary['locations'].items()],
+    })
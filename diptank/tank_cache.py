@@ -0,0 +1,119 @@
+# diptank/tank_cache.py
+# Process-local cache of tank state for the monitor's hot paths.
+#
+# The monitor's own writes update cached tanks in place. Writes made by the web
+# side (TankForm, officer dashboard threshold edits) bump a generation counter
+# in Django's cache from a post_save/post_delete receiver (see signals.py);
+# every process holding a TankStateCache notices the new generation and drops
+# its entries. For this to reach a separate monitor process the default cache
+# must be shared between processes (e.g. the file-based or database backend);
+# with the local-memory backend entries still expire after `max_age` seconds.
+
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Tank
+
+TANK_GENERATION_CACHE_KEY = 'diptank:tank_generation'
+# Reload a cached tank from the database at least this often (in seconds)
+TANK_CACHE_MAX_AGE = 30.0
+# How often readers look at the shared generation counter (in seconds)
+TANK_GENERATION_CHECK_INTERVAL = 1.0
+
+
+def bump_tank_generation():
+    """Invalidates the cached tank state of every process."""
+    try:
+        cache.incr(TANK_GENERATION_CACHE_KEY)
+    except ValueError:
+        # First invalidation since the cache was cleared
+        cache.add(TANK_GENERATION_CACHE_KEY, 1, timeout=None)
+
+
+class TankStateCache:
+    """
+    Tank instances keyed by tank_id, served from memory.
+
+    get()/get_many() only query the database on a miss, after an invalidation
+    or once an entry is older than `max_age`. Callers must treat returned
+    tanks as read-only and report their own writes with update_level().
+
+    `flush_pending_writes`, if given, is called before tanks are reloaded so
+    that levels still sitting in a write buffer reach the database first.
+    """
+
+    def __init__(self, max_age=TANK_CACHE_MAX_AGE, generation_check_interval=TANK_GENERATION_CHECK_INTERVAL,
+                 flush_pending_writes=None):
+        self.max_age = max_age
+        self.generation_check_interval = generation_check_interval
+        self.flush_pending_writes = flush_pending_writes
+        self._tanks = {}  # tank_id -> (Tank, loaded_at)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked_at = 0.0
+
+    def get(self, tank_id):
+        """Returns the tank, loading it on a miss. Raises Tank.DoesNotExist like Tank.objects.get()."""
+        tanks = self.get_many([tank_id])
+        if tank_id not in tanks:
+            raise Tank.DoesNotExist(f"Tank {tank_id} not found.")
+        return tanks[tank_id]
+
+    def get_many(self, tank_ids):
+        """Returns {tank_id: Tank} for the tanks that exist, loading all misses with one query."""
+        self._check_generation()
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for tank_id in tank_ids:
+                entry = self._tanks.get(tank_id)
+                if entry is not None and now - entry[1] < self.max_age:
+                    found[tank_id] = entry[0]
+                else:
+                    missing.append(tank_id)
+        if missing:
+            if self.flush_pending_writes:
+                self.flush_pending_writes()
+            loaded = Tank.objects.in_bulk(missing)
+            with self._lock:
+                for tank_id, tank in loaded.items():
+                    self._tanks[tank_id] = (tank, now)
+                for tank_id in missing:
+                    if tank_id not in loaded:
+                        self._tanks.pop(tank_id, None)
+            found.update(loaded)
+        return found
+
+    def update_level(self, tank_id, level):
+        """Records a level this process wrote (or queued) for a cached tank."""
+        with self._lock:
+            entry = self._tanks.get(tank_id)
+            if entry is not None:
+                entry[0].current_level = level
+
+    def invalidate(self, tank_id=None):
+        """Drops one tank, or every tank, from the cache."""
+        with self._lock:
+            if tank_id is None:
+                self._tanks.clear()
+            else:
+                self._tanks.pop(tank_id, None)
+
+    def _check_generation(self):
+        """Drops every entry if another process bumped the shared tank generation."""
+        now = time.monotonic()
+        if now - self._generation_checked_at < self.generation_check_interval:
+            return
+        self._generation_checked_at = now
+        generation = cache.get(TANK_GENERATION_CACHE_KEY)
+        if generation != self._generation:
+            if self._generation is not None or generation is not None:
+                self.invalidate()
+            self._generation = generation
+
+
+# The monitor's process-wide cache
+tank_cache = TankStateCache()
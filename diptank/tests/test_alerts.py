@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from diptank.alerts import AlertEngine
+from diptank.models import Alert, SensorReading, Tank
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class AlertEngineTests(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.engine = AlertEngine(hysteresis=2.0, rate_limit_window=300.0, clock=self.clock, seed_from_alerts=False)
+
+    def evaluate(self, percentage):
+        return self.engine.evaluate(1, percentage, 20.0, 90.0)
+
+    def test_levels_inside_the_thresholds_write_nothing(self):
+        self.assertEqual([self.evaluate(pct) for pct in (20, 50, 90)], [[], [], []])
+
+    def test_one_alert_per_crossing(self):
+        self.assertEqual(self.evaluate(15), ['low_water'])
+        self.assertEqual(self.evaluate(10), [])
+        self.assertEqual(self.evaluate(95), ['high_water'])
+        self.assertEqual(self.engine.alerts_written, 2)
+
+    def test_hovering_at_the_threshold_does_not_flap(self):
+        self.assertEqual(self.evaluate(19), ['low_water'])
+        self.clock.now += 1000
+        # Back above the threshold but not by the hysteresis margin: still open
+        self.assertEqual(self.evaluate(21), [])
+        self.assertEqual(self.evaluate(19), [])
+        # Cleared, then a new crossing past the rate-limit window writes again
+        self.assertEqual(self.evaluate(22), [])
+        self.assertEqual(self.evaluate(19), ['low_water'])
+
+    def test_reopening_within_the_window_is_suppressed(self):
+        self.assertEqual(self.evaluate(95), ['high_water'])
+        self.clock.now += 100
+        self.assertEqual(self.evaluate(80), [])
+        self.assertEqual(self.evaluate(95), [])
+        self.assertEqual(self.engine.alerts_suppressed, 1)
+        self.clock.now += 300
+        self.assertEqual(self.evaluate(80), [])
+        self.assertEqual(self.evaluate(95), ['high_water'])
+
+    def test_tanks_are_tracked_separately(self):
+        self.assertEqual(self.engine.evaluate(1, 10, 20.0, 90.0), ['low_water'])
+        self.assertEqual(self.engine.evaluate(2, 10, 20.0, 90.0), ['low_water'])
+
+
+class AlertEngineSeedTests(TestCase):
+
+    def setUp(self):
+        self.tank = Tank.objects.create(location='Farm A', capacity=1000, current_level=100)
+        self.engine = AlertEngine(hysteresis=2.0, rate_limit_window=300.0, clock=FakeClock())
+
+    def test_open_alert_in_the_database_is_not_written_again(self):
+        Alert.objects.create(tank=self.tank, alert_type='low_water', message="Low")
+        self.assertEqual(self.engine.process(self.tank, 100), [])
+
+    def test_alert_cleared_by_a_later_reading_can_open_again(self):
+        alert = Alert.objects.create(tank=self.tank, alert_type='low_water', message="Low")
+        Alert.objects.filter(pk=alert.pk).update(timestamp=timezone.now() - timedelta(hours=1))
+        SensorReading.objects.create(tank=self.tank, water_level=500)
+        alerts = self.engine.process(self.tank, 100)
+        self.assertEqual([alert.alert_type for alert in alerts], ['low_water'])
+        self.assertEqual(alerts[0].tank_id, self.tank.tank_id)
+
+    def test_recent_alert_still_rate_limits_after_a_restart(self):
+        alert = Alert.objects.create(tank=self.tank, alert_type='low_water', message="Low")
+        Alert.objects.filter(pk=alert.pk).update(timestamp=timezone.now() - timedelta(minutes=1))
+        SensorReading.objects.create(tank=self.tank, water_level=500)
+        self.assertEqual(self.engine.process(self.tank, 100), [])
+        self.assertEqual(self.engine.alerts_suppressed, 1)
@@ -0,0 +1,75 @@
+import csv
+import io
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+
+from diptank.bulk import ImportFileError, import_tanks, iter_rows
+from diptank.bulk_views import reading_export_view
+from diptank.models import Tank, UserProfile
+
+CSV_HEADER = b"location,capacity,current_level,min_threshold,max_threshold\n"
+
+
+def csv_rows(*lines):
+    return iter_rows(io.BytesIO(CSV_HEADER + b"".join(lines)), 'csv')
+
+
+class ImportTanksTests(TestCase):
+
+    def test_valid_and_invalid_rows_are_reported(self):
+        report = import_tanks(csv_rows(b"Farm A,1000,500,20,90\n", b"Farm B,-5,x,20,90\n"))
+        self.assertEqual((report.rows, report.created, report.error_count), (2, 1, 1))
+        self.assertEqual(report.errors[0][0], 3)  # Spreadsheet numbering: row 1 is the header
+        self.assertIn('current_level', report.errors[0][1])
+        self.assertIsNone(report.file_error)
+        self.assertEqual(list(Tank.objects.values_list('location', flat=True)), ['Farm A'])
+
+    def test_dry_run_creates_nothing(self):
+        report = import_tanks(csv_rows(b"Farm A,1000,500,20,90\n"), dry_run=True)
+        self.assertEqual(report.created, 1)
+        self.assertFalse(Tank.objects.exists())
+
+    def test_undecodable_file_stops_the_import_and_is_reported(self):
+        rows = csv_rows(b"Farm A,1000,500,20,90\n", b"Farm \xff,1000,500,20,90\n")
+        # One tank per batch: the row before the bad one is already committed when reading fails
+        report = import_tanks(rows, batch_size=1)
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.file_error[0], 3)
+        self.assertIn('UTF-8', report.file_error[1])
+        result = report.as_dict()
+        self.assertEqual(result['file_error']['row'], 3)
+        self.assertIn('1 valid rows before it were imported', result['file_error']['detail'])
+        self.assertEqual(Tank.objects.count(), 1)
+
+    def test_malformed_csv_is_reported_as_a_file_error(self):
+        limit = csv.field_size_limit(20)
+        self.addCleanup(csv.field_size_limit, limit)
+        rows = list(csv_rows(b"Farm A,1000,500,20,90\n", b"Farm " + b"B" * 30 + b",1000,500,20,90\n"))
+
+        self.assertIsInstance(rows[-1][1], ImportFileError)
+        report = import_tanks(iter(rows))
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.file_error[0], 3)
+        self.assertIn('Malformed CSV', report.file_error[1])
+
+
+class ReadingExportViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('officer', password='secret')
+        UserProfile.objects.create(user=self.user, name='Officer', email='officer@example.com', user_type='officer')
+
+    def export(self, hours):
+        request = RequestFactory().get('/readings/export/', {'hours': hours})
+        request.user = self.user
+        return reading_export_view(request)
+
+    def test_positive_hours_are_accepted(self):
+        for hours in ('24', '0.5', '1e7'):
+            self.assertEqual(self.export(hours).status_code, 200, hours)
+
+    def test_invalid_hours_are_rejected(self):
+        for hours in ('nan', 'inf', '-inf', '-5', '0', '1e12', 'abc'):
+            self.assertEqual(self.export(hours).status_code, 400, hours)
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from diptank.fleet_sim import FleetSimulation
+from diptank.fleet_sim_store import load_fleet_state, persist_simulation
+from diptank.models import Alert, SensorReading, Tank
+
+
+class PersistSimulationTests(TestCase):
+
+    def setUp(self):
+        # Starts below its min threshold, so the first step writes a low_water alert
+        Tank.objects.create(location='Farm A', capacity=1000, current_level=100)
+        Tank.objects.create(location='Farm B', capacity=1000, current_level=500)
+
+    def simulate(self, hours=2):
+        sim = FleetSimulation(load_fleet_state(), dt=5.0, seed=1, record_interval=600.0)
+        sim.run(hours * 3600)
+        return sim
+
+    def test_run_ends_now_by_default(self):
+        sim = self.simulate()
+        before = timezone.now()
+        readings, alerts = persist_simulation(sim)
+        after = timezone.now()
+
+        self.assertEqual(readings, SensorReading.objects.count())
+        self.assertGreater(alerts, 0)
+        newest = SensorReading.objects.order_by('-timestamp').first().timestamp
+        oldest = SensorReading.objects.order_by('timestamp').first().timestamp
+        self.assertTrue(before - timedelta(seconds=600) <= newest <= after)
+        self.assertTrue(before - timedelta(hours=2) <= oldest <= after - timedelta(hours=1, minutes=50))
+        # Alerts share the readings' simulated clock instead of the wall clock at persist time
+        first_alert = Alert.objects.order_by('timestamp').first().timestamp
+        self.assertLess(first_alert, before - timedelta(hours=1, minutes=50))
+
+    def test_explicit_start_time(self):
+        start = datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+        sim = self.simulate(hours=1)
+        persist_simulation(sim, start_time=start)
+
+        clock, _ = sim.samples[0]
+        self.assertEqual(SensorReading.objects.order_by('timestamp').first().timestamp,
+                         start + timedelta(seconds=clock))
+        alert_clock = sim.alert_events[0][0]
+        self.assertEqual(Alert.objects.order_by('timestamp').first().timestamp,
+                         start + timedelta(seconds=alert_clock))
+
+    def test_command_rejects_a_bad_start(self):
+        with self.assertRaises(CommandError):
+            call_command('simulate_fleet', '--from-db', '--hours', '0.1', '--persist', '--start', 'yesterday')
+        with self.assertRaises(CommandError):
+            call_command('simulate_fleet', '--from-db', '--hours', '0.1', '--start', '2024-05-01T00:00')
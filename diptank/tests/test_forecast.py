@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from diptank.forecast import Forecast, LevelForecaster, LevelTrend, next_check_delay, predictive_pump_action
+from diptank.models import SensorReading, Tank
+
+
+class LevelTrendTests(SimpleTestCase):
+
+    def test_rate_is_the_least_squares_slope(self):
+        trend = LevelTrend(size=8)
+        for t in range(5):
+            trend.add(100.0 + t * 10, 500.0 - t * 20)
+        self.assertAlmostEqual(trend.rate(), -2.0)
+
+    def test_rate_after_the_ring_wraps(self):
+        trend = LevelTrend(size=4)
+        for t in range(10):
+            # Draining fast at first, then filling at 3 L/s: only the last four samples count
+            trend.add(float(t), 1000.0 - 50 * t if t < 6 else 700.0 + 3 * (t - 6))
+        self.assertAlmostEqual(trend.rate(), 3.0)
+        self.assertEqual(trend.samples(), [(6.0, 700.0), (7.0, 703.0), (8.0, 706.0), (9.0, 709.0)])
+        self.assertEqual(trend.last(), (9.0, 709.0))
+
+    def test_no_rate_without_enough_distinct_samples(self):
+        trend = LevelTrend()
+        trend.add(1.0, 500.0)
+        trend.add(2.0, 490.0)
+        self.assertIsNone(trend.rate())
+        same_time = LevelTrend()
+        for level in (500.0, 490.0, 480.0):
+            same_time.add(5.0, level)
+        self.assertIsNone(same_time.rate())
+
+    def test_clear_starts_over(self):
+        trend = LevelTrend()
+        for t in range(5):
+            trend.add(float(t), 100.0 * t)
+        trend.clear()
+        self.assertIsNone(trend.last())
+        self.assertIsNone(trend.rate())
+
+
+class NextCheckDelayTests(SimpleTestCase):
+
+    def test_no_forecast_waits_the_longest(self):
+        self.assertEqual(next_check_delay(None, max_interval=300.0), 300.0)
+
+    def test_steady_tank_waits_the_longest(self):
+        self.assertEqual(next_check_delay(Forecast(500.0, 0.0, None, None), max_interval=300.0), 300.0)
+
+    def test_check_comes_lead_time_before_running_low(self):
+        self.assertEqual(next_check_delay(Forecast(500.0, -1.0, 200.0, None), lead_time=120.0), 80.0)
+
+    def test_check_when_the_tank_fills(self):
+        self.assertEqual(next_check_delay(Forecast(500.0, 1.0, None, 45.0)), 45.0)
+
+    def test_delay_is_clamped(self):
+        self.assertEqual(next_check_delay(Forecast(500.0, -1.0, 30.0, None), lead_time=120.0, min_interval=1.0), 1.0)
+        self.assertEqual(next_check_delay(Forecast(500.0, 1.0, None, 10000.0), max_interval=300.0), 300.0)
+
+
+class ForecastTests(SimpleTestCase):
+
+    def test_forecast_extrapolates_to_the_thresholds(self):
+        forecaster = LevelForecaster()
+        for t in range(4):
+            forecaster.observe(1, 500.0 - t * 10, at=1000.0 + t)
+        forecast = forecaster.forecast(1, 1000.0, 20.0, 90.0, now=1003.0)
+        self.assertAlmostEqual(forecast.rate, -10.0)
+        self.assertAlmostEqual(forecast.level, 470.0)
+        self.assertAlmostEqual(forecast.seconds_to_min, 27.0)
+        self.assertIsNone(forecast.seconds_to_max)
+
+    def test_pump_starts_early_when_running_low_soon(self):
+        soon = Forecast(300.0, -1.0, 60.0, None)
+        self.assertTrue(predictive_pump_action(30.0, 20.0, 90.0, False, soon, lead_time=120.0))
+        self.assertIsNone(predictive_pump_action(30.0, 20.0, 90.0, False, Forecast(300.0, -1.0, 600.0, None)))
+        self.assertIsNone(predictive_pump_action(30.0, 20.0, 90.0, True, soon))
+
+    def test_forget_drops_the_trend(self):
+        forecaster = LevelForecaster()
+        for t in range(4):
+            forecaster.observe(1, 500.0, at=float(t))
+        forecaster.forget(1)
+        self.assertIsNone(forecaster.forecast(1, 1000.0, 20.0, 90.0))
+
+
+class LoadHistoryTests(TestCase):
+
+    def test_history_is_seeded_below_live_readings(self):
+        tank = Tank.objects.create(location='Farm A', capacity=1000, current_level=500)
+        SensorReading.objects.bulk_create(SensorReading(tank=tank, water_level=level) for level in (560, 540, 520))
+        now = timezone.now()
+        for i, pk in enumerate(SensorReading.objects.order_by('pk').values_list('pk', flat=True)):
+            SensorReading.objects.filter(pk=pk).update(timestamp=now - timedelta(seconds=30 - i * 10))
+
+        forecaster = LevelForecaster()
+        forecaster.observe(tank.tank_id, 500.0, at=now.timestamp())
+        self.assertFalse(forecaster.has_history(tank.tank_id))
+        forecaster.load_history([tank.tank_id])
+
+        self.assertTrue(forecaster.has_history(tank.tank_id))
+        forecast = forecaster.forecast(tank.tank_id, 1000.0, 20.0, 90.0, now=now.timestamp())
+        self.assertAlmostEqual(forecast.rate, -2.0)
+        self.assertAlmostEqual(forecast.level, 500.0)
@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import RequestFactory, TestCase
+
+from diptank.metrics import MetricsRegistry, metrics_view
+
+
+class MetricsViewTests(TestCase):
+
+    def get(self, user, remote_addr='10.0.0.5'):
+        request = RequestFactory().get('/metrics/', REMOTE_ADDR=remote_addr)
+        request.user = user
+        return metrics_view(request)
+
+    def test_anonymous_and_regular_users_are_refused(self):
+        self.assertEqual(self.get(AnonymousUser()).status_code, 403)
+        self.assertEqual(self.get(User.objects.create_user('farmer')).status_code, 403)
+
+    def test_staff_may_read_metrics(self):
+        response = self.get(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_inactive_staff_is_refused(self):
+        self.assertEqual(self.get(User.objects.create_user('former', is_staff=True, is_active=False)).status_code, 403)
+
+    def test_allowed_scraper_needs_no_login(self):
+        with mock.patch('diptank.metrics.METRICS_ALLOWED_IPS', frozenset({'10.0.0.5'})):
+            self.assertEqual(self.get(AnonymousUser()).status_code, 200)
+            self.assertEqual(self.get(AnonymousUser(), remote_addr='10.0.0.6').status_code, 403)
+
+
+class MetricsRegistryTests(TestCase):
+
+    def test_observations_are_rendered(self):
+        registry = MetricsRegistry()
+        registry.observe('tank_page', 0.003, queries=2)
+        registry.observe('tank_page', 0.2, queries=4, failed=True)
+        registry.increment('level_update_conflicts')
+        lines = registry.render_prometheus().splitlines()
+        self.assertIn('diptank_operation_seconds_bucket{operation="tank_page",le="0.005"} 1', lines)
+        self.assertIn('diptank_operation_seconds_count{operation="tank_page"} 2', lines)
+        self.assertIn('diptank_operation_errors_total{operation="tank_page"} 1', lines)
+        self.assertIn('diptank_operation_queries_total{operation="tank_page"} 6', lines)
+        self.assertIn('diptank_operation_max_queries{operation="tank_page"} 4', lines)
+        self.assertIn('diptank_events_total{event="level_update_conflicts"} 1', lines)
@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from diptank.listing_views import reading_page_view, tank_page_view
+from diptank.models import SensorReading, Tank, UserProfile
+from diptank.pagination import decode_cursor, encode_cursor, reading_page, tank_page
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+class CursorTests(TestCase):
+
+    def test_tank_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(('Farm A', 42))), ('Farm A', 42))
+
+    def test_reading_cursor_round_trip(self):
+        timestamp = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor((timestamp, 7)), kind='reading'), (timestamp, 7))
+
+    def test_empty_cursor_is_none(self):
+        self.assertIsNone(encode_cursor(None))
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(''))
+
+    def test_malformed_cursors_are_rejected(self):
+        for value in ('not base64!', raw_cursor({'a': 1}), raw_cursor(['Farm A']), raw_cursor(['Farm A', 1, 2]),
+                      raw_cursor([1, 2]), raw_cursor(['Farm A', '3']), raw_cursor(['Farm A', True]),
+                      raw_cursor(['Farm A', 1.5]), base64.urlsafe_b64encode(b'\xff\xfe').decode()):
+            with self.assertRaises(ValueError, msg=value):
+                decode_cursor(value)
+
+    def test_reading_cursor_needs_a_timestamp(self):
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor(('Farm A', 1)), kind='reading')
+
+
+class PageTests(TestCase):
+
+    def test_tank_pages_cover_every_tank_once(self):
+        for location in ('Farm B', 'Farm A', 'Farm C'):
+            for _ in range(3):
+                Tank.objects.create(location=location, capacity=1000, current_level=500)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = tank_page(after=decode_cursor(encode_cursor(cursor)), page_size=2)
+            seen.extend(rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(Tank.objects.order_by('location', 'tank_id').values_list('tank_id', 'location')))
+
+    def test_reading_pages_break_timestamp_ties_by_id(self):
+        tank = Tank.objects.create(location='Farm A', capacity=1000, current_level=500)
+        SensorReading.objects.bulk_create(SensorReading(tank=tank, water_level=level) for level in range(5))
+        # Two readings share each timestamp
+        now = timezone.now()
+        for i, reading in enumerate(SensorReading.objects.order_by('pk')):
+            SensorReading.objects.filter(pk=reading.pk).update(timestamp=now - timedelta(minutes=i // 2))
+        levels, cursor = [], None
+        while True:
+            rows, cursor = reading_page(tank.pk, before=decode_cursor(encode_cursor(cursor), kind='reading'),
+                                        page_size=2)
+            levels.extend(level for level, timestamp in rows)
+            if cursor is None:
+                break
+        self.assertEqual(levels, [1, 0, 3, 2, 4])
+
+
+class PageViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('officer', password='secret')
+        UserProfile.objects.create(user=self.user, name='Officer', email='officer@example.com', user_type='officer')
+        self.tank = Tank.objects.create(location='Farm A', capacity=1000, current_level=500)
+
+    def get(self, view, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return view(request)
+
+    def test_bad_cursor_is_a_400(self):
+        self.assertEqual(self.get(tank_page_view, after='garbage').status_code, 400)
+        self.assertEqual(self.get(reading_page_view, tank=self.tank.pk, before='garbage').status_code, 400)
+        self.assertEqual(self.get(reading_page_view, tank=self.tank.pk,
+                                  before=encode_cursor(('Farm A', 1))).status_code, 400)
+
+    def test_good_cursor_is_accepted(self):
+        response = self.get(tank_page_view, after=encode_cursor(('Farm A', 0)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([tank['tank_id'] for tank in json.loads(response.content)['results']], [self.tank.pk])
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from diptank.models import SensorReading, SensorReadingRollup, Tank
+from diptank.rollups import rebuild_rollups, record_readings
+
+START = datetime(2024, 5, 1, 10, 15, tzinfo=dt_timezone.utc)
+
+
+class RecordReadingsTests(TestCase):
+
+    def setUp(self):
+        self.tank = Tank.objects.create(location='Farm A', capacity=1000, current_level=500)
+
+    def reading(self, level, seconds):
+        return SensorReading(tank=self.tank, water_level=level, timestamp=START + timedelta(seconds=seconds))
+
+    def rollup(self, period):
+        return SensorReadingRollup.objects.get(tank=self.tank, period=period)
+
+    def test_new_buckets_are_created(self):
+        record_readings([self.reading(400, 0), self.reading(600, 10), self.reading(500, 20)])
+        minute = self.rollup('minute')
+        self.assertEqual((minute.min_level, minute.max_level, minute.reading_count), (400, 600, 3))
+        self.assertEqual(minute.mean_level, 500)
+        self.assertEqual((minute.last_level, minute.last_timestamp), (500, START + timedelta(seconds=20)))
+        self.assertEqual(SensorReadingRollup.objects.count(), 3)
+
+    def test_existing_buckets_are_incremented(self):
+        record_readings([self.reading(400, 10)])
+        # An older reading arriving late must not replace the last level
+        record_readings([self.reading(700, 20), self.reading(100, 0)])
+        for period in ('minute', 'hour', 'day'):
+            rollup = self.rollup(period)
+            self.assertEqual((rollup.min_level, rollup.max_level, rollup.sum_level, rollup.reading_count),
+                             (100, 700, 1200, 3))
+            self.assertEqual(rollup.last_level, 700)
+
+    def test_bucket_created_by_another_writer_is_updated(self):
+        real_bulk_create = SensorReadingRollup.objects.bulk_create
+        calls = []
+
+        def racing_atomic(*args, **kwargs):
+            if not calls:
+                # Another writer commits the minute bucket between our lookup and our insert
+                SensorReadingRollup.objects.create(
+                    tank=self.tank, period='minute', bucket_start=START.replace(second=0), min_level=300,
+                    max_level=300, sum_level=300, reading_count=1, last_level=300,
+                    last_timestamp=START + timedelta(seconds=30))
+            return transaction.atomic(*args, **kwargs)
+
+        def counting_bulk_create(objs, **kwargs):
+            calls.append(len(objs))
+            return real_bulk_create(objs, **kwargs)
+
+        with mock.patch('diptank.rollups.transaction', mock.Mock(atomic=racing_atomic)), \
+                mock.patch.object(SensorReadingRollup.objects, 'bulk_create', side_effect=counting_bulk_create):
+            record_readings([self.reading(400, 0), self.reading(600, 10)])
+
+        # The first insert failed as a whole; the retry updates the minute and inserts hour and day
+        self.assertEqual(calls, [3, 2])
+        minute = self.rollup('minute')
+        self.assertEqual((minute.min_level, minute.max_level, minute.sum_level, minute.reading_count),
+                         (300, 600, 1300, 3))
+        self.assertEqual(minute.last_level, 300)
+        self.assertEqual(self.rollup('hour').reading_count, 2)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        SensorReading.objects.bulk_create(
+            SensorReading(tank=self.tank, water_level=level) for level in (100, 200, 300, 400))
+        for i, pk in enumerate(SensorReading.objects.order_by('pk').values_list('pk', flat=True)):
+            SensorReading.objects.filter(pk=pk).update(timestamp=START + timedelta(minutes=i * 30))
+
+        self.assertEqual(rebuild_rollups(), 4)
+        minutes = SensorReadingRollup.objects.filter(tank=self.tank, period='minute')
+        self.assertEqual(minutes.count(), 4)
+        # 10:15 is partway through the 10:00 hour, so only the 11:00 hour is rebuilt from raw readings
+        hours = SensorReadingRollup.objects.filter(tank=self.tank, period='hour')
+        self.assertEqual(list(hours.values_list('bucket_start', 'reading_count')),
+                         [(START.replace(hour=11, minute=0), 2)])
@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from diptank.models import Tank
+from diptank.summary import get_summary, invalidate_summary
+from diptank.write_buffer import ReadingWriteBuffer
+
+
+class SummaryCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tank = Tank.objects.create(location='Farm A', capacity=1000.0, current_level=500.0)
+        Tank.objects.create(location='Farm B', capacity=1000.0, current_level=250.0)
+
+    def test_summary_is_served_from_the_cache(self):
+        self.assertEqual(get_summary()['total_current_level'], 750.0)
+        Tank.objects.filter(pk=self.tank.pk).update(current_level=0.0)  # Bypasses every invalidation
+        self.assertEqual(get_summary()['total_current_level'], 750.0)
+        invalidate_summary()
+        self.assertEqual(get_summary()['total_current_level'], 250.0)
+
+    def test_location_summary(self):
+        summary = get_summary('Farm B')
+        self.assertEqual(list(summary['locations']), ['Farm B'])
+        self.assertEqual((summary['total_current_level'], summary['total_capacity']), (250.0, 1000.0))
+
+    def test_flush_invalidates_the_summary(self):
+        get_summary()
+        write_buffer = ReadingWriteBuffer()
+        write_buffer.add(self.tank.pk, 600.0, delta=100.0)
+        # Another process's write, committed between the pump step and the flush, is not lost
+        Tank.objects.filter(pk=self.tank.pk).update(current_level=550.0)
+        write_buffer.flush()
+        self.assertEqual(get_summary()['total_current_level'], 900.0)
+        self.assertEqual(get_summary('Farm A')['total_current_level'], 650.0)
@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from diptank.models import SensorReading, SensorReadingRollup, Tank
+from diptank.write_buffer import WRITE_BUFFER_MAX_ATTEMPTS, ReadingWriteBuffer
+
+
+class ReadingWriteBufferTests(TransactionTestCase):
+    # Real commits: SQLite only checks foreign keys when the transaction commits
+
+    def setUp(self):
+        self.tanks = [Tank.objects.create(location='Farm A', capacity=1000.0, current_level=500.0) for _ in range(2)]
+        self.flushed = []
+        self.buffer = ReadingWriteBuffer(max_pending=1000, on_flush=self.flushed.append)
+
+    def test_flush_writes_levels_readings_and_rollups(self):
+        self.buffer.add(self.tanks[0].tank_id, 550.0, delta=50.0)
+        self.buffer.add(self.tanks[0].tank_id, 600.0, delta=50.0)
+        self.buffer.add(self.tanks[1].tank_id, 100.0)
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        levels = dict(Tank.objects.values_list('tank_id', 'current_level'))
+        self.assertEqual(levels, {self.tanks[0].tank_id: 600.0, self.tanks[1].tank_id: 100.0})
+        self.assertEqual(SensorReading.objects.count(), 3)
+        self.assertEqual(SensorReadingRollup.objects.filter(period='minute').count(), 2)
+        self.assertEqual(self.flushed, [{self.tanks[0].tank_id: 600.0, self.tanks[1].tank_id: 100.0}])
+
+    def test_relative_changes_do_not_overwrite_other_writers(self):
+        self.buffer.add(self.tanks[0].tank_id, 550.0, delta=50.0)
+        Tank.objects.filter(pk=self.tanks[0].tank_id).update(current_level=200.0)
+        self.buffer.flush()
+        self.assertEqual(Tank.objects.get(pk=self.tanks[0].tank_id).current_level, 250.0)
+        # Listeners get the stored level, not the one the pump computed from a stale 500
+        self.assertEqual(self.flushed, [{self.tanks[0].tank_id: 250.0}])
+
+    def test_published_levels_are_clamped_to_capacity(self):
+        self.buffer.add(self.tanks[0].tank_id, 550.0, delta=50.0)
+        self.buffer.add(self.tanks[1].tank_id, 450.0, delta=-50.0)
+        Tank.objects.filter(pk=self.tanks[0].tank_id).update(current_level=990.0)
+        Tank.objects.filter(pk=self.tanks[1].tank_id).update(current_level=10.0)
+        self.buffer.flush()
+        self.assertEqual(self.flushed, [{self.tanks[0].tank_id: 1000.0, self.tanks[1].tank_id: 0.0}])
+
+    def test_readings_of_a_deleted_tank_are_dropped_and_later_flushes_commit(self):
+        deleted, kept = self.tanks
+        self.buffer.add(deleted.tank_id, 550.0, delta=50.0)
+        self.buffer.add(kept.tank_id, 550.0, delta=50.0)
+        deleted.delete()
+
+        with mock.patch('builtins.print'):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(list(SensorReading.objects.values_list('tank_id', flat=True)), [kept.tank_id])
+
+        self.buffer.add(kept.tank_id, 600.0, delta=50.0)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(SensorReading.objects.count(), 2)
+        self.assertEqual(Tank.objects.get(pk=kept.tank_id).current_level, 600.0)
+
+    def test_failing_tank_is_retried_then_dropped(self):
+        bad, good = self.tanks
+        real_write = ReadingWriteBuffer._write
+
+        def write(buffer, levels, deltas, absolute, readings):
+            if any(reading.tank_id == bad.tank_id for reading in readings):
+                raise RuntimeError("bad row")
+            return real_write(buffer, levels, deltas, absolute, readings)
+
+        with mock.patch.object(ReadingWriteBuffer, '_write', write), mock.patch('builtins.print'):
+            self.buffer.add(bad.tank_id, 600.0)
+            self.buffer.add(good.tank_id, 600.0)
+            for attempt in range(1, WRITE_BUFFER_MAX_ATTEMPTS):
+                with self.assertRaises(RuntimeError):
+                    self.buffer.flush()
+                self.assertEqual(self.buffer.pending_count(), 1)  # Only the failing tank's reading is kept
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(list(SensorReading.objects.values_list('tank_id', flat=True)), [good.tank_id])
+
+    def test_batch_is_kept_while_the_database_is_unavailable(self):
+        self.buffer.add(self.tanks[0].tank_id, 600.0)
+        with mock.patch.object(ReadingWriteBuffer, '_write', side_effect=RuntimeError("down")), \
+                mock.patch.object(Tank.objects, 'filter', side_effect=RuntimeError("down")):
+            for _ in range(WRITE_BUFFER_MAX_ATTEMPTS + 1):
+                with self.assertRaises(RuntimeError):
+                    self.buffer.flush()
+        self.assertEqual(self.buffer.pending_count(), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_readings_are_stamped_when_added(self):
+        self.buffer.add(self.tanks[0].tank_id, 550.0, delta=50.0)
+        flushed_at = timezone.now()
+        self.buffer.flush()
+        self.assertLess(SensorReading.objects.get().timestamp, flushed_at)
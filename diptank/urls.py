@@ -1,14 +1,29 @@
 
 from django.urls import path
 from . import views
+from . import live_views
+from . import bulk_views
+from . import listing_views
+from . import summary_views
+from .metrics import instrument_view, metrics_view
 
+# Every view is wrapped so its query count, DB time and wall time show up in metrics/
 urlpatterns = [
-    path('', views.home_view, name='home'),
-    path('register/', views.register_view, name='register'),
-    path('about/', views.about_view, name='about'),
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'), # Added logout URL
-    path('error/', views.error_page_view, name='error_page'),
-    path('dashboard/farmer/', views.dashboard_farmer_view, name='dashboard_farmer'),
-    path('dashboard/officer/', views.dashboard_officer_view, name='dashboard_officer'),
+    path('', instrument_view(views.home_view), name='home'),
+    path('register/', instrument_view(views.register_view), name='register'),
+    path('about/', instrument_view(views.about_view), name='about'),
+    path('login/', instrument_view(views.login_view), name='login'),
+    path('logout/', instrument_view(views.logout_view), name='logout'), # Added logout URL
+    path('error/', instrument_view(views.error_page_view), name='error_page'),
+    path('dashboard/farmer/', instrument_view(views.dashboard_farmer_view), name='dashboard_farmer'),
+    path('dashboard/officer/', instrument_view(views.dashboard_officer_view), name='dashboard_officer'),
+    path('live/stream/', instrument_view(live_views.live_stream_view), name='live_stream'),
+    path('live/poll/', instrument_view(live_views.live_poll_view), name='live_poll'),
+    path('tanks/import/', instrument_view(bulk_views.tank_import_view), name='tank_import'),
+    path('tanks/export/', instrument_view(bulk_views.tank_export_view), name='tank_export'),
+    path('readings/export/', instrument_view(bulk_views.reading_export_view), name='reading_export'),
+    path('tanks/page/', instrument_view(listing_views.tank_page_view), name='tank_page'),
+    path('readings/page/', instrument_view(listing_views.reading_page_view), name='reading_page'),
+    path('summary/', instrument_view(summary_views.summary_view), name='summary'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,219 @@
+# diptank/write_buffer.py
+# Buffered writer for pump-generated tank levels and sensor readings.
+# Instead of one transaction per tank per pump step, levels and readings are
+# collected in memory and written with bulk_update/bulk_create. Levels queued
+# as relative changes (pump steps) are written as clamped F() increments
+# instead, so they never overwrite a level another writer stored meanwhile.
+# Each flush also folds the new readings into their minute/hour/day rollups
+# and, once committed, drops the cached fleet summary (see summary.py).
+#
+# A batch that fails is written again tank by tank, so one bad row (e.g. a
+# reading of a tank deleted while its pump ran) cannot block the rest: rows of
+# tanks that no longer exist are dropped, and a tank whose rows fail
+# WRITE_BUFFER_MAX_ATTEMPTS flushes in a row is dropped too. Both are logged.
+
+import threading
+import time
+from collections import defaultdict
+
+from django.db import transaction
+
+from .level_updates import add_to_levels
+from .metrics import instrumented
+from .models import Tank, SensorReading
+from .rollups import record_readings
+from .summary import invalidate_summary
+
+# Flush once this many readings are pending...
+WRITE_BUFFER_MAX_PENDING = 500
+# ...or once the oldest pending reading is this old (in seconds)
+WRITE_BUFFER_MAX_AGE = 2.0
+# Rows per INSERT/UPDATE statement when flushing
+WRITE_BUFFER_BATCH_SIZE = 500
+# Failed flushes a tank's pending rows are kept for before they are dropped
+WRITE_BUFFER_MAX_ATTEMPTS = 3
+
+
+class ReadingWriteBuffer:
+    """
+    Collects tank level updates and SensorReading rows and flushes them in bulk.
+
+    add() never touches the database unless the size bound is reached; callers
+    drive the time bound with flush_if_due() and must call flush() when they
+    stop producing readings. All methods are thread-safe, and flushes are
+    serialized so an older batch can never overwrite a newer level.
+
+    A level added with `delta` (the change from the tank's previous level) is
+    written as that change, summed over the batch; a level added without one
+    is written as is and wins over any changes queued for the tank in the
+    same batch.
+
+    `on_flush`, if given, is called with {tank_id: level} after each
+    successful flush, with the levels the database now holds (the monitor
+    publishes these as live dashboard updates).
+
+    SensorReading timestamps are taken when a reading is added, not when its
+    batch is written, so they do not lag by up to `max_age` seconds.
+    """
+
+    def __init__(self, max_pending=WRITE_BUFFER_MAX_PENDING, max_age=WRITE_BUFFER_MAX_AGE,
+                 batch_size=WRITE_BUFFER_BATCH_SIZE, on_flush=None):
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self._levels = {}    # tank_id -> latest level (one UPDATE row per tank per flush)
+        self._deltas = {}    # tank_id -> summed change, for tanks only changed relatively this batch
+        self._absolute = set()  # tanks whose latest level is written as is
+        self._readings = []  # unsaved SensorReading instances, in arrival order
+        self._oldest = None  # time.monotonic() of the oldest pending reading
+        self._failures = {}  # tank_id -> flushes in a row its rows failed in
+        self.dropped = 0     # Readings given up on (see WRITE_BUFFER_MAX_ATTEMPTS)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, tank_id, level, delta=None):
+        """Queues a new level for a tank (as a change of `delta` liters, if given) and the matching SensorReading."""
+        with self._lock:
+            self._levels[tank_id] = level
+            if delta is None or tank_id in self._absolute:
+                self._absolute.add(tank_id)
+                self._deltas.pop(tank_id, None)
+            else:
+                self._deltas[tank_id] = self._deltas.get(tank_id, 0.0) + delta
+            self._readings.append(SensorReading(tank_id=tank_id, water_level=level))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._readings) >= self.max_pending
+        if full:
+            self.flush()
+
+    def pending_count(self):
+        """Returns the number of readings waiting to be written."""
+        with self._lock:
+            return len(self._readings)
+
+    def flush_if_due(self):
+        """Flushes if the oldest pending reading has reached the time bound."""
+        with self._lock:
+            due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_age
+        if due:
+            self.flush()
+
+    @instrumented('write_buffer.flush')
+    def flush(self):
+        """
+        Writes all pending levels and readings in one transaction. Returns the number of readings written.
+
+        If that fails, the batch is written tank by tank (see the module comment). Rows that may still
+        succeed are queued again, in front of anything queued meanwhile, and the error is re-raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                levels, deltas, absolute, readings = self._levels, self._deltas, self._absolute, self._readings
+                self._levels, self._deltas, self._absolute, self._readings, self._oldest = {}, {}, set(), [], None
+            if not readings:
+                return 0
+
+            try:
+                levels = self._write(levels, deltas, absolute, readings)
+            except Exception as e:
+                levels, written = self._write_by_tank(levels, deltas, absolute, readings, e)
+            else:
+                written = len(readings)
+                if self._failures:
+                    with self._lock:
+                        for tank_id in levels:
+                            self._failures.pop(tank_id, None)
+            if levels:
+                invalidate_summary()
+            if self.on_flush and levels:
+                self.on_flush(levels)
+            return written
+
+    def _write(self, levels, deltas, absolute, readings):
+        """Writes one batch in a transaction. Returns the {tank_id: level} now stored for its tanks."""
+        for reading in readings:
+            reading.pk = None  # Discard ids assigned by an earlier, rolled-back insert
+        with transaction.atomic():
+            Tank.objects.bulk_update(
+                [Tank(pk=tank_id, current_level=levels[tank_id]) for tank_id in absolute],
+                ['current_level'], batch_size=self.batch_size)
+            add_to_levels(deltas)
+            # The database clamps each change to [0, capacity] and other writers may have moved the level
+            # meanwhile, so what the changed tanks now hold is read back rather than taken from `levels`
+            stored = dict(Tank.objects.filter(pk__in=list(deltas)).values_list('pk', 'current_level')) \
+                if deltas else {}
+            SensorReading.objects.bulk_create(readings, batch_size=self.batch_size)
+            record_readings(readings)
+        stored.update((tank_id, levels[tank_id]) for tank_id in absolute)
+        return stored
+
+    def _write_by_tank(self, levels, deltas, absolute, readings, error):
+        """
+        Retries a failed batch one tank per transaction. Returns ({tank_id: level} written, readings
+        written), or queues the rows to retry and re-raises `error`.
+        """
+        by_tank = defaultdict(list)
+        for reading in readings:
+            by_tank[reading.tank_id].append(reading)
+        try:
+            existing = set(Tank.objects.filter(pk__in=list(by_tank)).values_list('pk', flat=True))
+        except Exception:
+            # The database itself is failing (e.g. unreachable), not a row: keep everything for the next flush
+            self._requeue(levels, deltas, absolute, readings)
+            raise error
+
+        written_levels, written, retry = {}, 0, []
+        for tank_id, tank_readings in by_tank.items():
+            if tank_id not in existing:
+                self._drop(tank_id, tank_readings, "the tank no longer exists")
+                continue
+            tank_absolute = {tank_id} & absolute
+            tank_deltas = {} if tank_absolute else {tank_id: deltas.get(tank_id, 0.0)}
+            try:
+                stored = self._write(levels, tank_deltas, tank_absolute, tank_readings)
+            except Exception as e:
+                with self._lock:
+                    failures = self._failures[tank_id] = self._failures.get(tank_id, 0) + 1
+                if failures >= WRITE_BUFFER_MAX_ATTEMPTS:
+                    self._drop(tank_id, tank_readings, f"{failures} flushes failed, the last with: {e}")
+                else:
+                    retry.append(tank_id)
+                continue
+            with self._lock:
+                self._failures.pop(tank_id, None)
+            written_levels.update(stored)
+            written += len(tank_readings)
+
+        if retry:
+            self._requeue({tank_id: levels[tank_id] for tank_id in retry},
+                          {tank_id: deltas[tank_id] for tank_id in retry if tank_id in deltas},
+                          absolute.intersection(retry),
+                          [reading for tank_id in retry for reading in by_tank[tank_id]])
+            if written_levels:
+                invalidate_summary()
+            if self.on_flush and written_levels:
+                self.on_flush(written_levels)
+            raise error
+        return written_levels, written
+
+    def _drop(self, tank_id, readings, reason):
+        with self._lock:
+            self._failures.pop(tank_id, None)
+            self.dropped += len(readings)
+        print(f"Dropped {len(readings)} buffered readings of Tank {tank_id}: {reason}.")
+
+    def _requeue(self, levels, deltas, absolute, readings):
+        """Puts rows back in front of anything queued meanwhile, so they are retried by the next flush."""
+        with self._lock:
+            for tank_id, delta in self._deltas.items():
+                if tank_id not in absolute:
+                    deltas[tank_id] = deltas.get(tank_id, 0.0) + delta
+            for tank_id in self._absolute:
+                absolute.add(tank_id)
+                deltas.pop(tank_id, None)
+            levels.update(self._levels)
+            self._levels, self._deltas, self._absolute = levels, deltas, absolute
+            self._readings = readings + self._readings
+            self._oldest = time.monotonic()
@@ -5,12 +5,15 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
+import argparse
+import collections
 import os
-import django
-import threading
 import time
-import random
-from collections import defaultdict
+
+# Startup phases are timed from here (see StartupTimer)
+PROCESS_STARTED_AT = time.perf_counter()
+
+import django
 
 # --- Django Setup (CRITICAL for accessing Django models) ---
 # Configure Django settings. This must be done before importing any Django models.
@@ -19,25 +22,203 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
 # Import Django models after setup
-from diptank.models import Tank, SensorReading, Alert
+from diptank.models import Tank, SensorReading
+from diptank import loadgen, replay
+from diptank.alerts import alert_engine
+from diptank.db_lifecycle import MONITOR_CONN_MAX_AGE, WorkerPool, close_connections, configure_persistent_connections
+from diptank.forecast import PUMP_CHECK_MAX_INTERVAL, LevelForecaster, next_check_delay, predictive_pump_action
+from diptank.level_updates import LevelUpdateConflict, update_level
+from diptank.live import publish_alerts, publish_levels
+from diptank.metrics import instrumented, metrics, serve_metrics
+from diptank.pagination import tank_page
+from diptank.pumps import PumpScheduler, PUMP_UPDATE_INTERVAL, PUMP_FLOW_RATE
+from diptank.rollups import record_readings
+from diptank.summary import get_summary, invalidate_summary
+from diptank.tank_cache import tank_cache
+from diptank.simulation import level_percentage, simulated_sensor_level
+from diptank.classification import STATUS_ALERT_TYPES, STATUS_COLORS, tank_status
 from django.db import transaction, OperationalError
 
-# --- Global Variables ---
-# Interval for pump simulation updates (in seconds)
-PUMP_UPDATE_INTERVAL = 1.0
-# Amount of water added/removed per pump update (in Liters)
-PUMP_FLOW_RATE = 50.0
-# Flag to control the pump simulation thread
-pump_running = False
-pump_thread = None
-selected_tank_id = None  # To store the currently selected tank's ID
+DJANGO_READY_AT = time.perf_counter()
+
+# Tanks loaded per page into the tank selector
+TANK_PICKER_PAGE_SIZE = 50
+# Milliseconds to wait after the last keystroke before searching tanks
+TANK_SEARCH_DELAY_MS = 300
+# Last dropdown entry while more tanks match the search
+MORE_TANKS_LABEL = "More tanks..."
+# Minimum milliseconds between two display repaints; refresh requests in between are merged
+REFRESH_FRAME_BUDGET_MS = 200
+# Display sections a refresh can repaint
+REFRESH_SELECTED = 'selected'
+REFRESH_OVERALL = 'overall'
+REFRESH_LOCATIONS = 'locations'
+ALL_REFRESH_SECTIONS = frozenset((REFRESH_SELECTED, REFRESH_OVERALL, REFRESH_LOCATIONS))
+# Per-location summary frames built per main loop slice, so many locations never freeze the window
+LOCATION_WIDGETS_PER_SLICE = 25
+# Startup milestones, in the order they are reached
+STARTUP_MILESTONES = ('django_ready', 'window_built', 'first_paint', 'tanks_listed', 'interactive', 'summaries_loaded')
+
+
+class DatabaseWorker:
+    """
+    Runs Django ORM work off the Tk main thread.
+
+    Jobs run on a WorkerPool of long-lived threads that keep their database
+    connection between jobs. With the default single worker they run one at a
+    time, in submission order, which the monitor relies on (a reading is
+    written before the refresh that shows it). Their results (or exceptions)
+    are handed back to the main thread through master.after, so callbacks are
+    free to touch widgets.
+    """
+
+    def __init__(self, master, workers=1):
+        self.master = master
+        self.pool = WorkerPool(size=workers, name='diptank-db')
+
+    def submit(self, func, on_success=None, on_error=None):
+        """Queues func() on the worker; on_success(result) / on_error(exc) run on the main thread."""
+        def run():
+            try:
+                result = func()
+            except Exception as e:
+                if on_error:
+                    self.master.after(0, lambda error=e: on_error(error))
+                else:
+                    print(f"An unexpected error occurred in a background database job: {e}")
+                return
+            if on_success:
+                self.master.after(0, lambda: on_success(result))
+
+        self.pool.submit(run)
+
+    def shutdown(self, timeout=2.0):
+        """
+        Stops the worker, dropping any jobs that have not started yet, and waits
+        up to `timeout` seconds for the running one so its connection is closed.
+        """
+        self.pool.shutdown(wait=True, timeout=timeout)
+
+
+class RefreshScheduler:
+    """
+    Coalesces display refresh requests into at most one repaint per frame budget.
+
+    request() only marks display sections dirty. The first request after a
+    repaint schedules the next one no sooner than `frame_budget_ms` after the
+    previous; everything requested until then is merged into it. Only one
+    fetch is ever in flight: requests made while it runs are carried into the
+    following repaint. fetch(sections) runs on the database worker and
+    apply(data, sections) on the main thread.
+    """
+
+    def __init__(self, master, db_worker, fetch, apply, frame_budget_ms=REFRESH_FRAME_BUDGET_MS, rate_window=5.0):
+        self.master = master
+        self.db_worker = db_worker
+        self.fetch = fetch
+        self.apply = apply
+        self.frame_budget = frame_budget_ms / 1000.0
+        self.rate_window = rate_window
+        self.dirty = set()
+        self.requests = 0     # request() calls since startup
+        self.repaints = 0     # repaints since startup
+        self._repaint_times = collections.deque()  # time.monotonic() of the repaints in the last rate_window
+        self._last_repaint = 0.0
+        self._timer = None
+        self._in_flight = False
+
+    def request(self, *sections):
+        """Marks sections (all of them by default) dirty and makes sure a repaint is scheduled."""
+        self.dirty.update(sections or ALL_REFRESH_SECTIONS)
+        self.requests += 1
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None or self._in_flight or not self.dirty:
+            return
+        delay = max(0.0, self._last_repaint + self.frame_budget - time.monotonic())
+        self._timer = self.master.after(int(delay * 1000), self._start)
+
+    def _start(self):
+        """Hands the merged dirty sections to the database worker."""
+        self._timer = None
+        sections = frozenset(self.dirty)
+        self.dirty.clear()
+        self._in_flight = True
+        self.db_worker.submit(lambda: self.fetch(sections), lambda data: self._finish(data, sections),
+                              lambda e: self._finish(None, sections, e))
+
+    def _finish(self, data, sections, error=None):
+        self._in_flight = False
+        now = time.monotonic()
+        self._last_repaint = now
+        self.repaints += 1
+        self._repaint_times.append(now)
+        while self._repaint_times and now - self._repaint_times[0] > self.rate_window:
+            self._repaint_times.popleft()
+        if error is None:
+            self.apply(data, sections)
+        else:
+            print(f"An unexpected error occurred while refreshing the displays: {error}")
+        self._schedule()
+
+    def achieved_rate(self):
+        """Returns the repaints per second over the last `rate_window` seconds."""
+        now = time.monotonic()
+        recent = [t for t in self._repaint_times if now - t <= self.rate_window]
+        return len(recent) / self.rate_window
+
+    def cancel(self):
+        """Drops a scheduled repaint (on shutdown)."""
+        if self._timer is not None:
+            self.master.after_cancel(self._timer)
+            self._timer = None
+        self.dirty.clear()
+
+
+class StartupTimer:
+    """
+    Records when the monitor reaches each startup milestone, in seconds since
+    the process started. Once every milestone is reached, they are printed
+    and recorded as 'monitor.startup.<milestone>' operations in the metrics.
+    """
+
+    def __init__(self, started_at=PROCESS_STARTED_AT, milestones=STARTUP_MILESTONES):
+        self.started_at = started_at
+        self.milestones = milestones
+        self.times = {}
+
+    def mark(self, milestone, at=None):
+        """Records a milestone the first time it is reached."""
+        if milestone in self.times:
+            return
+        self.times[milestone] = (at or time.perf_counter()) - self.started_at
+        if len(self.times) == len(self.milestones):
+            self.report()
+
+    def reached(self, milestone):
+        return milestone in self.times
+
+    def report(self):
+        for milestone in self.milestones:
+            metrics.observe(f"monitor.startup.{milestone}", self.times[milestone])
+        print("Startup: " + ", ".join(
+            f"{milestone.replace('_', ' ')} {self.times[milestone]:.2f}s" for milestone in self.milestones))
 
 
 class DiptankMonitorApp:
-    def __init__(self, master):
+    def __init__(self, master, refresh_budget_ms=REFRESH_FRAME_BUDGET_MS, recorder=None):
         self.master = master
+        # Captures sensor readings and pumped levels for later replay (--record), if given
+        self.recorder = recorder
         master.title("Diptank Sensor & Pump Monitor")
 
+        # Staged startup: the window is built without touching the database, the
+        # tank list and the selected tank load first, and the fleet and per-location
+        # summaries only once the selected tank is on screen.
+        self.startup = StartupTimer()
+        self.startup.mark('django_ready', DJANGO_READY_AT)
+
         # Set the window to fullscreen
         master.attributes('-fullscreen', True)
 
@@ -75,9 +256,11 @@ class DiptankMonitorApp:
 
         # --- Tank Selection ---
         ttk.Label(self.main_frame, text="Select Tank:", font=('Inter', 12, 'bold')).pack(pady=(10, 5))
-        self.tank_selector = ttk.Combobox(self.main_frame, state="readonly", width=40)
+        # Editable so that typing searches by tank ID or location; tanks are loaded a page at a time
+        self.tank_selector = ttk.Combobox(self.main_frame, width=40)
         self.tank_selector.pack(pady=5)
         self.tank_selector.bind("<<ComboboxSelected>>", self.on_tank_selected)
+        self.tank_selector.bind("<KeyRelease>", self._on_tank_search_typed)
 
         # --- Selected Tank Information Display ---
         self.info_frame = ttk.LabelFrame(self.main_frame, text="Selected Tank Information", padding="15",
@@ -118,6 +301,20 @@ class DiptankMonitorApp:
         self.pump_status_label = ttk.Label(self.controls_frame, text="Pump: OFF", font=('Inter', 11, 'bold'),
                                            foreground='red')
         self.pump_status_label.pack(pady=(10, 5))
+        self.active_pumps_label = ttk.Label(self.controls_frame, text="Active pumps: 0")
+        self.active_pumps_label.pack(pady=(0, 5))
+        self.refresh_rate_label = ttk.Label(self.controls_frame, text="Display refresh: 0.0/s", foreground='gray')
+        self.refresh_rate_label.pack(pady=(0, 5))
+
+        # Flow rate used when the selected tank's pump is turned on (or changed while it runs)
+        self.flow_rate_frame = ttk.Frame(self.controls_frame, style='TFrame')
+        self.flow_rate_frame.pack(pady=5)
+        ttk.Label(self.flow_rate_frame, text="Flow Rate (L per update):").pack(side=tk.LEFT, padx=(0, 5))
+        self.flow_rate_var = tk.DoubleVar(value=PUMP_FLOW_RATE)
+        self.flow_rate_spinbox = ttk.Spinbox(self.flow_rate_frame, from_=1, to=10000, increment=10, width=8,
+                                             textvariable=self.flow_rate_var, command=self._on_flow_rate_changed)
+        self.flow_rate_spinbox.pack(side=tk.LEFT)
+        self.flow_rate_spinbox.bind("<Return>", lambda e: self._on_flow_rate_changed())
 
         self.pump_on_button = ttk.Button(self.controls_frame, text="Turn Pump ON",
                                          command=lambda: self.toggle_pump(True, manual_override=True))
@@ -154,44 +351,139 @@ class DiptankMonitorApp:
                                                                   style='TFrame')
         self.overall_by_location_container_frame.pack(pady=15, fill=tk.X)
 
-        # This frame will hold the dynamically generated location-specific summaries
-        self.overall_by_location_frames = {}  # Dictionary to hold location frames for easy update/removal
+        # Persistent location-specific summaries, keyed by location. Each entry holds the
+        # location's frame, its labels and progress bar, and the values last rendered into them.
+        # Frames are built a slice at a time by _location_widgets_job.
+        self.overall_by_location_frames = {}
+        self._location_widgets_job = None
+        # Message shown in place of (or above) the location summaries, e.g. "no tanks" or a DB error
+        self.overall_by_location_message = ttk.Label(self.overall_by_location_container_frame, text="")
 
         # --- Status Message ---
         self.status_message = ttk.Label(self.main_frame, text="", foreground='blue', font=('Inter', 10))
         self.status_message.pack(pady=10)
 
-        # Load tanks on startup
+        # All database queries run on this worker so a slow database never blocks the UI
+        self.db_worker = DatabaseWorker(master)
+        self.refresh_scheduler = RefreshScheduler(master, self.db_worker,
+                                                  lambda sections: self._fetch_display_data(self.selected_tank_id,
+                                                                                            sections),
+                                                  lambda data, sections: self._apply_display_data(data),
+                                                  frame_budget_ms=refresh_budget_ms)
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # One scheduler drives the pumps of every tank; ticks are marshalled back to the main thread
+        self.selected_tank_id = None  # The tank shown in the info panel and targeted by the controls
+        # Fill/drain trends of the tanks, so pumps start before a tank runs low (see diptank.forecast)
+        self.forecaster = LevelForecaster()
+        self._pump_check_job = None
+        self._pump_check_generation = 0  # Bumped per check; results of older checks are ignored
+        self.pump_scheduler = PumpScheduler(interval=PUMP_UPDATE_INTERVAL, default_flow_rate=PUMP_FLOW_RATE,
+                                            on_tick=self._on_pump_tick_thread,
+                                            forecaster=self.forecaster)
+        # Tanks reloaded after an invalidation must see levels still waiting in the pump write buffer
+        tank_cache.flush_pending_writes = self.pump_scheduler.write_buffer.flush
+        # Committed pump levels are pushed to open dashboards (see diptank.live)
+        self.pump_scheduler.write_buffer.on_flush = publish_levels
+
+        # Load the first page of tanks on startup
+        self.tank_map = {}  # display name -> tank_id, for the pages loaded for the current search
+        self.tank_search = ""
+        self.tank_next_cursor = None  # Keyset cursor of the next page, None on the last page
+        self.selected_tank_display = ""
+        self._tank_search_job = None
+        self.startup.mark('window_built')
+        self.main_frame.bind('<Expose>', self._on_first_paint, add='+')
         self._load_tanks_and_init_selection()
 
     def _on_canvas_resize(self, event):
         """Adjusts the main_frame width to match the canvas width."""
         self.canvas.itemconfig("self.main_frame", width=event.width)
 
+    def _on_first_paint(self, event):
+        """Records the first time the window is drawn."""
+        self.startup.mark('first_paint')
+
+    def _on_interactive(self):
+        """
+        Called once the controls can be used (the first tank is shown, or there
+        is no tank to show): only now are the fleet summaries loaded.
+        """
+        if self.startup.reached('interactive'):
+            return
+        self.startup.mark('interactive')
+        self._update_all_displays(REFRESH_OVERALL, REFRESH_LOCATIONS)
+
+    def on_close(self):
+        """Stops background work and closes the window."""
+        self.refresh_scheduler.cancel()
+        if self._location_widgets_job is not None:
+            self.master.after_cancel(self._location_widgets_job)
+        self._cancel_pump_check()
+        self.pump_scheduler.shutdown()
+        self.db_worker.shutdown()
+        close_connections()  # The main thread's, opened by the final pump flush
+        self.master.destroy()
+
     def _load_tanks_and_init_selection(self):
-        """Fetches tanks from the database and populates the dropdown."""
-        try:
-            tanks = Tank.objects.all().order_by('location', 'tank_id')
-            self.tank_map = {f"Tank {t.tank_id} - {t.location}": t.tank_id for t in tanks}
-            self.tank_selector['values'] = list(self.tank_map.keys())
-            if tanks:
-                # Select the first tank by default
-                first_tank_display = list(self.tank_map.keys())[0]
-                self.tank_selector.set(first_tank_display)
-                self.on_tank_selected(None)  # Manually trigger update for the first tank
-            else:
-                self.status_message.config(
-                    text="No tanks found in the database. Please register tanks via Django admin or officer dashboard.")
-                self._clear_selected_tank_display()
-        except OperationalError as e:
+        """Fetches the first page of tanks in the background and populates the dropdown."""
+        self.status_message.config(text="Loading tanks...", foreground='blue')
+        self.overall_status_label.config(text="Overall Status: Loading...", foreground='gray')
+        self.db_worker.submit(lambda: self._fetch_tank_choices("", None),
+                              lambda result: self._apply_tank_choices(result, select_first=True),
+                              self._on_load_tanks_error)
+
+    @instrumented('monitor.load_tanks')
+    def _fetch_tank_choices(self, search, after):
+        """
+        (Worker thread) Returns (search, [(display name, tank_id), ...], next cursor)
+        for one page of tanks ordered by location and ID.
+        """
+        rows, next_cursor = tank_page(after=after, page_size=TANK_PICKER_PAGE_SIZE, search=search)
+        return search, [(f"Tank {tank_id} - {location}", tank_id) for tank_id, location in rows], next_cursor
+
+    def _apply_tank_choices(self, result, append=False, select_first=False):
+        """Populates the dropdown with a loaded page of tanks."""
+        search, choices, next_cursor = result
+        if search != self.tank_search:
+            return  # The user has typed something else since this page was requested
+        if not append:
+            self.tank_map = {}
+        self.tank_map.update(choices)
+        self.tank_next_cursor = next_cursor
+        values = list(self.tank_map.keys())
+        if next_cursor is not None:
+            values.append(MORE_TANKS_LABEL)
+        self.tank_selector['values'] = values
+        if not select_first:
+            return
+        self.startup.mark('tanks_listed')
+        if choices:
+            # Select the first tank by default
+            first_tank_display = choices[0][0]
+            self.tank_selector.set(first_tank_display)
+            self.on_tank_selected(None)  # Manually trigger update for the first tank
+        else:
+            self.status_message.config(
+                text="No tanks found in the database. Please register tanks via Django admin or officer dashboard.")
+            self._clear_selected_tank_display()
+            self._on_interactive()
+
+    def _on_load_tanks_error(self, e):
+        """Reports a failure to load the tank list."""
+        self.tank_map = {}
+        self.tank_next_cursor = None
+        if isinstance(e, OperationalError):
             messagebox.showerror("Database Error", f"Could not connect to database or tables are not ready: {e}\n"
                                                    "Please ensure your Django migrations are applied and the database is accessible.")
-            self._clear_selected_tank_display()
-        except Exception as e:
+        else:
             messagebox.showerror("Error", f"An unexpected error occurred while loading tanks: {e}")
-            self._clear_selected_tank_display()
-        finally:
+        self._clear_selected_tank_display()
+        if self.startup.reached('interactive'):
             self._update_all_displays()  # Always update all displays after loading tanks
+        else:
+            self.startup.mark('tanks_listed')
+            self._on_interactive()
 
     def _clear_selected_tank_display(self):
         """Clears all selected tank information labels."""
@@ -203,384 +495,562 @@ class DiptankMonitorApp:
         self.max_threshold_label.config(text="Max Threshold: N/A%")
         self.status_label.config(text="Status: N/A", foreground='black')
         self.water_level_progress['value'] = 0
-        self.tank_selector.set("")
-        global selected_tank_id
-        selected_tank_id = None
-        self.toggle_pump(False, manual_override=False)  # Ensure pump is off when no tank is selected
+        if self.selected_tank_id is not None:
+            # Only when a selection is dropped: with none, the box holds the search the user is typing
+            self.tank_selector.set("")
+        # Other tanks keep pumping; the controls just no longer target a tank
+        self.selected_tank_id = None
+        self.selected_tank_display = ""
+        self._update_pump_controls()
 
     def on_tank_selected(self, event):
         """Updates the display when a new tank is selected."""
-        global selected_tank_id
         selected_display_name = self.tank_selector.get()
-        selected_tank_id = self.tank_map.get(selected_display_name)
-        self._update_all_displays()
+        if selected_display_name == MORE_TANKS_LABEL:
+            self.tank_selector.set(self.selected_tank_display)
+            self._load_more_tanks()
+            return
+        self.selected_tank_id = self.tank_map.get(selected_display_name)
+        self.selected_tank_display = selected_display_name if self.selected_tank_id else ""
+        # Show the newly selected tank's own pump state; running pumps are not redirected
+        self._update_pump_controls()
+        self._update_all_displays(REFRESH_SELECTED)
         # Immediately check pump status based on thresholds when a tank is selected
         self.master.after(100, self._check_and_toggle_pump_auto)  # Small delay to ensure display updates
 
-    def _update_all_displays(self):
-        """Updates all relevant display sections."""
-        self._update_selected_tank_display()
-        self._update_overall_summary_display()
-        self._update_overall_by_location_display()
-
-    def _update_selected_tank_display(self):
-        """Fetches the latest data for the selected tank and updates its UI."""
-        global selected_tank_id
-        if selected_tank_id:
+    def _load_more_tanks(self):
+        """Appends the next page of tanks for the current search and reopens the dropdown."""
+        if self.tank_next_cursor is None:
+            return
+        search, after = self.tank_search, self.tank_next_cursor
+        self.db_worker.submit(lambda: self._fetch_tank_choices(search, after),
+                              lambda result: self._show_tank_choices(result, append=True),
+                              self._on_load_tanks_error)
+
+    def _on_tank_search_typed(self, event):
+        """Searches tanks shortly after the user stops typing in the selector."""
+        if event.keysym in ('Up', 'Down', 'Left', 'Right', 'Tab', 'Escape'):
+            return
+        if self._tank_search_job is not None:
+            self.master.after_cancel(self._tank_search_job)
+        delay = 0 if event.keysym == 'Return' else TANK_SEARCH_DELAY_MS
+        self._tank_search_job = self.master.after(delay, self._search_tanks)
+
+    def _search_tanks(self):
+        """Loads the first page of tanks matching the selector's text."""
+        self._tank_search_job = None
+        search = self.tank_selector.get().strip()
+        if search == self.selected_tank_display or search == self.tank_search:
+            return
+        self.tank_search = search
+        self.db_worker.submit(lambda: self._fetch_tank_choices(search, None), self._show_tank_choices,
+                              self._on_load_tanks_error)
+
+    def _show_tank_choices(self, result, append=False):
+        """Applies a page of search results and opens the dropdown on them."""
+        self._apply_tank_choices(result, append=append)
+        if result[0] == self.tank_search and self.tank_map:
+            self.tank_selector.event_generate('<Down>')  # Posts the dropdown list
+        elif result[0] == self.tank_search:
+            self.status_message.config(text=f"No tanks match '{result[0]}'.", foreground='blue')
+
+    def _update_all_displays(self, *sections):
+        """Marks display sections (all by default) for the next coalesced repaint."""
+        self.refresh_scheduler.request(*sections)
+
+    @instrumented('monitor.refresh')
+    def _fetch_display_data(self, tank_id, sections=ALL_REFRESH_SECTIONS):
+        """(Worker thread) Loads what the dirty sections need: the selected tank and/or the level summary."""
+        data = {'tank_id': tank_id, 'sections': sections, 'tank': None, 'tank_error': None,
+                'summary': None, 'summary_error': None}
+        if REFRESH_SELECTED in sections and tank_id:
             try:
-                tank = Tank.objects.get(pk=selected_tank_id)
-                self.tank_id_label.config(text=f"ID: {tank.tank_id}")
-                self.location_label.config(text=f"Location: {tank.location}")
-                self.capacity_label.config(text=f"Capacity: {tank.capacity:.2f} L")
-
-                current_percentage = (tank.current_level / tank.capacity) * 100 if tank.capacity > 0 else 0
-                self.current_level_label.config(
-                    text=f"Current Level: {tank.current_level:.2f} L ({current_percentage:.0f}%)")
-                self.min_threshold_label.config(text=f"Min Threshold: {tank.min_threshold:.0f}%")
-                self.max_threshold_label.config(text=f"Max Threshold: {tank.max_threshold:.0f}%")
-
-                # Update status and progress bar color
-                status = 'Optimal'
-                status_color = 'green'
-                if current_percentage < tank.min_threshold:
-                    status = 'Low'
-                    status_color = 'orange'
-                elif current_percentage > tank.max_threshold:
-                    status = 'High'
-                    status_color = 'red'
-                self.status_label.config(text=f"Status: {status}", foreground=status_color)
-
-                self.water_level_progress['value'] = current_percentage
-
-                self.status_message.config(text=f"Tank {tank.tank_id} data refreshed.")
-
-            except Tank.DoesNotExist:
-                self.status_message.config(text="Selected tank not found in database.", foreground='red')
-                self._clear_selected_tank_display()
-            except OperationalError as e:
-                messagebox.showerror("Database Error", f"Could not refresh tank data: {e}\n"
-                                                       "Please ensure your Django migrations are applied and the database is accessible.")
-                self._clear_selected_tank_display()
+                data['tank'] = tank_cache.get(tank_id)
             except Exception as e:
-                messagebox.showerror("Error", f"An unexpected error occurred while updating tank display: {e}")
-                self._clear_selected_tank_display()
+                data['tank_error'] = e
+        # Both overall panels read from the same grouped query
+        if REFRESH_OVERALL in sections or REFRESH_LOCATIONS in sections:
+            data['summary'], data['summary_error'] = self._fetch_level_summary()
+        return data
+
+    def _apply_display_data(self, data):
+        """Pushes the data fetched by _fetch_display_data into the dirty sections' widgets."""
+        sections = data['sections']
+        # Skip the selected tank panel if the selection changed while the query was in flight
+        if REFRESH_SELECTED in sections and data['tank_id'] == self.selected_tank_id:
+            self._update_selected_tank_display(data['tank'], data['tank_error'])
+            self._on_interactive()
+        if REFRESH_OVERALL in sections:
+            self._update_overall_summary_display(data['summary'], data['summary_error'])
+        if REFRESH_LOCATIONS in sections:
+            self._update_overall_by_location_display(data['summary'], data['summary_error'])
+        scheduler = self.refresh_scheduler
+        self.refresh_rate_label.config(
+            text=f"Display refresh: {scheduler.achieved_rate():.1f}/s "
+                 f"({scheduler.requests} requests, {scheduler.repaints} repaints)")
+
+    def _fetch_level_summary(self):
+        """Reads the fleet/location totals from the shared summary service. Returns (summary, error)."""
+        try:
+            return get_summary(), None
+        except OperationalError as e:
+            print(f"Database error while aggregating water levels: {e}")
+            return None, f"Database error loading location data: {e}"
+        except Exception as e:
+            print(f"An unexpected error occurred while aggregating water levels: {e}")
+            return None, f"An unexpected error occurred: {e}"
+
+    def _update_selected_tank_display(self, tank, error=None):
+        """Updates the selected tank's UI from the tank fetched in the background."""
+        if tank is not None:
+            self.tank_id_label.config(text=f"ID: {tank.tank_id}")
+            self.location_label.config(text=f"Location: {tank.location}")
+            self.capacity_label.config(text=f"Capacity: {tank.capacity:.2f} L")
+
+            current_percentage = level_percentage(tank.current_level, tank.capacity)
+            self.current_level_label.config(
+                text=f"Current Level: {tank.current_level:.2f} L ({current_percentage:.0f}%)")
+            self.min_threshold_label.config(text=f"Min Threshold: {tank.min_threshold:.0f}%")
+            self.max_threshold_label.config(text=f"Max Threshold: {tank.max_threshold:.0f}%")
+
+            # Update status and progress bar color
+            status = tank_status(current_percentage, tank.min_threshold, tank.max_threshold)
+            self.status_label.config(text=f"Status: {status}", foreground=STATUS_COLORS[status])
+
+            self.water_level_progress['value'] = current_percentage
+
+            self.status_message.config(text=f"Tank {tank.tank_id} data refreshed.")
+        elif isinstance(error, Tank.DoesNotExist):
+            self.status_message.config(text="Selected tank not found in database.", foreground='red')
+            self._clear_selected_tank_display()
+        elif isinstance(error, OperationalError):
+            messagebox.showerror("Database Error", f"Could not refresh tank data: {error}\n"
+                                                   "Please ensure your Django migrations are applied and the database is accessible.")
+            self._clear_selected_tank_display()
+        elif error is not None:
+            messagebox.showerror("Error", f"An unexpected error occurred while updating tank display: {error}")
+            self._clear_selected_tank_display()
         else:
             self._clear_selected_tank_display()
             self.status_message.config(text="No tank selected.", foreground='blue')
 
-    def _update_overall_summary_display(self):
-        """Calculates and displays the overall water levels across all tanks."""
-        try:
-            all_tanks = Tank.objects.all()
-            total_current_water_volume = sum(tank.current_level for tank in all_tanks)
-            total_tank_capacity = sum(tank.capacity for tank in all_tanks)
-
-            if total_tank_capacity > 0:
-                overall_percentage = (total_current_water_volume / total_tank_capacity) * 100
-            else:
-                overall_percentage = 0
-
-            overall_status = 'Optimal'
-            overall_status_color = 'green'
-            if overall_percentage < 20:  # Example global low threshold
-                overall_status = 'Critical'
-                overall_status_color = 'red'
-            elif overall_percentage < 50:  # Example global warning threshold
-                overall_status = 'Low'
-                overall_status_color = 'orange'
-
-            self.overall_volume_label.config(
-                text=f"Total Volume: {total_current_water_volume:.2f} L / Total Capacity: {total_tank_capacity:.2f} L")
-            self.overall_percentage_label.config(text=f"Overall Percentage: {overall_percentage:.0f}%")
-            self.overall_status_label.config(text=f"Overall Status: {overall_status}", foreground=overall_status_color)
-            self.overall_water_level_progress['value'] = overall_percentage
-
-        except OperationalError as e:
-            print(f"Database error while updating overall display: {e}")
+    def _update_overall_summary_display(self, summary, error=None):
+        """Displays the overall water levels across all tanks from a precomputed summary."""
+        if summary is None:
             self.overall_volume_label.config(text="Total Volume: N/A L / Total Capacity: N/A L")
             self.overall_percentage_label.config(text="Overall Percentage: N/A%")
             self.overall_status_label.config(text="Overall Status: Error", foreground='red')
             self.overall_water_level_progress['value'] = 0
-        except Exception as e:
-            print(f"An unexpected error occurred while updating overall display: {e}")
-            self.overall_volume_label.config(text="Total Volume: N/A L / Total Capacity: N/A L")
-            self.overall_percentage_label.config(text="Overall Percentage: N/A%")
-            self.overall_status_label.config(text="Overall Status: Error", foreground='red')
-            self.overall_water_level_progress['value'] = 0
-
-    def _update_overall_by_location_display(self):
-        """Calculates and displays overall water levels for each unique location."""
-        # Clear existing location frames
-        for frame in self.overall_by_location_frames.values():
-            frame.destroy()
-        self.overall_by_location_frames.clear()
-
-        try:
-            all_tanks = Tank.objects.all()
-
-            # Aggregate data by location
-            location_data = defaultdict(lambda: {'current_level': 0.0, 'capacity': 0.0})
-            for tank in all_tanks:
-                location_data[tank.location]['current_level'] += tank.current_level
-                location_data[tank.location]['capacity'] += tank.capacity
-
-            # Sort locations alphabetically
-            sorted_locations = sorted(location_data.keys())
+            return
 
-            if not sorted_locations:
-                no_tanks_label = ttk.Label(self.overall_by_location_container_frame,
-                                           text="No tanks found to display by location.", foreground='gray')
-                no_tanks_label.pack(pady=10)
-                return
+        # Percentages and statuses were added in the background by get_summary()
+        total_current_water_volume = summary['total_current_level']
+        total_tank_capacity = summary['total_capacity']
+        overall_percentage = summary['percentage']
+        overall_status = summary['status']
+        overall_status_color = STATUS_COLORS[overall_status]
+
+        self.overall_volume_label.config(
+            text=f"Total Volume: {total_current_water_volume:.2f} L / Total Capacity: {total_tank_capacity:.2f} L")
+        self.overall_percentage_label.config(text=f"Overall Percentage: {overall_percentage:.0f}%")
+        self.overall_status_label.config(text=f"Overall Status: {overall_status}", foreground=overall_status_color)
+        self.overall_water_level_progress['value'] = overall_percentage
+
+    def _update_overall_by_location_display(self, summary, error=None):
+        """
+        Updates the per-location summaries, touching only the widgets whose values
+        changed. At most LOCATION_WIDGETS_PER_SLICE new frames are built per call;
+        the rest are built by follow-up calls from the main loop.
+        """
+        if self._location_widgets_job is not None:
+            self.master.after_cancel(self._location_widgets_job)
+            self._location_widgets_job = None
+        if summary is None:
+            # Keep the last known location values on screen and flag the error above them
+            self._show_by_location_message(error, 'red')
+            self.startup.mark('summaries_loaded')
+            return
 
-            for location in sorted_locations:
-                data = location_data[location]
-                loc_current_volume = data['current_level']
-                loc_capacity = data['capacity']
+        # Locations are already sorted alphabetically by the aggregation query
+        location_data = summary['locations']
 
-                if loc_capacity > 0:
-                    loc_percentage = (loc_current_volume / loc_capacity) * 100
-                else:
-                    loc_percentage = 0
-
-                loc_status = 'Optimal'
-                loc_status_color = 'green'
-                if loc_percentage < 20:  # Using same example thresholds as overall_summary
-                    loc_status = 'Critical'
-                    loc_status_color = 'red'
-                elif loc_percentage < 50:
-                    loc_status = 'Low'
-                    loc_status_color = 'orange'
-
-                # Create a new frame for this location's summary
-                loc_frame = ttk.LabelFrame(self.overall_by_location_container_frame, text=f"Location: {location}",
-                                           padding="10", style='TFrame')
-                loc_frame.pack(pady=5, fill=tk.X, expand=True)
-                self.overall_by_location_frames[location] = loc_frame  # Store reference
-
-                ttk.Label(loc_frame, text=f"Volume: {loc_current_volume:.2f} L / Capacity: {loc_capacity:.2f} L").pack(
-                    anchor='w', pady=1)
-                ttk.Label(loc_frame, text=f"Percentage: {loc_percentage:.0f}%").pack(anchor='w', pady=1)
-                ttk.Label(loc_frame, text=f"Status: {loc_status}", font=('Inter', 9, 'bold'),
-                          foreground=loc_status_color).pack(anchor='w', pady=3)
-
-                # Progress bar for location
-                loc_progress_frame = ttk.Frame(loc_frame, style='TFrame')
-                loc_progress_frame.pack(pady=5, fill=tk.X)
-                ttk.Label(loc_progress_frame, text="Level:").pack(side=tk.LEFT, padx=(0, 5))
-                loc_progress_bar = ttk.Progressbar(loc_progress_frame, orient="horizontal", length=150,
-                                                   mode="determinate")
-                loc_progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
-                loc_progress_bar['value'] = loc_percentage
+        if not location_data:
+            for location in list(self.overall_by_location_frames):
+                self._remove_location_widgets(location)
+            self._show_by_location_message("No tanks found to display by location.", 'gray')
+            self.startup.mark('summaries_loaded')
+            return
 
-        except OperationalError as e:
-            error_label = ttk.Label(self.overall_by_location_container_frame,
-                                    text=f"Database error loading location data: {e}", foreground='red')
-            error_label.pack(pady=10)
-            print(f"Database error while updating overall by location display: {e}")
-        except Exception as e:
-            error_label = ttk.Label(self.overall_by_location_container_frame, text=f"An unexpected error occurred: {e}",
-                                    foreground='red')
-            error_label.pack(pady=10)
-            print(f"An unexpected error occurred while updating overall by location display: {e}")
+        self.overall_by_location_message.pack_forget()
+
+        # Only add or remove frames when the set of locations has changed
+        for location in set(self.overall_by_location_frames) - set(location_data):
+            self._remove_location_widgets(location)
+        missing = [location for location in location_data if location not in self.overall_by_location_frames]
+        to_add = set(missing[:LOCATION_WIDGETS_PER_SLICE])
+        if len(missing) > len(to_add):
+            self._location_widgets_job = self.master.after(
+                1, lambda: self._update_overall_by_location_display(summary))
+        # Walk backwards so each new frame is packed before its alphabetical successor
+        next_frame = None
+        for location in reversed(list(location_data)):
+            if location in to_add:
+                self.overall_by_location_frames[location] = self._create_location_widgets(location, next_frame)
+            widgets = self.overall_by_location_frames.get(location)
+            if widgets is not None:
+                next_frame = widgets['frame']
+        if self._location_widgets_job is None:
+            self.startup.mark('summaries_loaded')
+
+        for location, data in location_data.items():
+            widgets = self.overall_by_location_frames.get(location)
+            if widgets is None:
+                continue  # Built by a later slice
+            loc_current_volume = data['current_level']
+            loc_capacity = data['capacity']
+            loc_percentage = data['percentage']
+            loc_status = data['status']
+            loc_status_color = STATUS_COLORS[loc_status]
+            rendered = widgets['rendered']
+
+            volume_text = f"Volume: {loc_current_volume:.2f} L / Capacity: {loc_capacity:.2f} L"
+            if rendered.get('volume') != volume_text:
+                widgets['volume_label'].config(text=volume_text)
+                rendered['volume'] = volume_text
+
+            percentage_text = f"Percentage: {loc_percentage:.0f}%"
+            if rendered.get('percentage') != percentage_text:
+                widgets['percentage_label'].config(text=percentage_text)
+                rendered['percentage'] = percentage_text
+
+            if rendered.get('status') != loc_status:
+                widgets['status_label'].config(text=f"Status: {loc_status}", foreground=loc_status_color)
+                rendered['status'] = loc_status
+
+            if rendered.get('progress') != loc_percentage:
+                widgets['progress']['value'] = loc_percentage
+                rendered['progress'] = loc_percentage
+
+    def _create_location_widgets(self, location, before=None):
+        """Builds the summary frame for one location (packed before the frame `before`) and returns its widgets."""
+        loc_frame = ttk.LabelFrame(self.overall_by_location_container_frame, text=f"Location: {location}",
+                                   padding="10", style='TFrame')
+        if before is not None:
+            loc_frame.pack(pady=5, fill=tk.X, expand=True, before=before)
+        else:
+            loc_frame.pack(pady=5, fill=tk.X, expand=True)
+
+        volume_label = ttk.Label(loc_frame, text="Volume: N/A L / Capacity: N/A L")
+        volume_label.pack(anchor='w', pady=1)
+        percentage_label = ttk.Label(loc_frame, text="Percentage: N/A%")
+        percentage_label.pack(anchor='w', pady=1)
+        status_label = ttk.Label(loc_frame, text="Status: N/A", font=('Inter', 9, 'bold'))
+        status_label.pack(anchor='w', pady=3)
+
+        # Progress bar for location
+        loc_progress_frame = ttk.Frame(loc_frame, style='TFrame')
+        loc_progress_frame.pack(pady=5, fill=tk.X)
+        ttk.Label(loc_progress_frame, text="Level:").pack(side=tk.LEFT, padx=(0, 5))
+        loc_progress_bar = ttk.Progressbar(loc_progress_frame, orient="horizontal", length=150,
+                                           mode="determinate")
+        loc_progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        return {
+            'frame': loc_frame,
+            'volume_label': volume_label,
+            'percentage_label': percentage_label,
+            'status_label': status_label,
+            'progress': loc_progress_bar,
+            'rendered': {},  # Last values written to the widgets above
+        }
+
+    def _remove_location_widgets(self, location):
+        """Destroys the summary frame of a location that no longer has tanks."""
+        widgets = self.overall_by_location_frames.pop(location)
+        widgets['frame'].destroy()
+
+    def _show_by_location_message(self, text, color):
+        """Shows a message at the top of the per-location panel."""
+        self.overall_by_location_message.config(text=text, foreground=color)
+        if not self.overall_by_location_message.winfo_manager():
+            first_frame = next(iter(self.overall_by_location_frames.values()), None)
+            if first_frame:
+                self.overall_by_location_message.pack(pady=10, before=first_frame['frame'])
+            else:
+                self.overall_by_location_message.pack(pady=10)
 
     def simulate_sensor_reading(self):
-        """Simulates a sensor reading and updates the tank level in the database."""
-        global selected_tank_id
-        if not selected_tank_id:
+        """Simulates a sensor reading for the selected tank in the background."""
+        if not self.selected_tank_id:
             messagebox.showwarning("No Tank Selected", "Please select a tank first.")
             return
 
-        try:
-            with transaction.atomic():  # Ensure atomicity for database operations
-                tank = Tank.objects.select_for_update().get(pk=selected_tank_id)  # Lock the row for update
-
-                # Simulate a new water level (e.g., random fluctuation around current level)
-                # Ensure it stays within 0 and capacity
-                fluctuation = random.uniform(-0.05, 0.05) * tank.capacity  # +/- 5% of capacity
-                new_level = tank.current_level + fluctuation
-                new_level = max(0.0, min(tank.capacity, new_level))  # Clamp between 0 and capacity
-
-                # Update tank's current level
-                tank.current_level = new_level
-                tank.save()
-
-                # Create a new sensor reading record
-                SensorReading.objects.create(
-                    tank=tank,
-                    water_level=new_level
-                )
-
-                # Check for alerts based on new level
-                current_percentage = (new_level / tank.capacity) * 100 if tank.capacity > 0 else 0
-                if current_percentage < tank.min_threshold:
-                    Alert.objects.create(
-                        tank=tank,
-                        alert_type='low_water',
-                        message=f"Tank {tank.tank_id} at {tank.location} is below minimum threshold ({tank.min_threshold:.0f}%). Current: {current_percentage:.0f}%"
-                    )
-                    self.status_message.config(text=f"Alert: Low water level for Tank {tank.tank_id}!",
-                                               foreground='red')
-                elif current_percentage > tank.max_threshold:
-                    Alert.objects.create(
-                        tank=tank,
-                        alert_type='high_water',
-                        message=f"Tank {tank.tank_id} at {tank.location} is above maximum threshold ({tank.max_threshold:.0f}%). Current: {current_percentage:.0f}%"
-                    )
-                    self.status_message.config(text=f"Alert: High water level for Tank {tank.tank_id}!",
-                                               foreground='red')
-                else:
-                    self.status_message.config(
-                        text=f"Sensor reading simulated for Tank {tank.tank_id}. Level: {new_level:.2f}L",
-                        foreground='green')
+        tank_id = self.selected_tank_id
+        self.db_worker.submit(lambda: self._record_simulated_reading(tank_id),
+                              self._on_sensor_reading_recorded, self._on_sensor_reading_error)
+
+    @instrumented('monitor.sensor_reading')
+    def _record_simulated_reading(self, tank_id):
+        """(Worker thread) Writes a simulated reading and any alert. Returns the outcome for the UI."""
+        # Write any buffered pump levels first so the reading starts from the tank's real level
+        self.pump_scheduler.write_buffer.flush()
+        with transaction.atomic():  # Ensure atomicity for database operations
+            # Simulate a new water level (random fluctuation around current level, clamped to capacity).
+            # Compare-and-swap instead of a row lock: recomputed if another writer changed the level meanwhile.
+            tank, _ = update_level(
+                tank_id, lambda tank: simulated_sensor_level(tank.current_level, tank.capacity))
+            new_level = tank.current_level
+
+            # Create a new sensor reading record and fold it into the tank's rollups
+            reading = SensorReading.objects.create(
+                tank=tank,
+                water_level=new_level
+            )
+            record_readings([reading])
+
+            # Check for alerts based on new level. The status message reports every out-of-range
+            # reading, but an Alert row is only written when the condition opens (see diptank.alerts).
+            current_percentage = level_percentage(new_level, tank.capacity)
+            alert_type = STATUS_ALERT_TYPES.get(tank_status(current_percentage, tank.min_threshold,
+                                                            tank.max_threshold))
+            alerts = alert_engine.process(tank, new_level)
+            for alert in alerts:
+                alert.save()
+
+        # Keep the cached tank (and a running pump on it) in step with the new level
+        tank_cache.update_level(tank.tank_id, new_level)
+        self.forecaster.observe(tank.tank_id, new_level)
+        if self.recorder is not None:
+            self.recorder.record(tank.tank_id, new_level)
+        invalidate_summary()
+        publish_levels({tank.tank_id: new_level})
+        publish_alerts(alerts)
+        return {'tank_id': tank.tank_id, 'level': new_level, 'alert_type': alert_type}
+
+    def _on_sensor_reading_recorded(self, result):
+        """Reports a simulated reading and refreshes the UI."""
+        if result['alert_type'] == 'low_water':
+            self.status_message.config(text=f"Alert: Low water level for Tank {result['tank_id']}!",
+                                       foreground='red')
+        elif result['alert_type'] == 'high_water':
+            self.status_message.config(text=f"Alert: High water level for Tank {result['tank_id']}!",
+                                       foreground='red')
+        else:
+            self.status_message.config(
+                text=f"Sensor reading simulated for Tank {result['tank_id']}. Level: {result['level']:.2f}L",
+                foreground='green')
 
-                self._update_all_displays()  # Refresh all displays immediately
-                self._check_and_toggle_pump_auto()  # Check pump status after simulation
+        self._update_all_displays()  # Levels changed: every section is dirty
+        self._check_and_toggle_pump_auto()  # Check pump status after simulation
 
-        except Tank.DoesNotExist:
+    def _on_sensor_reading_error(self, e):
+        """Reports a failed sensor simulation."""
+        if isinstance(e, Tank.DoesNotExist):
             messagebox.showerror("Error", "Selected tank not found.")
             self.status_message.config(text="Error: Selected tank not found.", foreground='red')
-        except OperationalError as e:
+        elif isinstance(e, LevelUpdateConflict):
+            messagebox.showwarning("Tank Busy", f"{e}\nPlease try again.")
+            self.status_message.config(text="Tank level changed too often; reading not recorded.", foreground='red')
+        elif isinstance(e, OperationalError):
             messagebox.showerror("Database Error", f"Could not simulate reading: {e}\n"
                                                    "Ensure your Django migrations are applied and the database is accessible.")
             self.status_message.config(text="Database error during simulation.", foreground='red')
-        except Exception as e:
+        else:
             messagebox.showerror("Error", f"An unexpected error occurred during sensor simulation: {e}")
             self.status_message.config(text="An unexpected error occurred.", foreground='red')
 
     def toggle_pump(self, turn_on, manual_override=False):
-        """Starts or stops the pump simulation. Can be called manually or automatically."""
-        global pump_running, pump_thread, selected_tank_id
-
-        if not selected_tank_id:
+        """Starts or stops the selected tank's pump. Can be called manually or automatically."""
+        tank_id = self.selected_tank_id
+        if not tank_id:
             if manual_override:  # Only show warning if user manually tried to toggle
                 messagebox.showwarning("No Tank Selected", "Please select a tank first to control the pump.")
             return
 
-        if turn_on and not pump_running:
-            pump_running = True
-            self.pump_status_label.config(text="Pump: ON", foreground='green')
-            self.pump_on_button.config(state=tk.DISABLED)
-            self.pump_off_button.config(state=tk.NORMAL)
+        if turn_on and self.pump_scheduler.start_pump(tank_id, self._selected_flow_rate()):
             if manual_override:
                 self.status_message.config(text="Pump manually turned ON.", foreground='green')
             else:
                 self.status_message.config(text="Pump automatically turned ON (Low Level).", foreground='green')
-            pump_thread = threading.Thread(target=self._pump_simulation_loop, daemon=True)
-            pump_thread.start()
-        elif not turn_on and pump_running:
-            pump_running = False
-            # No need to join thread explicitly, daemon=True will clean it up on app exit
-            self.pump_status_label.config(text="Pump: OFF", foreground='red')
-            self.pump_on_button.config(state=tk.NORMAL)
-            self.pump_off_button.config(state=tk.DISABLED)
+        elif not turn_on and self.pump_scheduler.stop_pump(tank_id):
             if manual_override:
                 self.status_message.config(text="Pump manually turned OFF.", foreground='blue')
             else:
                 self.status_message.config(text="Pump automatically turned OFF (Optimal Level).", foreground='blue')
+        self._update_pump_controls()
+
+    def _update_pump_controls(self):
+        """Reflects the selected tank's pump state in the pump label and buttons."""
+        if self.selected_tank_id and self.pump_scheduler.is_running(self.selected_tank_id):
+            self.pump_status_label.config(text="Pump: ON", foreground='green')
+            self.pump_on_button.config(state=tk.DISABLED)
+            self.pump_off_button.config(state=tk.NORMAL)
+        else:
+            self.pump_status_label.config(text="Pump: OFF", foreground='red')
+            self.pump_on_button.config(state=tk.NORMAL)
+            self.pump_off_button.config(state=tk.DISABLED)
+        self.active_pumps_label.config(text=f"Active pumps: {self.pump_scheduler.running_count()}")
+
+    def _selected_flow_rate(self):
+        """Returns the flow rate entered in the controls, falling back to the default."""
+        try:
+            flow_rate = float(self.flow_rate_var.get())
+        except (tk.TclError, ValueError):
+            return PUMP_FLOW_RATE
+        return flow_rate if flow_rate > 0 else PUMP_FLOW_RATE
+
+    def _on_flow_rate_changed(self):
+        """Applies a new flow rate to the selected tank's pump if it is running."""
+        if self.selected_tank_id:
+            self.pump_scheduler.set_flow_rate(self.selected_tank_id, self._selected_flow_rate())
 
     def _check_and_toggle_pump_auto(self):
-        """Checks tank thresholds and automatically toggles pump if needed."""
-        global selected_tank_id, pump_running
-        if selected_tank_id:
-            try:
-                tank = Tank.objects.get(pk=selected_tank_id)
-                current_percentage = (tank.current_level / tank.capacity) * 100 if tank.capacity > 0 else 0
-
-                if current_percentage < tank.min_threshold and not pump_running:
-                    self.toggle_pump(True, manual_override=False)  # Auto turn ON
-                elif current_percentage >= tank.max_threshold and pump_running:
-                    self.toggle_pump(False, manual_override=False)  # Auto turn OFF
-            except Tank.DoesNotExist:
-                # Tank might have been deleted, stop pump
-                self.toggle_pump(False, manual_override=False)
-            except OperationalError as e:
-                # Handle database errors gracefully, stop pump if necessary
-                print(f"Database error during auto pump check: {e}")
-                self.toggle_pump(False, manual_override=False)
-            except Exception as e:
-                print(f"An unexpected error occurred during auto pump check: {e}")
-                self.toggle_pump(False, manual_override=False)
-
-    def _pump_simulation_loop(self):
-        """Background thread for pump simulation."""
-        global pump_running, selected_tank_id, PUMP_FLOW_RATE
-
-        while pump_running:
-            if selected_tank_id:
-                try:
-                    with transaction.atomic():  # Ensure atomicity
-                        tank = Tank.objects.select_for_update().get(pk=selected_tank_id)
-
-                        current_percentage = (tank.current_level / tank.capacity) * 100 if tank.capacity > 0 else 0
-
-                        # Auto-stop if max threshold is hit during pumping
-                        if current_percentage >= tank.max_threshold:
-                            self.master.after(0, lambda: self.toggle_pump(False, manual_override=False))
-                            self.master.after(0, lambda: self.status_message.config(
-                                text=f"Pump auto-stopped for Tank {tank.tank_id} (Max Threshold Reached).",
-                                foreground='blue'))
-                            break  # Exit loop if pump is stopped
-
-                        # Simulate pumping water IN (increase level)
-                        new_level = tank.current_level + PUMP_FLOW_RATE
-                        new_level = min(tank.capacity, new_level)  # Don't exceed capacity
-
-                        tank.current_level = new_level
-                        tank.save()
-
-                        # Create a sensor reading for the pump action
-                        SensorReading.objects.create(
-                            tank=tank,
-                            water_level=new_level
-                        )
-
-                        # Update UI on the main thread
-                        self.master.after(0, self._update_all_displays)  # Call the new consolidated update
-                        self.master.after(0, lambda: self.status_message.config(
-                            text=f"Pump active for Tank {tank.tank_id}. Level: {new_level:.2f}L", foreground='blue'))
-
-                        # Check for alerts (e.g., if pump overfills, though auto-stop should prevent this)
-                        current_percentage = (new_level / tank.capacity) * 100 if tank.capacity > 0 else 0
-                        if current_percentage > tank.max_threshold:
-                            # This alert should ideally not be triggered if auto-stop works, but as a fallback
-                            Alert.objects.create(
-                                tank=tank,
-                                alert_type='high_water',
-                                message=f"Tank {tank.tank_id} at {tank.location} is above maximum threshold ({tank.max_threshold:.0f}%). Current: {current_percentage:.0f}% due to pump."
-                            )
-                            self.master.after(0, lambda: self.status_message.config(
-                                text=f"Alert: Pump overfilled Tank {tank.tank_id}!", foreground='red'))
-                            self.master.after(0, lambda: self.toggle_pump(False,
-                                                                          manual_override=False))  # Ensure pump stops
-                            break  # Exit loop if pump is stopped
-
-                except Tank.DoesNotExist:
-                    self.master.after(0, lambda: messagebox.showerror("Error",
-                                                                      "Selected tank not found during pump operation."))
-                    self.master.after(0, lambda: self.toggle_pump(False,
-                                                                  manual_override=False))  # Stop pump if tank disappears
-                    break  # Exit loop
-                except OperationalError as e:
-                    self.master.after(0, lambda: messagebox.showerror("Database Error",
-                                                                      f"Could not update tank during pump operation: {e}"))
-                    self.master.after(0,
-                                      lambda: self.toggle_pump(False, manual_override=False))  # Stop pump on DB error
-                    break  # Exit loop
-                except Exception as e:
-                    self.master.after(0, lambda: messagebox.showerror("Error",
-                                                                      f"An unexpected error occurred during pump simulation: {e}"))
-                    self.master.after(0,
-                                      lambda: self.toggle_pump(False, manual_override=False))  # Stop pump on any error
-                    break  # Exit loop
-
-            time.sleep(PUMP_UPDATE_INTERVAL)
+        """
+        Checks the selected tank's thresholds and level forecast in the background
+        and automatically toggles its pump if needed. The next check is scheduled
+        from the forecast: soon when a threshold crossing is near, rarely otherwise.
+        """
+        self._cancel_pump_check()
+        self._pump_check_generation += 1
+        if self.selected_tank_id:
+            tank_id, generation = self.selected_tank_id, self._pump_check_generation
+            self.db_worker.submit(lambda: self._fetch_pump_forecast(tank_id),
+                                  lambda result: self._apply_pump_auto_check(tank_id, generation, *result),
+                                  lambda e: self._on_pump_auto_check_error(tank_id, generation, e))
+
+    def _cancel_pump_check(self):
+        if self._pump_check_job is not None:
+            self.master.after_cancel(self._pump_check_job)
+            self._pump_check_job = None
+
+    def _schedule_pump_check(self, delay):
+        """Schedules the next auto pump check in `delay` seconds, replacing any pending one."""
+        self._cancel_pump_check()
+        self._pump_check_job = self.master.after(int(delay * 1000), self._check_and_toggle_pump_auto)
+
+    def _fetch_pump_forecast(self, tank_id):
+        """(Worker thread) Returns (tank, Forecast or None), seeding the tank's trend from its readings once."""
+        tank = tank_cache.get(tank_id)
+        if not self.forecaster.has_history(tank_id):
+            self.forecaster.load_history([tank_id])
+        forecast = self.forecaster.forecast(tank_id, tank.capacity, tank.min_threshold, tank.max_threshold,
+                                            level=tank.current_level)
+        return tank, forecast
+
+    def _apply_pump_auto_check(self, tank_id, generation, tank, forecast):
+        """Toggles the pump based on the thresholds and forecast of the freshly loaded tank."""
+        if generation != self._pump_check_generation or tank_id != self.selected_tank_id:
+            return  # A newer check was started, or the selection changed, while the query was in flight
+
+        current_percentage = level_percentage(tank.current_level, tank.capacity)
+        pump_running = self.pump_scheduler.is_running(tank_id)
+        action = predictive_pump_action(current_percentage, tank.min_threshold, tank.max_threshold, pump_running,
+                                        forecast)
+        if action is not None:
+            self.toggle_pump(action, manual_override=False)  # Auto turn ON (low) / OFF (max reached)
+            if action and current_percentage >= tank.min_threshold:
+                self.status_message.config(
+                    text=f"Pump automatically turned ON (Low Level expected in {forecast.seconds_to_min:.0f}s).",
+                    foreground='green')
+        self._schedule_pump_check(next_check_delay(forecast))
+
+    def _on_pump_auto_check_error(self, tank_id, generation, e):
+        """Stops the pump when the auto pump check could not load the tank, and checks again later."""
+        if generation != self._pump_check_generation or tank_id != self.selected_tank_id:
+            return
+        if isinstance(e, Tank.DoesNotExist):
+            # Tank might have been deleted, stop pump
+            self.forecaster.forget(tank_id)
+            self.toggle_pump(False, manual_override=False)
+            return
+        # Keep checking: the error may be transient (e.g. the database restarting)
+        self._schedule_pump_check(PUMP_CHECK_MAX_INTERVAL)
+        if isinstance(e, OperationalError):
+            # Handle database errors gracefully, stop pump if necessary
+            print(f"Database error during auto pump check: {e}")
+            self.toggle_pump(False, manual_override=False)
+        else:
+            print(f"An unexpected error occurred during auto pump check: {e}")
+            self.toggle_pump(False, manual_override=False)
+
+    def _on_pump_tick_thread(self, result):
+        """(Pump timer thread) Records the pumped levels and hands the tick to the main thread."""
+        if self.recorder is not None:
+            self.recorder.record_many(result.levels)
+        self.master.after(0, self._on_pump_tick, result)
+
+    def _on_pump_tick(self, result):
+        """Applies one pump scheduler tick (see diptank.pumps) to the UI."""
+        tank_id = self.selected_tank_id
+        if tank_id in result.levels:
+            self.status_message.config(
+                text=f"Pump active for Tank {tank_id}. Level: {result.levels[tank_id]:.2f}L", foreground='blue')
+
+        for stopped_id, (reason, message) in result.stopped.items():
+            if stopped_id == tank_id:
+                self.status_message.config(text=message, foreground='red' if reason == 'overfilled' else 'blue')
+
+        for error_id, e in result.errors.items():
+            if isinstance(e, Tank.DoesNotExist):
+                message = "Selected tank not found during pump operation."
+                title = "Error"
+            elif isinstance(e, OperationalError):
+                message = f"Could not update tank during pump operation: {e}"
+                title = "Database Error"
+            else:
+                message = f"An unexpected error occurred during pump simulation: {e}"
+                title = "Error"
+            if error_id == tank_id:
+                messagebox.showerror(title, message)
+            else:
+                print(f"Pump for Tank {error_id} stopped: {message}")
+
+        if result.flush_error:
+            self.status_message.config(text=f"Could not save pump readings: {result.flush_error}", foreground='red')
+
+        self._update_pump_controls()
+        self._update_all_displays()
 
 
 # --- Main application entry point. ---
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = DiptankMonitorApp(root)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="Diptank sensor & pump monitor.")
+    parser.add_argument('--headless', action='store_true',
+                        help="Run the sensor/pump simulation as a load generator, without a window.")
+    parser.add_argument('--refresh-budget-ms', type=int, default=REFRESH_FRAME_BUDGET_MS,
+                        help=f"Minimum milliseconds between display repaints (default: {REFRESH_FRAME_BUDGET_MS}).")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics.")
+    parser.add_argument('--conn-max-age', type=int, default=MONITOR_CONN_MAX_AGE,
+                        help="Seconds background threads keep a database connection open, "
+                             f"0 to reconnect for every job (default: {MONITOR_CONN_MAX_AGE}).")
+    loadgen.add_arguments(parser)
+    parser.add_argument('--replay', metavar='PATH', default=None,
+                        help="Replay a sensor capture recorded with --record, without a window.")
+    parser.add_argument('--speed', default='1',
+                        help="Replay pace as a multiple of the recorded one, or 'max' (default: 1).")
+    args = parser.parse_args()
+
+    configure_persistent_connections(args.conn_max_age)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    if args.replay:
+        replay.run(args)
+    elif args.headless:
+        loadgen.run(args)
+    else:
+        recorder = replay.SensorRecorder(args.record) if args.record else None
+        root = tk.Tk()
+        app = DiptankMonitorApp(root, refresh_budget_ms=args.refresh_budget_ms, recorder=recorder)
+        try:
+            root.mainloop()
+        finally:
+            # Make sure buffered pump readings reach the database however the app exits
+            app.pump_scheduler.shutdown()
+            close_connections()
+            if recorder is not None:
+                recorder.close()
+                print(f"Recorded {recorder.events} readings to {args.record}")
 
 